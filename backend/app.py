@@ -1,12 +1,40 @@
-import pandas as pd
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from flask import Flask, request, jsonify
+import time
+
+_import_start = time.perf_counter()
+
+import atexit
+import hmac
+import json
+import os
+import pickle
+
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify
 from flask_cors import CORS
 
-app = Flask(__name__)
-CORS(app)
+from utils.admission import admission_from_env, request_queue_seconds
+from utils.events import BatchWorker, EventLog, RatingAggregator, read_events, validate_event
+from utils.metrics import metrics
+from utils.preferences import DISLIKE_WEIGHT, LIKED_RATING, has_dislikes, signed_weights
+from utils.profiling import profiler_from_env
+from utils.registry import ModelRegistry
+from utils.serialization import JSON_MIMETYPE, RANKING_MIMETYPES, BookSerializer, dumps
+
+# pandas, numpy and scikit-learn are imported where they are first needed so
+# that importing this module stays cheap; create_app() builds the model state.
+api = Blueprint('api', __name__)
+
+# Weight of the catalog rating, in reviews, for books without a num_reviews count
+DEFAULT_REVIEWS = 10
+
+# Diversified requests re-rank this many candidates per result (at most MAX_DIVERSITY_CANDIDATES)
+DIVERSITY_CANDIDATES = 10
+MAX_DIVERSITY_CANDIDATES = 500
+
+# Request profiles without a liked or disliked catalog book are answered by
+# BookRecommender.cold_start_ranking; profiles with fewer than SPARSE_PROFILE
+# liked books are counted as 'sparse'
+COLD_START_PROFILES = ('empty', 'unknown', 'neutral')
+SPARSE_PROFILE = 3
 
 # Sample tech books dataset
 tech_books_data = {
@@ -62,132 +90,839 @@ tech_books_data = {
              2018, 2016, 2009, 2019, 2015]
 }
 
-df_books = pd.DataFrame(tech_books_data)
 
-# Creating a content features for similarity
-df_books['content'] = df_books['title'] + ' ' + df_books['category'] + ' ' + df_books['level']
 
-# TF-IDF vectorization
-tfidf = TfidfVectorizer(stop_words='english')
-tfidf_matrix = tfidf.fit_transform(df_books['content'])
-cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+def build_similarity(books_df, features='tfidf'):
+    """Add the 'content' column and build the TF-IDF cosine similarity matrix.
+    
+    features='hashed' uses models.features.HashedFeatures (hashed terms of
+    title, author, category, level and description) instead of a fitted
+    TfidfVectorizer vocabulary over title, category and level.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+    
+    # Creating a content features for similarity
+    books_df['content'] = books_df['title'] + ' ' + books_df['category'] + ' ' + books_df['level']
+    
+    # TF-IDF vectorization
+    start = time.perf_counter()
+    if features == 'hashed':
+        from models.features import HashedFeatures
+        tfidf = HashedFeatures()
+        tfidf_matrix = tfidf.fit_transform(books_df)
+    elif features == 'tfidf':
+        tfidf = TfidfVectorizer(stop_words='english')
+        tfidf_matrix = tfidf.fit_transform(books_df['content'])
+    else:
+        raise ValueError(f"Unknown content features: {features} (expected tfidf or hashed)")
+    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+    metrics.set_gauge('model_load_seconds', time.perf_counter() - start, model='tfidf')
+    
+    return tfidf, tfidf_matrix, cosine_sim
+
+
+def build_item_item(books_df, ratings_df):
+    """Item-item neighbor index from the ratings log (None without ratings)"""
+    if ratings_df is None or ratings_df.empty:
+        return None
+    from models.item_item import ItemItemRecommender
+    
+    start = time.perf_counter()
+    item_item = ItemItemRecommender()
+    item_item.fit_ratings(ratings_df, books_df)
+    metrics.set_gauge('model_load_seconds', time.perf_counter() - start, model='item_item')
+    return item_item
+
+
+def load_ratings(path=None):
+    """Ratings log from RATINGS_PATH (default data/user_ratings.csv); None if missing"""
+    import pandas as pd
+    
+    path = path or os.environ.get('RATINGS_PATH',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'user_ratings.csv'))
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, comment='#')
+
+
+def reposition(order, keys, positions):
+    """Update order, a stable ascending argsort of keys, after keys changed at positions.
+    
+    The changed positions are taken out and re-inserted where a stable sort
+    would put them: O(N) array copies and O(k log N) searches, no re-sort.
+    """
+    import numpy as np
+    moved = np.zeros(len(order), dtype=bool)
+    moved[positions] = True
+    rest = order[~moved[order]]
+    rest_keys = keys[rest]
+    positions = np.unique(positions)
+    positions = positions[np.argsort(keys[positions], kind='stable')]
+    lo = np.searchsorted(rest_keys, keys[positions], side='left')
+    hi = np.searchsorted(rest_keys, keys[positions], side='right')
+    # Equal keys stay in position order
+    at = [start + np.searchsorted(rest[start:end], position)
+          for start, end, position in zip(lo.tolist(), hi.tolist(), positions.tolist())]
+    return np.insert(rest, at, positions)
 
 
 class BookRecommender:
-    def __init__(self, books_df, similarity_matrix):
+    def __init__(self, books_df, similarity_matrix, item_item=None):
         self.books_df = books_df
         self.similarity_matrix = similarity_matrix
+        self.item_item = item_item
+        # Optional ShardedScorer over the TF-IDF rows (see CatalogState.enable_sharding)
+        self.scorer = None
+        self.refresh_popularity()
+        
+        import pandas as pd
+        self.book_index = pd.Index(books_df['book_id'])
     
-    def content_based_recommendations(self, book_ids, n_recommendations=6):
-        """Generate recommendations based on book similarity"""
+    def content_based_ranking(self, book_ids, n_recommendations=6, allowed=None, weights=None, scored=False):
+        """Rank books by similarity, as a list of (book_id, None) pairs.
+        
+        weights (one per book id, see utils/preferences.py) replace the plain
+        mean of the similarity rows by a signed sum scaled by the liked weight.
+        scored=True keeps the similarity scores in place of None.
+        """
         if not book_ids:
             return []
+        if weights is None:
+            weights = [1.0] * len(book_ids)
         
         # Get indices of input books
-        indices = [self.books_df[self.books_df['book_id'] == bid].index[0] 
-                   for bid in book_ids if bid in self.books_df['book_id'].values]
+        with metrics.timer('stage_seconds', model='content', stage='id_resolution'):
+            known = [(self.books_df[self.books_df['book_id'] == bid].index[0], weight)
+                     for bid, weight in zip(book_ids, weights) if bid in self.books_df['book_id'].values]
         
-        if not indices:
+        if not known:
             return []
+        indices = [idx for idx, _ in known]
         
-        # Calculate average similarity scores
-        sim_scores = np.mean([self.similarity_matrix[idx] for idx in indices], axis=0)
-        sim_scores = list(enumerate(sim_scores))
+        import numpy as np
+        weights = np.array([weight for _, weight in known])
+        signed = (weights < 0).any()
+        if signed:
+            weights = weights / max(weights[weights > 0].sum(), 1.0)
         
-        # Sort by similarity (excluding input books)
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-        sim_scores = [s for s in sim_scores if s[0] not in indices]
+        if self.scorer is not None:
+            # Mean of cosine rows == dot product with the mean of the L2-normalized TF-IDF rows
+            with metrics.timer('stage_seconds', model='content', stage='sharded_top_n'):
+                query = self.scorer.row_mean(indices, weights if signed else None)
+                top_indices, top_scores = self.scorer.top_n(query, n_recommendations, exclude=indices,
+                                                            allowed=allowed)
+            return self._ranking(top_indices, top_scores if scored else None)
         
-        # Get top N
-        top_indices = [i[0] for i in sim_scores[:n_recommendations]]
+        # Calculate average similarity scores (disliked rows subtract)
+        with metrics.timer('stage_seconds', model='content', stage='scoring'):
+            rows = [self.similarity_matrix[idx] for idx in indices]
+            sim_scores = weights @ np.array(rows, dtype=np.float64) if signed else np.mean(rows, axis=0)
         
-        return self.books_df.iloc[top_indices].to_dict('records')
-    
-    def collaborative_filtering_recommendations(self, user_ratings, n_recommendations=6):
-        """Generate recommendations based on user ratings"""
-        if not user_ratings:
-            return []
+        # Sort by similarity (excluding input books and filtered-out books)
+        with metrics.timer('stage_seconds', model='content', stage='top_n'):
+            order = np.argsort(-sim_scores, kind='stable')
+            keep = ~np.isin(order, indices)
+            if allowed is not None:
+                keep &= allowed.contains(order)
+            
+            # Get top N
+            top_indices = order[keep][:n_recommendations]
         
-        # Get highly rated books (4+)
-        liked_books = [book_id for book_id, rating in user_ratings.items() if rating >= 4]
+        return self._ranking(top_indices, sim_scores[top_indices] if scored else None)
+    
+    def _ranking(self, positions, scores=None):
+        """(book_id, score) pairs for catalog positions; scores of None give None scores"""
+        book_ids = self.books_df['book_id'].iloc[positions].tolist()
+        return list(zip(book_ids, scores.tolist() if scores is not None else [None] * len(book_ids)))
+    
+    def content_based_recommendations(self, book_ids, n_recommendations=6):
+        """Generate recommendations based on book similarity"""
+        return self.to_records(self.content_based_ranking(book_ids, n_recommendations))
+    
+    def collaborative_filtering_ranking(self, user_ratings, n_recommendations=6, allowed=None):
+        """Rank unrated books by preference score, as (book_id, score) pairs.
         
-        if not liked_books:
+        Categories and levels of liked books add to a book's score; those of
+        disliked books subtract DISLIKE_WEIGHT times as much.
+        """
+        weights = signed_weights(user_ratings)
+        if not weights:
             return []
         
-        # Get categories and levels from liked books
-        liked_df = self.books_df[self.books_df['book_id'].isin(liked_books)]
-        preferred_categories = liked_df['category'].value_counts().index.tolist()
-        preferred_levels = liked_df['level'].value_counts().index.tolist()
-        
-        # Score unrated books
-        rated_book_ids = list(user_ratings.keys())
-        unrated_books = self.books_df[~self.books_df['book_id'].isin(rated_book_ids)].copy()
-        
-        # Calculate score
-        def calculate_score(row):
-            score = 0
-            # Category match (highest weight)
-            if row['category'] in preferred_categories:
-                score += 50 * (1 / (preferred_categories.index(row['category']) + 1))
-            
-            # Level match
-            if row['level'] in preferred_levels:
-                score += 20
-            
-            # Book rating
-            score += row['rating'] * 10
-            
-            # Recency bonus
-            if row['year'] >= 2020:
-                score += 5
+        import numpy as np
+        books_df = self.books_df
+        
+        # Get categories and levels from liked and disliked books
+        with metrics.timer('stage_seconds', model='collaborative', stage='id_resolution'):
+            liked_df = books_df[books_df['book_id'].isin([b for b, w in weights.items() if w > 0])]
+            disliked_df = books_df[books_df['book_id'].isin([b for b, w in weights.items() if w < 0])]
             
-            return score
+            # Score unrated books
+            candidates = ~books_df['book_id'].isin(list(user_ratings)).to_numpy()
+            if allowed is not None:
+                candidates &= allowed.to_bool()
         
-        unrated_books['score'] = unrated_books.apply(calculate_score, axis=1)
-        unrated_books = unrated_books.sort_values('score', ascending=False)
+        # One vectorized pass over the catalog
+        with metrics.timer('stage_seconds', model='collaborative', stage='scoring'):
+            # Category match (highest weight), level match, book rating and recency bonus
+            scores = self._match_scores(liked_df) + books_df['rating'].to_numpy(dtype=np.float64) * 10
+            scores = scores + np.where(books_df['year'].to_numpy() >= 2020, 5, 0)
+            if len(disliked_df):
+                scores = scores - DISLIKE_WEIGHT * self._match_scores(disliked_df)
         
-        return unrated_books.head(n_recommendations).to_dict('records')
+        with metrics.timer('stage_seconds', model='collaborative', stage='top_n'):
+            positions = np.flatnonzero(candidates)
+            top = positions[np.argsort(-scores[positions], kind='stable')[:n_recommendations]]
+        
+        return list(zip(books_df['book_id'].iloc[top].tolist(), scores[top].tolist()))
     
-    def hybrid_recommendations(self, user_ratings, n_recommendations=6):
-        """Combine content-based and collaborative filtering"""
-        if not user_ratings:
-            return self.get_popular_books(n_recommendations)
+    def _match_scores(self, rated_df):
+        """50 / category rank for the categories of rated_df (most frequent first) plus 20 for its levels"""
+        import numpy as np
+        import pandas as pd
+        categories = pd.Index(rated_df['category'].value_counts().index)
+        rank = categories.get_indexer(self.books_df['category'])
+        scores = np.where(rank >= 0, 50 * (1 / np.maximum(rank + 1, 1)), 0.0)
+        return scores + np.where(self.books_df['level'].isin(rated_df['level'].unique()).to_numpy(), 20, 0)
+    
+    def collaborative_filtering_recommendations(self, user_ratings, n_recommendations=6):
+        """Generate recommendations based on user ratings"""
+        return self.to_records(self.collaborative_filtering_ranking(user_ratings, n_recommendations))
+    
+    def hybrid_ranking(self, user_ratings, n_recommendations=6, allowed=None):
+        """Combine content-based and collaborative rankings"""
+        profile = self.classify_profile(user_ratings)
+        if profile in COLD_START_PROFILES:
+            return self.cold_start_ranking(profile, 'hybrid', user_ratings, n_recommendations, allowed)
         
         # Get recommendations from both methods
-        liked_books = [book_id for book_id, rating in user_ratings.items() if rating >= 4]
-        
-        content_recs = self.content_based_recommendations(liked_books, n_recommendations * 2)
-        collab_recs = self.collaborative_filtering_recommendations(user_ratings, n_recommendations * 2)
+        content_recs = self.preference_ranking(user_ratings, n_recommendations * 2, allowed)
+        collab_recs = self.collaborative_filtering_ranking(user_ratings, n_recommendations * 2, allowed)
         
         # Merge and deduplicate
-        all_recs = {book['book_id']: book for book in content_recs + collab_recs}
+        all_recs = dict(content_recs + collab_recs)
         
         # Sort by rating and return top N
-        sorted_recs = sorted(all_recs.values(), 
-                            key=lambda x: x['rating'], 
+        ratings = self.books_df.set_index('book_id')['rating']
+        sorted_recs = sorted(all_recs.items(), 
+                            key=lambda x: ratings[x[0]], 
                             reverse=True)
         
         return sorted_recs[:n_recommendations]
     
+    def hybrid_recommendations(self, user_ratings, n_recommendations=6):
+        """Combine content-based and collaborative filtering"""
+        return self.to_records(self.hybrid_ranking(user_ratings, n_recommendations))
+    
+    def preference_ranking(self, user_ratings, n_recommendations=6, allowed=None, scored=False):
+        """Content ranking for a ratings profile: liked books attract, disliked books repel"""
+        weights = signed_weights(user_ratings)
+        return self.content_based_ranking(list(weights), n_recommendations, allowed,
+                                          list(weights.values()) if has_dislikes(weights) else None, scored)
+    
+    def item_item_ranking(self, user_ratings, n_recommendations=6, allowed=None, scored=False):
+        """Rank books co-rated with the liked books; content-based without rating data.
+        
+        Liked books weigh their rating and disliked ones -DISLIKE_WEIGHT * LIKED_RATING,
+        so books co-rated mostly with disliked books drop out.
+        """
+        weights = signed_weights(user_ratings)
+        ranking = []
+        if self.item_item is not None:
+            item_weights = {book_id: user_ratings[book_id] if weight > 0 else weight * LIKED_RATING
+                            for book_id, weight in weights.items()}
+            with metrics.timer('stage_seconds', model='item_item', stage='scoring'):
+                ranking = self.item_item.ranking(item_weights, n_recommendations, allowed)
+            if has_dislikes(weights):
+                ranking = [(book_id, score) for book_id, score in ranking if score > 0]
+        return ranking or self.preference_ranking(user_ratings, n_recommendations, allowed, scored)
+    
+    def similar_items_ranking(self, book_id, n_recommendations=5, allowed=None, scored=False):
+        """Books most often rated together with book_id; content-based without rating data"""
+        ranking = []
+        if self.item_item is not None:
+            with metrics.timer('stage_seconds', model='item_item', stage='top_n'):
+                ranking = self.item_item.similar_ranking(book_id, n_recommendations, allowed)
+        return ranking or self.content_based_ranking([book_id], n_recommendations, allowed, scored=scored)
+    
+    def classify_profile(self, user_ratings):
+        """'empty', 'unknown' (no rated book in the catalog), 'neutral' (no liked or
+        disliked catalog book), 'negative' (only disliked catalog books), 'sparse'
+        (fewer than SPARSE_PROFILE liked books) or 'full'"""
+        if not user_ratings:
+            return 'empty'
+        known = [book_id for book_id in user_ratings if book_id in self.book_index]
+        if not known:
+            return 'unknown'
+        weights = signed_weights({book_id: user_ratings[book_id] for book_id in known})
+        if not weights:
+            return 'neutral'
+        liked = sum(1 for weight in weights.values() if weight > 0)
+        if not liked:
+            return 'negative'
+        return 'sparse' if liked < SPARSE_PROFILE else 'full'
+    
+    def cold_start_ranking(self, profile, method, user_ratings, n_recommendations=6, allowed=None):
+        """The ranking for a COLD_START_PROFILES profile, without the content/collaborative pipelines.
+        
+        With no liked or disliked catalog book, content scores are empty and
+        collaborative scores reduce to the rating/recency prior (as long as the
+        profile likes or dislikes any book id), so the answers are the same as
+        the full pipelines'.
+        """
+        if profile == 'empty':
+            return self.popular_ranking(n_recommendations, allowed) if method == 'hybrid' else []
+        if method not in ('collaborative', 'hybrid') or not signed_weights(user_ratings):
+            return []
+        if method == 'collaborative':
+            return self.prior_ranking(user_ratings, n_recommendations, allowed)
+        # Hybrid re-sorts the collaborative candidates by catalog rating
+        ranking = self.prior_ranking(user_ratings, n_recommendations * 2, allowed)
+        ratings = self.books_df['rating'].to_numpy()[self.book_index.get_indexer([b for b, _ in ranking])]
+        order = sorted(range(len(ranking)), key=lambda i: ratings[i], reverse=True)
+        return [ranking[i] for i in order[:n_recommendations]]
+    
+    def prior_ranking(self, user_ratings, n=6, allowed=None):
+        """Unrated books by the collaborative score without category or level matches"""
+        import numpy as np
+        order = self.prior_order
+        keep = ~np.isin(self.books_df['book_id'].to_numpy()[order], list(user_ratings))
+        if allowed is not None:
+            keep &= allowed.contains(order)
+        top = order[keep][:n]
+        return list(zip(self.books_df['book_id'].iloc[top].tolist(), self.prior_scores[top].tolist()))
+    
+    def refresh_popularity(self):
+        """Sort the popularity and prior rankings (see update_popularity for rating changes)"""
+        import numpy as np
+        self.popular_order = np.argsort(-self.books_df['rating'].to_numpy(), kind='stable')
+        self.popular_ids = self.books_df['book_id'].to_numpy()[self.popular_order]
+        
+        # Collaborative score of a profile with no liked or disliked catalog book: rating plus the recency bonus
+        self.prior_scores = self._prior_scores(slice(None))
+        self.prior_order = np.argsort(-self.prior_scores, kind='stable')
+    
+    def update_popularity(self, positions):
+        """Move the books at positions, whose ratings changed, within the popularity and prior rankings.
+        
+        New arrays are built and swapped in, so concurrent requests never see a half-updated order.
+        """
+        popular_order = reposition(self.popular_order, -self.books_df['rating'].to_numpy(), positions)
+        prior_scores = self.prior_scores.copy()
+        prior_scores[positions] = self._prior_scores(positions)
+        prior_order = reposition(self.prior_order, -prior_scores, positions)
+        self.popular_order, self.popular_ids, self.prior_scores, self.prior_order = (
+            popular_order, self.books_df['book_id'].to_numpy()[popular_order], prior_scores, prior_order)
+    
+    def _prior_scores(self, positions):
+        import numpy as np
+        scores = self.books_df['rating'].to_numpy(dtype=np.float64)[positions] * 10
+        if 'year' in self.books_df:
+            scores = scores + 5 * (self.books_df['year'].to_numpy()[positions] >= 2020)
+        return scores
+    
+    def popular_ranking(self, n=6, allowed=None):
+        """Highest rated books, as (book_id, None) pairs"""
+        if allowed is None:
+            return [(book_id, None) for book_id in self.popular_ids[:n].tolist()]
+        top = self.popular_order[allowed.contains(self.popular_order)][:n]
+        return [(book_id, None) for book_id in self.books_df['book_id'].iloc[top].tolist()]
+    
     def get_popular_books(self, n=6):
         """Get popular books as fallback"""
-        return self.books_df.nlargest(n, 'rating').to_dict('records')
+        return self.to_records(self.popular_ranking(n))
+    
+    def diversify(self, ranking, n_recommendations=6, diversity=0.3):
+        """MMR re-ranking: trade rank-order relevance against TF-IDF similarity to earlier picks"""
+        if diversity <= 0 or len(ranking) <= 1:
+            return ranking[:n_recommendations]
+        from utils.rerank import mmr_rerank, rank_relevance
+        
+        with metrics.timer('stage_seconds', model='mmr', stage='rerank'):
+            positions = self.book_index.get_indexer([book_id for book_id, _ in ranking])
+            order = mmr_rerank(positions, rank_relevance(len(ranking)), self.similarity_matrix,
+                               n_recommendations, diversity)
+        return [ranking[i] for i in order]
+    
+    def to_records(self, ranking):
+        """Expand a ranking into book dicts, adding 'score' where one is set"""
+        books = self.books_df.set_index('book_id', drop=False)
+        records = books.loc[[book_id for book_id, _ in ranking]].to_dict('records')
+        for record, (_, score) in zip(records, ranking):
+            if score is not None:
+                record['score'] = score
+        return records
 
 
-# Initialize recommender
-recommender = BookRecommender(df_books, cosine_sim)
+class CatalogState:
+    """Everything the API serves from: the catalog, its similarity model and JSON cache"""
+    
+    def __init__(self, books_df, cosine_sim, tfidf=None, tfidf_matrix=None, item_item=None):
+        self.books_df = books_df
+        self.tfidf = tfidf
+        self.tfidf_matrix = tfidf_matrix
+        self.cosine_sim = cosine_sim
+        self.item_item = item_item
+        # Optional VectorStore of dense book embeddings (see enable_embeddings)
+        self.embeddings = None
+        # Review counts and unrounded rating sums per book, kept by apply_rating_events
+        self.review_counts = None
+        self.rating_sums = None
+        # Bumped whenever ratings change, so cached results from before are not reused
+        self.generation = 0
+        
+        # Initialize recommender
+        self.recommender = BookRecommender(books_df, cosine_sim, item_item)
+        
+        # Bitsets for category/level/year/rating filters
+        from utils.filters import FilterIndex
+        self.filters = FilterIndex(books_df)
+        
+        # Counts, mean rating and distinct authors for /api/stats, kept current by rating events
+        from utils.statistics import CatalogStatistics
+        self.stats = CatalogStatistics.from_frame(books_df)
+        
+        # Pre-rendered JSON for every book; call serializer.update() when rows change
+        self.serializer = BookSerializer(books_df)
+    
+    def apply_rating_events(self, review_deltas, sum_deltas, pair_counts):
+        """Fold aggregated rating events into ratings, review counts, popularity and item-item"""
+        import numpy as np
+        
+        books_df = self.books_df
+        if self.review_counts is None:
+            # Without a num_reviews column the catalog rating counts as DEFAULT_REVIEWS reviews
+            self.review_counts = (books_df['num_reviews'].to_numpy(dtype=np.float64) if 'num_reviews' in books_df
+                                  else np.full(len(books_df), float(DEFAULT_REVIEWS)))
+            self.rating_sums = books_df['rating'].to_numpy(dtype=np.float64) * self.review_counts
+        positions = self.recommender.book_index.get_indexer(list(sum_deltas))
+        positions = np.unique(positions[positions >= 0])
+        if len(positions) == 0:
+            return
+        book_ids = books_df['book_id'].to_numpy()[positions].tolist()
+        new_reviews = self.review_counts[positions] + [review_deltas.get(b, 0) for b in book_ids]
+        # Sums stay unrounded so that small batches add up; only the rating column is rounded
+        totals = self.rating_sums[positions] + [sum_deltas[b] for b in book_ids]
+        
+        self.review_counts[positions] = new_reviews
+        self.rating_sums[positions] = totals
+        new_ratings = np.round(totals / np.maximum(new_reviews, 1), 2)
+        self.stats.update_ratings(books_df['rating'].to_numpy()[positions], new_ratings)
+        
+        # Requests keep reading the frame they started with: the changed columns
+        # go into a shallow copy that replaces it everywhere
+        updated = books_df.copy(deep=False)
+        for column, values in (('rating', new_ratings), ('num_reviews', new_reviews.astype(int))):
+            if column in books_df:
+                data = books_df[column].to_numpy().copy()
+                data[positions] = values
+                updated[column] = data
+        self.replace_books(updated)
+        
+        self.serializer.update(updated.iloc[positions])
+        self.generation += 1
+        # Only the touched books move: no catalog-wide re-sort or bitset rebuild per batch
+        self.recommender.update_popularity(positions)
+        self.filters.update_ratings(positions, new_ratings)
+        if self.item_item is not None:
+            self.item_item.add_cooccurrences(review_deltas, pair_counts)
+    
+    def replace_books(self, books_df):
+        """Point every reader at books_df, a frame with the same rows in the same order"""
+        self.books_df = books_df
+        self.recommender.books_df = books_df
+        self.filters.books_df = books_df
+        if self.item_item is not None:
+            self.item_item.books_df = books_df
+    
+    def enable_embeddings(self, path, dim=128, model=None):
+        """Serve content rankings from dense book embeddings in the vector store at path.
+        
+        A store written for this catalog's books and text with the same settings
+        is memory-mapped as is (snapshots can use it too); otherwise the
+        embeddings are computed (see models.embeddings.embed_books) and written
+        to path first.
+        """
+        from models.embeddings import VectorStore, catalog_fingerprint, embed_books
+        
+        book_ids = self.books_df['book_id'].to_numpy()
+        # Snapshots carry no TF-IDF matrix; their LSA input is the catalog text vectorized as build_similarity does
+        features = type(self.tfidf).__name__ if self.tfidf_matrix is not None else 'TfidfVectorizer'
+        fingerprint = catalog_fingerprint(self.books_df, dim=dim, model=model, features=features)
+        store = VectorStore(path) if VectorStore.exists(path) else None
+        if store is None or not store.matches(book_ids, fingerprint):
+            start = time.perf_counter()
+            tfidf_matrix = self.tfidf_matrix
+            if tfidf_matrix is None:
+                from sklearn.feature_extraction.text import TfidfVectorizer
+                tfidf_matrix = TfidfVectorizer(stop_words='english').fit_transform(self.books_df['content'])
+            vectors, method = embed_books(self.books_df, tfidf_matrix, dim, model)
+            store = VectorStore.write(path, vectors, book_ids, method=method, fingerprint=fingerprint)
+            metrics.set_gauge('model_load_seconds', time.perf_counter() - start, model='embeddings')
+        self.close()
+        self.embeddings = store
+        self.recommender.scorer = store
+    
+    def enable_sharding(self, n_workers=None, n_shards=None):
+        """Serve content rankings from the embeddings (or TF-IDF rows) scored in parallel shards"""
+        from models.sharded import ShardedScorer
+        matrix = self.embeddings.vectors if self.embeddings is not None else self.tfidf_matrix
+        if matrix is None:
+            raise ValueError("Sharded scoring needs the TF-IDF matrix or embeddings; snapshots do not include TF-IDF")
+        scorer = ShardedScorer(matrix, n_shards, n_workers)
+        self.close()
+        self.recommender.scorer = scorer
+    
+    def close(self):
+        """Stop the scoring workers (called by the registry when this version is retired)"""
+        scorer = self.recommender.scorer
+        if scorer is not None and scorer is not self.embeddings:
+            scorer.close()
+        self.recommender.scorer = self.embeddings
+    
+    @classmethod
+    def build(cls, books_df, ratings_df=None, precision='float64', features='tfidf'):
+        """Fit TF-IDF on the catalog (imports scikit-learn) and item-item on the ratings.
 
+        precision sets how the similarity matrix is stored (see utils/quantization.py)
+        and features the content representation (see build_similarity).
+        """
+        from utils.quantization import quantize
+        
+        tfidf, tfidf_matrix, cosine_sim = build_similarity(books_df, features)
+        return cls(books_df, quantize(cosine_sim, precision), tfidf, tfidf_matrix,
+                   build_item_item(books_df, ratings_df))
+    
+    @classmethod
+    def load(cls, path):
+        """Load a snapshot written by save(); no scikit-learn needed.
+        
+        Raises ValueError when path does not hold a catalog snapshot. Snapshots
+        are pickles: only load files from a trusted location.
+        """
+        start = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+            catalog = cls(data['books_df'], data['cosine_sim'], item_item=data.get('item_item'))
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, KeyError,
+                TypeError, ValueError) as e:
+            raise ValueError(f"Not a catalog snapshot: {os.path.basename(path)} ({e!r})") from e
+        metrics.set_gauge('model_load_seconds', time.perf_counter() - start, model='snapshot')
+        return catalog
+    
+    def save(self, path):
+        """Save the catalog, similarity matrix and item-item index for fast cold starts"""
+        with open(path, 'wb') as f:
+            pickle.dump({'books_df': self.books_df, 'cosine_sim': self.cosine_sim,
+                         'item_item': self.item_item}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        print(f"✓ Catalog snapshot saved to {path}")
 
-@app.route('/api/books', methods=['GET'])
+
+def start_event_ingestion(app, registry, ratings_df, path):
+    """Replay the event log into the active catalogs, then log and apply new events in the background"""
+    aggregator = RatingAggregator()
+    if ratings_df is None:
+        ratings_df = load_ratings()
+    if ratings_df is not None:
+        aggregator.seed(ratings_df)
+    
+    def apply(events):
+        deltas = aggregator.process(events)
+        for catalog in registry.active_models():
+            catalog.apply_rating_events(*deltas)
+    
+    replayed = list(read_events(path))
+    if replayed:
+        apply(replayed)
+        print(f"✓ Replayed {len(replayed)} rating events from {path}")
+    
+    worker = BatchWorker(apply)
+    event_log = EventLog(path, on_batch=worker.submit,
+                         flush_interval=float(os.environ.get('EVENT_FLUSH_INTERVAL', '0.05')))
+    atexit.register(event_log.close)
+    app.extensions['events'] = event_log
+    app.extensions['event_worker'] = worker
+
+
+def create_app(books_df=None, snapshot_path=None, ratings_df=None, event_log=None):
+    """App factory: build (or load from MODEL_SNAPSHOT) the model state and register routes"""
+    start = time.perf_counter()
+    import pandas as pd
+    
+    snapshot_path = snapshot_path or os.environ.get('MODEL_SNAPSHOT')
+    registry = ModelRegistry()
+    if books_df is None and snapshot_path and os.path.exists(snapshot_path):
+        catalog = CatalogState.load(snapshot_path)
+        registry.register('default', '1', catalog, source=snapshot_path)
+    else:
+        if ratings_df is None:
+            ratings_df = load_ratings()
+        # MODEL_PRECISION: float64 (default), float32, float16 or int8 similarity storage
+        precision = os.environ.get('MODEL_PRECISION', 'float64')
+        # CONTENT_FEATURES: tfidf (default) or hashed (no vocabulary, includes author/description)
+        catalog = CatalogState.build(books_df if books_df is not None else pd.DataFrame(tech_books_data),
+                                     ratings_df, precision, os.environ.get('CONTENT_FEATURES', 'tfidf'))
+        registry.register('default', '1', catalog, source='build', precision=precision)
+    # EMBEDDING_STORE: serve content rankings from dense embeddings in that directory
+    # (built there on first start; EMBEDDING_DIM, EMBEDDING_MODEL choose how)
+    embedding_store = os.environ.get('EMBEDDING_STORE')
+    if embedding_store:
+        catalog.enable_embeddings(embedding_store, int(os.environ.get('EMBEDDING_DIM', 128)),
+                                  os.environ.get('EMBEDDING_MODEL'))
+    # SCORING_WORKERS: score content rankings in that many worker processes
+    scoring_workers = os.environ.get('SCORING_WORKERS')
+    if scoring_workers and (catalog.tfidf_matrix is not None or catalog.embeddings is not None):
+        catalog.enable_sharding(int(scoring_workers))
+        atexit.register(catalog.close)
+    
+    app = Flask(__name__)
+    CORS(app)
+    # Catalog models by name and version; admin endpoints hot swap them
+    app.extensions['registry'] = registry
+    # Opt-in request profiling (PROFILING_ENABLED=1, X-Profile: 1 or PROFILE_SAMPLE_RATE)
+    app.extensions['profiler'] = profiler_from_env()
+    # Rating event ingestion is enabled by EVENT_LOG (path of the append-only log)
+    event_log = event_log or os.environ.get('EVENT_LOG')
+    if event_log:
+        start_event_ingestion(app, registry, ratings_df, event_log)
+    # RESULT_CACHE_SIZE: cache that many rendered recommend/similar responses (0 disables)
+    cache_size = int(os.environ.get('RESULT_CACHE_SIZE', 0))
+    if cache_size > 0:
+        from utils.cache import ResultCache
+        app.extensions['result_cache'] = ResultCache(cache_size)
+    # Load shedding for /api/recommend (DEGRADE_IN_FLIGHT, SHED_IN_FLIGHT, DEGRADE_LATENCY_MS)
+    app.extensions['admission'] = admission_from_env()
+    app.register_blueprint(api)
+    
+    startup_seconds = time.perf_counter() - start
+    metrics.set_gauge('startup_seconds', IMPORT_SECONDS, phase='import')
+    metrics.set_gauge('startup_seconds', startup_seconds, phase='create_app')
+    print(f"✓ App ready: import {IMPORT_SECONDS:.3f}s, startup {startup_seconds:.3f}s "
+          f"({len(catalog.books_df)} books)")
+    return app
+
+
+def current_registry():
+    return current_app.extensions['registry']
+
+
+def current_catalog():
+    """The catalog serving this request, leased from the registry on first use.
+
+    The variant comes from the X-Model-Variant header, or from the registry's
+    traffic weights (keyed on X-User-Id so a user sticks to one variant).
+    """
+    entry = g.get('model_entry')
+    if entry is None:
+        registry = current_registry()
+        name = registry.choose(request.headers.get('X-Model-Variant'), request.headers.get('X-User-Id'))
+        entry = g.model_entry = registry.acquire(name)
+    return entry.model
+
+
+def current_profiler():
+    return current_app.extensions['profiler']
+
+
+def json_response(render, *args, status=200, mimetype=JSON_MIMETYPE):
+    """Build a JSON (or other mimetype) response from serializer output, timing the serialization"""
+    start = time.perf_counter()
+    body = render(*args)
+    g.serialize_seconds = time.perf_counter() - start
+    metrics.observe('stage_seconds', g.serialize_seconds, model='api', stage='serialization')
+    return Response(body, status=status, mimetype=mimetype)
+
+
+def ranking_mimetype():
+    """Ranking response format negotiated from the Accept header (see utils/serialization.py), JSON by default"""
+    return request.accept_mimetypes.best_match(list(RANKING_MIMETYPES), default=JSON_MIMETYPE)
+
+
+def cached_ranking(key, rank, degraded=None, mimetype=JSON_MIMETYPE):
+    """Rendered ranking for key from the result cache, or rank() rendered and cached.
+
+    key holds the normalized request parameters; the serving model version,
+    catalog generation and response mimetype are added here. degraded names
+    the cheaper strategy rank() falls back to under overload: a cached full
+    result is still served, otherwise the degraded ranking is returned
+    without being cached. Compact mimetypes are encoded straight from the
+    (book_id, score) pairs, without the book fragments.
+    """
+    catalog = current_catalog()
+    render = RANKING_MIMETYPES[mimetype] or catalog.serializer.render_ranking
+    cache = current_app.extensions.get('result_cache')
+    if cache is None:
+        g.degraded_mode = degraded
+        response = json_response(render, rank(), mimetype=mimetype)
+        response.vary.add('Accept')
+        return response
+    key = (g.model_entry.label, catalog.generation, mimetype) + key
+    body = cache.get(key)
+    metrics.cache_lookup('results', body is not None)
+    if body is not None:
+        g.degraded_mode = degraded and 'cached'
+        response = Response(body, mimetype=mimetype)
+        response.vary.add('Accept')
+        response.headers['X-Cache'] = 'hit'
+        return response
+    g.degraded_mode = degraded
+    response = json_response(render, rank(), mimetype=mimetype)
+    response.vary.add('Accept')
+    if degraded:
+        response.headers['X-Cache'] = 'miss'
+        return response
+    cache.put(key, response.get_data())
+    response.headers['X-Cache'] = 'miss'
+    return response
+
+
+@api.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@api.before_app_request
+def admit_request():
+    """Pick the serving mode of a recommend request from the current load"""
+    admission = current_app.extensions.get('admission')
+    if admission is not None and request.endpoint == 'api.recommend':
+        g.queue_seconds = request_queue_seconds(request.headers.get('X-Request-Start'))
+        g.serving_mode = admission.enter(g.queue_seconds)
+        metrics.set_gauge('recommend_in_flight', admission.in_flight)
+
+
+@api.teardown_app_request
+def release_admission(error=None):
+    mode = g.pop('serving_mode', None)
+    if mode is not None:
+        current_app.extensions['admission'].leave(g.queue_seconds + time.perf_counter() - g.request_start)
+
+
+@api.after_app_request
+def add_server_timing(response):
+    """Report serialization time and its share of the request in Server-Timing"""
+    if metrics.enabled and request.endpoint != 'api.get_metrics':
+        endpoint = request.endpoint or 'unmatched'
+        metrics.observe('request_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+        metrics.inc('requests_total', endpoint=endpoint, status=response.status_code)
+    
+    entry = g.get('model_entry')
+    if entry is not None:
+        # Lets clients and dashboards attribute latency and feedback to a variant
+        response.headers['X-Model-Variant'] = entry.label
+        metrics.observe('variant_request_seconds', time.perf_counter() - g.request_start,
+                        variant=entry.name, version=entry.version)
+    
+    degraded_mode = g.get('degraded_mode')
+    if degraded_mode:
+        response.headers['X-Degraded-Mode'] = degraded_mode
+        metrics.inc('degraded_requests_total', mode=degraded_mode)
+    
+    serialize_seconds = g.get('serialize_seconds')
+    if serialize_seconds is not None:
+        total_seconds = time.perf_counter() - g.request_start
+        share = serialize_seconds / total_seconds if total_seconds > 0 else 0.0
+        response.headers['Server-Timing'] = (
+            f'serialize;dur={serialize_seconds * 1000:.3f};desc="{share:.1%} of request", '
+            f'total;dur={total_seconds * 1000:.3f}'
+        )
+    return response
+
+
+@api.teardown_app_request
+def release_model(error=None):
+    entry = g.pop('model_entry', None)
+    if entry is not None:
+        current_registry().release(entry)
+
+
+@api.before_app_request
+def start_profile():
+    profiler = current_profiler()
+    if profiler.enabled and profiler.should_profile(request.headers):
+        g.profile = profiler.start()
+
+
+def _finish_profile(status):
+    handle = g.pop('profile', None)
+    if handle is None:
+        return None
+    return current_profiler().finish(
+        handle,
+        method=request.method,
+        path=request.full_path.rstrip('?'),
+        status=status,
+        payload=request.get_data(as_text=True)[:4096]
+    )
+
+
+@api.after_app_request
+def stop_profile(response):
+    profile_id = _finish_profile(response.status_code)
+    if profile_id:
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+@api.teardown_app_request
+def discard_profile(error=None):
+    # after_request is skipped when a handler raises; still record the profile
+    _finish_profile(500)
+
+
+def request_filters(source):
+    """(FilterMask or None, error response or None) for the filter parameters in source"""
+    from utils.filters import parse_filters
+    try:
+        filters = parse_filters(source)
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    return current_catalog().filters.mask(filters), None
+
+
+def request_diversity(value):
+    """(diversity, error response or None) for a 0-1 diversity parameter"""
+    try:
+        diversity = float(value or 0)
+    except (TypeError, ValueError):
+        diversity = -1.0
+    if not 0 <= diversity <= 1:
+        return None, (jsonify({'error': 'diversity must be a number between 0 and 1'}), 400)
+    return diversity, None
+
+
+def candidate_count(n, diversity):
+    """How many candidates to rank before diversity re-ranking picks n"""
+    if diversity <= 0:
+        return n
+    return max(n, min(n * DIVERSITY_CANDIDATES, MAX_DIVERSITY_CANDIDATES))
+
+
+def admin_error():
+    """Error response unless the request carries the ADMIN_TOKEN; without one the admin API is off"""
+    token = os.environ.get('ADMIN_TOKEN')
+    if not token:
+        return jsonify({'error': 'Admin API is disabled (set ADMIN_TOKEN)'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), token.encode()):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return None
+
+
+@api.route('/api/books', methods=['GET'])
 def get_books():
-    """Get all books with optional filtering"""
-    category = request.args.get('category', 'All')
+    """Get all books with optional filtering (category, level, year_min, year_max, min_rating, exclude, search)"""
     search = request.args.get('search', '').lower()
     
-    filtered_df = df_books.copy()
+    catalog = current_catalog()
+    filtered_df = catalog.books_df
     
-    if category != 'All':
-        filtered_df = filtered_df[filtered_df['category'] == category]
+    allowed, error = request_filters(request.args)
+    if error:
+        return error
+    if allowed is not None:
+        filtered_df = filtered_df.iloc[allowed.positions()]
     
     if search:
         filtered_df = filtered_df[
@@ -195,54 +930,318 @@ def get_books():
             filtered_df['author'].str.lower().str.contains(search)
         ]
     
-    return jsonify(filtered_df.to_dict('records'))
+    return json_response(catalog.serializer.render, filtered_df['book_id'].tolist())
 
 
-@app.route('/api/recommend', methods=['POST'])
+@api.route('/api/recommend', methods=['POST'])
 def recommend():
     """Get personalized recommendations"""
     data = request.json
     user_ratings = data.get('ratings', {})
-    method = data.get('method', 'hybrid')  # 'content', 'collaborative', 'hybrid'
+    user_id = data.get('user_id')
+    allowed, error = request_filters(data.get('filters'))
+    if error:
+        return error
+    diversity, error = request_diversity(data.get('diversity'))
+    if error:
+        return error
+    method = data.get('method', 'hybrid')  # 'content', 'collaborative', 'item_item', 'hybrid'
     n_recommendations = data.get('n', 6)
     
+    catalog = current_catalog()
+    recommender = catalog.recommender
+    
     # Convert string keys to integers
-    user_ratings = {int(k): v for k, v in user_ratings.items()}
+    with metrics.timer('stage_seconds', model='api', stage='id_resolution'):
+        user_ratings = {int(k): v for k, v in user_ratings.items()}
+    
+    # Ratings from identified users feed the event log when ingestion is on
+    event_log = current_app.extensions.get('events')
+    if event_log is not None and user_id is not None and user_ratings:
+        try:
+            event_log.append([validate_event({'user_id': user_id, 'book_id': book_id, 'rating': rating})
+                              for book_id, rating in user_ratings.items()])
+        except ValueError:
+            pass
+    
+    # Profiles without a liked or disliked catalog book skip the ranking pipelines
+    profile = recommender.classify_profile(user_ratings)
+    cold_start = profile in COLD_START_PROFILES
+    metrics.inc('recommend_profiles_total', profile=profile, path='cold_start' if cold_start else 'pipeline')
+    
+    # Under overload (see utils/admission.py) the pipelines give way to cheaper strategies
+    mode = g.get('serving_mode', 'full')
+    degraded = None if cold_start or mode == 'full' else mode
     
-    if method == 'content':
-        liked_books = [book_id for book_id, rating in user_ratings.items() if rating >= 4]
-        recommendations = recommender.content_based_recommendations(liked_books, n_recommendations)
-    elif method == 'collaborative':
-        recommendations = recommender.collaborative_filtering_recommendations(user_ratings, n_recommendations)
-    else:  # hybrid
-        recommendations = recommender.hybrid_recommendations(user_ratings, n_recommendations)
+    # Compact formats carry content similarity scores that JSON responses omit
+    mimetype = ranking_mimetype()
+    scored = mimetype != JSON_MIMETYPE
     
-    return jsonify(recommendations)
+    def rank():
+        n_candidates = candidate_count(n_recommendations, diversity)
+        if degraded == 'popular':
+            return recommender.popular_ranking(n_recommendations, allowed)
+        if degraded == 'content':
+            return (recommender.preference_ranking(user_ratings, n_recommendations, allowed, scored) or
+                    recommender.popular_ranking(n_recommendations, allowed))
+        if cold_start:
+            ranking = recommender.cold_start_ranking(profile, method, user_ratings, n_candidates, allowed)
+        elif method == 'content':
+            ranking = recommender.preference_ranking(user_ratings, n_candidates, allowed, scored)
+        elif method == 'collaborative':
+            ranking = recommender.collaborative_filtering_ranking(user_ratings, n_candidates, allowed)
+        elif method == 'item_item':
+            ranking = recommender.item_item_ranking(user_ratings, n_candidates, allowed, scored)
+        else:  # hybrid
+            ranking = recommender.hybrid_ranking(user_ratings, n_candidates, allowed)
+        
+        if diversity > 0:
+            ranking = recommender.diversify(ranking, n_recommendations, diversity)
+        return ranking
+    
+    key = ('recommend', method, n_recommendations, diversity, tuple(sorted(user_ratings.items())),
+           json.dumps(data.get('filters'), sort_keys=True))
+    return cached_ranking(key, rank, degraded, mimetype)
 
 
-@app.route('/api/categories', methods=['GET'])
+@api.route('/api/categories', methods=['GET'])
 def get_categories():
     """Get all unique categories"""
-    categories = ['All'] + sorted(df_books['category'].unique().tolist())
-    return jsonify(categories)
+    categories = ['All'] + sorted(current_catalog().books_df['category'].unique().tolist())
+    return json_response(dumps, categories)
 
 
-@app.route('/api/book/<int:book_id>', methods=['GET'])
+@api.route('/api/book/<int:book_id>', methods=['GET'])
 def get_book_details(book_id):
     """Get details of a specific book"""
-    book = df_books[df_books['book_id'] == book_id]
-    if book.empty:
+    serializer = current_catalog().serializer
+    found = book_id in serializer.fragments
+    metrics.cache_lookup('book_fragments', found)
+    if not found:
         return jsonify({'error': 'Book not found'}), 404
-    return jsonify(book.to_dict('records')[0])
+    return json_response(serializer.render_book, book_id)
 
 
-@app.route('/api/similar/<int:book_id>', methods=['GET'])
+@api.route('/api/similar/<int:book_id>', methods=['GET'])
 def get_similar_books(book_id):
-    """Get similar books to a given book"""
+    """Get similar books to a given book (?method=item_item for co-rated books)"""
     n = request.args.get('n', 5, type=int)
-    recommendations = recommender.content_based_recommendations([book_id], n)
-    return jsonify(recommendations)
+    catalog = current_catalog()
+    allowed, error = request_filters(request.args)
+    if error:
+        return error
+    diversity, error = request_diversity(request.args.get('diversity'))
+    if error:
+        return error
+    method = request.args.get('method')
+    mimetype = ranking_mimetype()
+    scored = mimetype != JSON_MIMETYPE
+    
+    def rank():
+        n_candidates = candidate_count(n, diversity)
+        if method == 'item_item':
+            ranking = catalog.recommender.similar_items_ranking(book_id, n_candidates, allowed, scored)
+        else:
+            ranking = catalog.recommender.content_based_ranking([book_id], n_candidates, allowed, scored=scored)
+        if diversity > 0:
+            ranking = catalog.recommender.diversify(ranking, n, diversity)
+        return ranking
+    
+    key = ('similar', book_id, method, n, diversity, tuple(sorted(request.args.items(multi=True))))
+    return cached_ranking(key, rank, mimetype=mimetype)
+
+
+@api.route('/api/events', methods=['POST'])
+def ingest_events():
+    """Append rating events ({"user_id", "book_id", "rating"} or {"events": [...]}) to the event log"""
+    event_log = current_app.extensions.get('events')
+    if event_log is None:
+        return jsonify({'error': 'Event ingestion is disabled'}), 404
+    data = request.get_json(silent=True)
+    events = data.get('events') if isinstance(data, dict) and 'events' in data else [data]
+    if not isinstance(events, list) or not events:
+        return jsonify({'error': 'No events'}), 400
+    try:
+        events = [validate_event(event) for event in events]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    event_log.append(events)
+    metrics.inc('events_received_total', len(events))
+    # Accepted, not yet durable: the writer fsyncs within EVENT_FLUSH_INTERVAL
+    return jsonify({'accepted': len(events)}), 202
+
+
+@api.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Catalog statistics, maintained incrementally (no scan of the catalog)"""
+    catalog = current_catalog()
+    stats = catalog.stats.to_dict()
+    # The popularity order is already sorted, so the current top rated books are its head
+    top = catalog.books_df.iloc[catalog.recommender.popular_order[:catalog.stats.top_k]]
+    stats['top_rated'] = top[['book_id', 'title', 'rating']].to_dict('records')
+    return jsonify(stats)
+
+
+@api.route('/api/health', methods=['GET'])
+def health():
+    """Liveness for load balancers and the cluster router (no model lease)"""
+    registry = current_registry()
+    return jsonify({'status': 'ok', 'node': os.environ.get('NODE_ID'), 'model': registry.get().label})
+
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Latency histograms, counters and model load times in Prometheus text format"""
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@api.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """List stored request profiles, newest first"""
+    error = admin_error()
+    if error:
+        return error
+    profiler = current_profiler()
+    if not profiler.enabled:
+        return jsonify({'error': 'Profiling is disabled'}), 404
+    return jsonify(profiler.store.summaries())
+
+
+@api.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Get a stored profile as text, or as a .prof file with ?format=pstats"""
+    error = admin_error()
+    if error:
+        return error
+    profile = current_profiler().store.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    if request.args.get('format') == 'pstats':
+        return Response(profile['raw'], mimetype='application/octet-stream', headers={
+            'Content-Disposition': f'attachment; filename={profile_id}.prof'
+        })
+    return Response(profile['text'], mimetype='text/plain')
+
+
+@api.route('/api/admin/models', methods=['GET'])
+def list_models():
+    """List registered model versions, the active ones and traffic weights"""
+    error = admin_error()
+    if error:
+        return error
+    return jsonify(current_registry().summaries())
+
+
+def snapshot_path(name):
+    """Path of snapshot file name inside SNAPSHOT_DIR; None when it would resolve outside it"""
+    root = os.path.realpath(os.environ['SNAPSHOT_DIR'])
+    path = os.path.realpath(os.path.join(root, name))
+    if path == root or os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+@api.route('/api/admin/models', methods=['POST'])
+def load_model():
+    """Load a SNAPSHOT_DIR snapshot as a new version; live traffic moves to it unless activate=false"""
+    error = admin_error()
+    if error:
+        return error
+    if not os.environ.get('SNAPSHOT_DIR'):
+        return jsonify({'error': 'Snapshot loading is disabled (set SNAPSHOT_DIR)'}), 404
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    name = data.get('name', 'default')
+    version = str(data.get('version', ''))
+    snapshot = data.get('snapshot')
+    if not version or not snapshot or not isinstance(snapshot, str):
+        return jsonify({'error': 'version and snapshot are required'}), 400
+    path = snapshot_path(snapshot)
+    if path is None:
+        return jsonify({'error': 'snapshot must name a file in SNAPSHOT_DIR'}), 400
+    if not os.path.isfile(path):
+        return jsonify({'error': f'Snapshot not found: {snapshot}'}), 404
+    
+    # Loading happens on this request's thread; other requests keep being served
+    try:
+        catalog = CatalogState.load(path)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        entry = current_registry().register(name, version, catalog, activate=data.get('activate', True),
+                                            source=snapshot)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'name': entry.name, 'version': entry.version}), 201
+
+
+@api.route('/api/admin/models/<name>/activate', methods=['POST'])
+def activate_model(name):
+    """Hot swap name to a registered version (e.g. to roll back)"""
+    error = admin_error()
+    if error:
+        return error
+    version = str((request.json or {}).get('version', ''))
+    try:
+        entry = current_registry().activate(name, version)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    return jsonify({'name': entry.name, 'version': entry.version})
+
+
+@api.route('/api/admin/models/<name>/<version>', methods=['DELETE'])
+def retire_model(name, version):
+    """Drop an inactive version; it is freed once in-flight requests finish"""
+    error = admin_error()
+    if error:
+        return error
+    registry = current_registry()
+    try:
+        registry.retire(name, version)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(registry.summaries())
+
+
+@api.route('/api/admin/variants', methods=['PUT'])
+def set_variant_weights():
+    """Split traffic across model names for A/B tests, e.g. {"default": 90, "candidate": 10}"""
+    error = admin_error()
+    if error:
+        return error
+    registry = current_registry()
+    try:
+        registry.set_weights(request.json or {})
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(registry.summaries())
+
+
+IMPORT_SECONDS = time.perf_counter() - _import_start
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Tech Book Recommender API')
+    parser.add_argument('--save-snapshot', metavar='PATH',
+                        help='build the catalog model, save it for MODEL_SNAPSHOT and exit')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--debug', action=argparse.BooleanOptionalAction, default=True,
+                        help='Flask debug mode with the reloader (--no-debug for cluster nodes)')
+    args = parser.parse_args()
+    
+    app = create_app()
+    if args.save_snapshot:
+        app.extensions['registry'].get().model.save(args.save_snapshot)
+    else:
+        app.run(host=args.host, port=args.port, debug=args.debug, threaded=True)
\ No newline at end of file
@@ -0,0 +1,161 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+
+class ALSTrainer:
+    """Alternating least squares (explicit or implicit-confidence) on sparse CSR ratings"""
+
+    def __init__(self, n_factors=10, regularization=0.1, implicit=False, alpha=40.0,
+                 iterations=15, tol=1e-4, n_jobs=None, random_state=42, verbose=True):
+        self.n_factors = n_factors
+        self.regularization = regularization
+        self.implicit = implicit
+        self.alpha = alpha
+        self.iterations = iterations
+        self.tol = tol
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.random_state = random_state
+        self.verbose = verbose
+        self.history = []
+
+    def fit(self, ratings):
+        """Train on a (users x items) sparse matrix; returns (user_factors, item_factors)"""
+        user_items = sp.csr_matrix(ratings, dtype=np.float64)
+        item_users = user_items.T.tocsr()
+        n_users, n_items = user_items.shape
+
+        rng = np.random.default_rng(self.random_state)
+        user_factors = np.zeros((n_users, self.n_factors))
+        item_factors = rng.normal(0, 0.01, size=(n_items, self.n_factors))
+
+        self.history = []
+        previous_loss = None
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as pool:
+            for epoch in range(1, self.iterations + 1):
+                start = time.perf_counter()
+                user_factors = self._solve_rows(pool, user_items, item_factors)
+                item_factors = self._solve_rows(pool, item_users, user_factors)
+                loss = self._loss(user_items, user_factors, item_factors)
+                seconds = time.perf_counter() - start
+
+                self.history.append({'epoch': epoch, 'loss': loss, 'seconds': seconds})
+                if self.verbose:
+                    print(f"  epoch {epoch}: loss {loss:.6f} ({seconds:.3f}s)")
+
+                if previous_loss is not None and abs(previous_loss - loss) <= self.tol * abs(previous_loss):
+                    break
+                previous_loss = loss
+
+        return user_factors, item_factors
+
+    def fold_in(self, item_factors, positions, ratings, gram=None):
+        """Factor vector for a user outside the training data, given their rated items.
+
+        gram (item_factors.T @ item_factors) can be passed in to avoid
+        recomputing it for every implicit-feedback fold-in.
+        """
+        k = self.n_factors
+        positions = np.asarray(positions)
+        if len(positions) == 0:
+            return np.zeros(k)
+        Y = item_factors[positions]
+        r = np.asarray(ratings, dtype=np.float64)
+        if self.implicit:
+            confidence = 1.0 + self.alpha * r
+            if gram is None:
+                gram = item_factors.T @ item_factors
+            A = gram + (Y.T * (confidence - 1.0)) @ Y + self.regularization * np.eye(k)
+            b = Y.T @ confidence
+        else:
+            A = Y.T @ Y + self.regularization * len(positions) * np.eye(k)
+            b = Y.T @ r
+        return np.linalg.solve(A, b)
+
+    def _solve_rows(self, pool, csr, fixed):
+        """Solve every row's least-squares system, chunked across the thread pool"""
+        n_rows = csr.shape[0]
+        out = np.zeros((n_rows, self.n_factors))
+        gram = fixed.T @ fixed if self.implicit else None
+
+        # Chunks hold roughly equal numbers of ratings, bounded so the padded
+        # gather buffers of a chunk stay around 64 MB
+        indptr = csr.indptr
+        max_nnz = max(1, (64 * 1024 ** 2) // (16 * self.n_factors))
+        step = max(1, min(max_nnz, -(-csr.nnz // (self.n_jobs * 4))))
+        futures = []
+        start = 0
+        while start < n_rows:
+            stop = int(np.searchsorted(indptr, indptr[start] + step, side='right')) - 1
+            stop = min(max(stop, start + 1), n_rows)
+            futures.append(pool.submit(self._solve_chunk, csr, fixed, gram, start, stop, out))
+            start = stop
+        for future in futures:
+            future.result()
+        return out
+
+    def _solve_chunk(self, csr, fixed, gram, start, stop, out):
+        # Rows are grouped by rating count (padded to a power of two) so each
+        # group's k x k systems come from one batched matmul, then one batched
+        # solve; both release the GIL, which is what makes the threads useful.
+        k = self.n_factors
+        eye = np.eye(k)
+        indptr = csr.indptr
+        lo, hi = indptr[start], indptr[stop]
+        counts = np.diff(indptr[start:stop + 1])
+        Y = fixed[csr.indices[lo:hi]]
+        r = csr.data[lo:hi]
+
+        if self.implicit:
+            weights = self.alpha * r          # confidence - 1
+            targets = 1.0 + self.alpha * r    # confidence * preference
+        else:
+            weights = np.ones_like(r)
+            targets = r
+
+        # A trailing zero row absorbs the padding
+        weighted = np.vstack([Y * np.sqrt(weights)[:, None], np.zeros((1, k))])
+        scaled = np.vstack([Y * targets[:, None], np.zeros((1, k))])
+
+        A = np.broadcast_to(eye, (stop - start, k, k)).copy()
+        b = np.zeros((stop - start, k))
+        padded = np.where(counts > 0, 1 << np.ceil(np.log2(np.maximum(counts, 1))).astype(int), 0)
+        row_offsets = indptr[start:stop] - lo
+        for length in np.unique(padded[padded > 0]):
+            rows = np.flatnonzero(padded == length)
+            positions = np.arange(length)
+            gather = np.where(positions < counts[rows][:, None],
+                              row_offsets[rows][:, None] + positions, hi - lo)
+            G = weighted[gather]
+            A[rows] = np.matmul(G.transpose(0, 2, 1), G)
+            b[rows] = scaled[gather].sum(axis=1)
+
+        # Regularization; rows without observations keep A = I, b = 0 (zero factors)
+        observed = counts > 0
+        if self.implicit:
+            A[observed] += gram + self.regularization * eye
+        else:
+            A[observed] += self.regularization * counts[observed][:, None, None] * eye
+
+        out[start:stop] = np.linalg.solve(A, b[..., None])[..., 0]
+
+    def _loss(self, user_items, user_factors, item_factors):
+        """Explicit: RMSE on observed ratings. Implicit: mean weighted loss per cell."""
+        coo = user_items.tocoo()
+        predicted = np.einsum('ij,ij->i', user_factors[coo.row], item_factors[coo.col])
+
+        if not self.implicit:
+            return float(np.sqrt(np.mean((coo.data - predicted) ** 2)))
+
+        confidence = 1.0 + self.alpha * coo.data
+        observed = np.sum(confidence * (1.0 - predicted) ** 2)
+        # Unobserved cells have preference 0 and confidence 1:
+        # sum over all cells of (x.y)^2 minus the observed ones
+        gram = item_factors.T @ item_factors
+        all_cells = np.einsum('ij,jk,ik->', user_factors, gram, user_factors)
+        unobserved = all_cells - np.sum(predicted ** 2)
+        penalty = self.regularization * (np.sum(user_factors ** 2) + np.sum(item_factors ** 2))
+        return float((observed + unobserved + penalty) / np.prod(user_items.shape))
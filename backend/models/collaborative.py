@@ -1,64 +1,217 @@
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from sklearn.decomposition import TruncatedSVD
 import pickle
 
+from models.als import ALSTrainer
+from utils.quantization import quantize
 
 
 class CollaborativeFilteringRecommender:
-    """Collaborative filtering using matrix factorization (SVD)"""
+    """Collaborative filtering using matrix factorization (SVD or ALS)"""
     
-    def __init__(self, n_components=10):
+    def __init__(self, n_components=10, algorithm='svd', regularization=0.1, implicit=False,
+                 alpha=40.0, iterations=15, tol=1e-4, n_jobs=None, precision='float64'):
+        if algorithm not in ('svd', 'als'):
+            raise ValueError(f"Unknown algorithm: {algorithm}")
         self.n_components = n_components
+        self.algorithm = algorithm
+        # Storage for item factors: float64, float32, float16 or int8 (see utils/quantization.py)
+        self.precision = precision
         self.svd = TruncatedSVD(n_components=n_components, random_state=42)
+        self.als = ALSTrainer(n_factors=n_components, regularization=regularization,
+                              implicit=implicit, alpha=alpha, iterations=iterations,
+                              tol=tol, n_jobs=n_jobs)
         self.user_factors = None
         self.item_factors = None
+        self.item_gram = None
+        self.scorer = None
         self.user_item_matrix = None
+        self.rating_matrix = None
+        self.user_ids = None
+        self.item_ids = None
+        self.user_index = None
+        self.item_index = None
+        self.book_index = None
         self.books_df = None
+        self.topn_table = None
         
     def fit(self, user_item_matrix, books_df):
-        """Train the model on user-item rating matrix"""
+        """Train the model on user-item rating matrix (DataFrame pivot or sparse matrix)"""
+        if isinstance(user_item_matrix, pd.DataFrame):
+            user_ids = user_item_matrix.index.to_numpy()
+            item_ids = user_item_matrix.columns.to_numpy()
+        else:
+            # Sparse input without labels: columns follow books_df order
+            user_ids = np.arange(user_item_matrix.shape[0])
+            item_ids = books_df['book_id'].to_numpy()
+        self._fit_matrix(user_item_matrix, books_df, user_ids, item_ids)
+    
+    def fit_ratings(self, ratings_df, books_df):
+        """Train directly from a user_id/book_id/rating log without a dense pivot"""
+        item_ids = books_df['book_id'].to_numpy()
+        item_codes = pd.Index(item_ids).get_indexer(ratings_df['book_id'])
+        known = item_codes >= 0
+        
+        user_codes, user_ids = pd.factorize(ratings_df['user_id'][known])
+        matrix = sp.csr_matrix(
+            (ratings_df['rating'].to_numpy(dtype=np.float64)[known], (user_codes, item_codes[known])),
+            shape=(len(user_ids), len(item_ids))
+        )
+        matrix.sum_duplicates()
+        self._fit_matrix(matrix, books_df, np.asarray(user_ids), item_ids)
+    
+    def _fit_matrix(self, user_item_matrix, books_df, user_ids, item_ids):
         self.user_item_matrix = user_item_matrix
         self.books_df = books_df
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self._build_indexes()
+        self.rating_matrix = sp.csr_matrix(user_item_matrix, dtype=np.float64)
         
-        # Apply SVD
-        self.user_factors = self.svd.fit_transform(user_item_matrix)
-        self.item_factors = self.svd.components_.T
+        if self.algorithm == 'als':
+            self.user_factors, self.item_factors = self.als.fit(self.rating_matrix)
+        else:
+            # Apply SVD
+            self.user_factors = self.svd.fit_transform(self.rating_matrix)
+            self.item_factors = self.svd.components_.T
         
-        print(f"✓ Collaborative filtering model trained with {self.n_components} factors")
+        # Gram matrix for implicit fold-in, from the full-precision factors
+        self.item_gram = self.item_factors.T @ self.item_factors
+        self.quantize(self.precision)
         
+        print(f"✓ Collaborative filtering model trained with {self.n_components} factors ({self.algorithm})")
+        
+    def _build_indexes(self):
+        """user_id, item_id and book_id -> position lookups, hashed once instead of per request"""
+        self.user_index = pd.Index(self.user_ids)
+        self.item_index = pd.Index(self.item_ids)
+        self.book_index = pd.Index(self.books_df['book_id'])
+        # get_indexer builds each hash table on first use; do it here, not in a request
+        for index in (self.user_index, self.item_index, self.book_index):
+            index.get_indexer(index[:1])
+    
+    def quantize(self, precision):
+        """Store item factors (and user factors, as float32) at reduced precision"""
+        self.precision = precision
+        self.item_factors = quantize(self.item_factors, precision)
+        if precision != 'float64':
+            self.user_factors = np.asarray(self.user_factors, dtype=np.float32)
+    
     def predict_rating(self, user_idx, book_id):
         """Predict rating for a user-book pair"""
-        book_idx = self.books_df[self.books_df['book_id'] == book_id].index[0]
+        book_idx = self.item_index.get_loc(book_id)
         prediction = np.dot(self.user_factors[user_idx], self.item_factors[book_idx])
         return max(0, min(5, prediction))  # Clip to [0, 5]
     
+    def enable_sharding(self, n_workers=None, n_shards=None):
+        """Score item factors in parallel shards (see models/sharded.py); call close() when done"""
+        from models.sharded import ShardedScorer
+        self.close()
+        self.scorer = ShardedScorer(np.asarray(self.item_factors), n_shards, n_workers)
+    
+    def close(self):
+        if self.scorer is not None:
+            self.scorer.close()
+            self.scorer = None
+    
+    def _top_positions(self, user_vector, rated_positions, n):
+        """Positions of the n best-scoring unrated items, best first"""
+        if self.scorer is not None:
+            return self.scorer.top_n(user_vector, n, exclude=rated_positions)[0]
+        predictions = self.item_factors @ user_vector
+        predictions[rated_positions] = -np.inf
+        top_positions = np.argsort(-predictions, kind='stable')[:n]
+        return top_positions[np.isfinite(predictions[top_positions])]
+    
     def recommend_for_user(self, user_idx, n_recommendations=5):
         """Get recommendations for a specific user"""
-        # Predict ratings for all books
-        predictions = np.dot(self.user_factors[user_idx], self.item_factors.T)
-        
-        # Get books not yet rated
-        rated_books = self.user_item_matrix.iloc[user_idx]
-        unrated_indices = rated_books[rated_books == 0].index
-        
-        # Sort predictions
-        unrated_predictions = [(idx, predictions[i]) for i, idx in enumerate(unrated_indices)]
-        unrated_predictions.sort(key=lambda x: x[1], reverse=True)
+        # Exclude books already rated (sparse row of the rating matrix)
+        row = self.rating_matrix.indptr
+        rated_positions = self.rating_matrix.indices[row[user_idx]:row[user_idx + 1]]
         
         # Get top N
-        top_book_ids = [self.books_df.iloc[idx]['book_id'] for idx, _ in unrated_predictions[:n_recommendations]]
+        top_positions = self._top_positions(self.user_factors[user_idx], rated_positions, n_recommendations)
+        top_book_ids = self.item_ids[top_positions]
         
         return self.books_df[self.books_df['book_id'].isin(top_book_ids)].to_dict('records')
     
+    def fold_in(self, user_ratings):
+        """Latent vector for a user not in the training matrix, from {book_id: rating}"""
+        positions = self.item_index.get_indexer(list(user_ratings.keys()))
+        known = positions >= 0
+        ratings = np.asarray(list(user_ratings.values()), dtype=np.float64)[known]
+        if self.algorithm == 'als':
+            return self.als.fold_in(self.item_factors, positions[known], ratings, self.item_gram)
+        # SVD: project the rating row onto the learned components
+        row = np.zeros(len(self.item_ids))
+        row[positions[known]] = ratings
+        return row @ self.item_factors
+    
+    def recommend_for_ratings(self, user_ratings, n_recommendations=5):
+        """Live scoring for a new user: fold in their ratings, then rank unrated books"""
+        rated_positions = self.item_index.get_indexer(list(user_ratings.keys()))
+        top_positions = self._top_positions(self.fold_in(user_ratings), rated_positions[rated_positions >= 0],
+                                            n_recommendations)
+        return self._records(self.item_ids[top_positions])
+    
+    def attach_topn_table(self, table):
+        """Serve known users from a precomputed UserTopNTable (see models/precompute.py)"""
+        self.topn_table = table
+    
+    def recommend_for_user_id(self, user_id, n_recommendations=5, user_ratings=None):
+        """O(1) table lookup for known users; live scoring for users outside the model"""
+        if self.topn_table is not None and n_recommendations <= self.topn_table.n:
+            found = self.topn_table.lookup(user_id, n_recommendations)
+            if found is not None:
+                return self._records(found[0])
+        
+        user_idx = self.user_index.get_indexer([user_id])[0]
+        if user_idx >= 0:
+            return self.recommend_for_user(user_idx, n_recommendations)
+        return self.recommend_for_ratings(user_ratings or {}, n_recommendations)
+    
+    def _records(self, book_ids):
+        """Book dicts in the given order"""
+        rows = self.book_index.get_indexer(book_ids)
+        return self.books_df.iloc[rows[rows >= 0]].to_dict('records')
+    
     def save_model(self, path='models/collaborative_model.pkl'):
         """Save the trained model"""
         with open(path, 'wb') as f:
             pickle.dump({
+                'algorithm': self.algorithm,
                 'svd': self.svd,
+                'als': self.als,
                 'user_factors': self.user_factors,
                 'item_factors': self.item_factors,
+                'item_gram': self.item_gram,
+                'precision': self.precision,
                 'user_item_matrix': self.user_item_matrix,
+                'rating_matrix': self.rating_matrix,
+                'user_ids': self.user_ids,
+                'item_ids': self.item_ids,
                 'books_df': self.books_df
             }, f)
         print(f"✓ Model saved to {path}")
+    
+    def load_model(self, path='models/collaborative_model.pkl'):
+        """Load a trained model"""
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+            self.algorithm = data['algorithm']
+            self.svd = data['svd']
+            self.als = data['als']
+            self.user_factors = data['user_factors']
+            self.item_factors = data['item_factors']
+            self.item_gram = data.get('item_gram')
+            self.precision = data.get('precision', 'float64')
+            self.user_item_matrix = data['user_item_matrix']
+            self.rating_matrix = data['rating_matrix']
+            self.user_ids = data['user_ids']
+            self.item_ids = data['item_ids']
+            self.books_df = data['books_df']
+            self._build_indexes()
+            self.n_components = self.user_factors.shape[1]
+        print(f"✓ Model loaded from {path}")
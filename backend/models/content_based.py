@@ -4,14 +4,27 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import pickle
 
+from utils.quantization import quantize
+
 
 class ContentBasedRecommender:
     """Content-based filtering using TF-IDF and cosine similarity"""
     
-    def __init__(self):
-        self.tfidf = TfidfVectorizer(stop_words='english', max_features=100)
+    def __init__(self, precision='float64', features='tfidf'):
+        if features == 'hashed':
+            # Hashed terms with IDF weights: no vocabulary and no 100-term cap (see models/features.py)
+            from models.features import HashedFeatures
+            self.tfidf = HashedFeatures()
+        elif features == 'tfidf':
+            self.tfidf = TfidfVectorizer(stop_words='english', max_features=100)
+        else:
+            raise ValueError(f"Unknown content features: {features}")
+        self.features = features
+        # Storage for the similarity matrix: float64, float32, float16 or int8
+        self.precision = precision
         self.tfidf_matrix = None
         self.cosine_sim = None
+        self.scorer = None
         self.books_df = None
         
     def fit(self, books_df):
@@ -27,27 +40,48 @@ class ContentBasedRecommender:
         )
         
         # Fit TF-IDF
-        self.tfidf_matrix = self.tfidf.fit_transform(self.books_df['content'])
+        if self.features == 'hashed':
+            self.tfidf_matrix = self.tfidf.fit_transform(self.books_df)
+        else:
+            self.tfidf_matrix = self.tfidf.fit_transform(self.books_df['content'])
         
         # Calculate cosine similarity
-        self.cosine_sim = cosine_similarity(self.tfidf_matrix, self.tfidf_matrix)
+        self.cosine_sim = quantize(cosine_similarity(self.tfidf_matrix, self.tfidf_matrix), self.precision)
         
         print(f"✓ Content-based model trained on {len(self.books_df)} books")
         
-    def recommend(self, book_ids, n_recommendations=5):
-        """Get recommendations based on book IDs"""
+    def recommend(self, book_ids, n_recommendations=5, weights=None):
+        """Get recommendations based on book IDs.
+        
+        weights (one per book id, negative for disliked books; see
+        utils/preferences.py) turn the mean of similarity rows into a signed sum.
+        """
         if not book_ids:
             return []
+        if weights is None:
+            weights = [1.0] * len(book_ids)
         
         # Get indices
-        indices = [self.books_df[self.books_df['book_id'] == bid].index[0] 
-                   for bid in book_ids if bid in self.books_df['book_id'].values]
+        known = [(self.books_df[self.books_df['book_id'] == bid].index[0], weight)
+                 for bid, weight in zip(book_ids, weights) if bid in self.books_df['book_id'].values]
         
-        if not indices:
+        if not known:
             return []
+        indices = [idx for idx, _ in known]
+        weights = np.array([weight for _, weight in known])
+        signed = (weights < 0).any()
+        if signed:
+            weights = weights / max(weights[weights > 0].sum(), 1.0)
+        
+        if self.scorer is not None:
+            # Mean of cosine rows == dot product with the mean of the L2-normalized TF-IDF rows
+            query = self.scorer.row_mean(indices, weights if signed else None)
+            top_indices, _ = self.scorer.top_n(query, n_recommendations, exclude=indices)
+            return self.books_df.iloc[top_indices][['book_id', 'title', 'author', 'rating']].to_dict('records')
         
-        # Average similarity scores
-        sim_scores = np.mean([self.cosine_sim[idx] for idx in indices], axis=0)
+        # Average similarity scores (disliked rows subtract)
+        rows = [self.cosine_sim[idx] for idx in indices]
+        sim_scores = weights @ np.array(rows, dtype=np.float64) if signed else np.mean(rows, axis=0)
         sim_scores = list(enumerate(sim_scores))
         
         # Sort and exclude input books
@@ -59,11 +93,23 @@ class ContentBasedRecommender:
         
         return self.books_df.iloc[top_indices][['book_id', 'title', 'author', 'rating']].to_dict('records')
     
+    def enable_sharding(self, n_workers=None, n_shards=None):
+        """Score TF-IDF rows in parallel shards (see models/sharded.py); call close() when done"""
+        from models.sharded import ShardedScorer
+        self.close()
+        self.scorer = ShardedScorer(self.tfidf_matrix, n_shards, n_workers)
+    
+    def close(self):
+        if self.scorer is not None:
+            self.scorer.close()
+            self.scorer = None
+    
     def save_model(self, path='models/content_based_model.pkl'):
         """Save the trained model"""
         with open(path, 'wb') as f:
             pickle.dump({
                 'tfidf': self.tfidf,
+                'features': self.features,
                 'tfidf_matrix': self.tfidf_matrix,
                 'cosine_sim': self.cosine_sim,
                 'books_df': self.books_df
@@ -75,6 +121,7 @@ class ContentBasedRecommender:
         with open(path, 'rb') as f:
             data = pickle.load(f)
             self.tfidf = data['tfidf']
+            self.features = data.get('features', 'tfidf')
             self.tfidf_matrix = data['tfidf_matrix']
             self.cosine_sim = data['cosine_sim']
             self.books_df = data['books_df']
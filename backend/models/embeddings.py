@@ -0,0 +1,161 @@
+"""
+Dense book embeddings and a memory-mapped vector store.
+
+embed_books() computes one dense vector per book: LSA (truncated SVD of the
+TF-IDF rows) by default, or a local sentence-transformers model when one is
+named and the package is installed. VectorStore writes the vectors as
+L2-normalized float32 rows to a .npy file and memory-maps them, so a
+restarted or forked server shares the pages instead of recomputing them.
+Queries are scored with one dot product against all rows, and the store has
+the same row_mean/top_n interface as models.sharded.ShardedScorer.
+Each store records a fingerprint of the catalog text and embedding settings
+(catalog_fingerprint), so a store written for older text is rebuilt.
+
+Build a store for the sample catalog:
+
+    cd backend
+    python -m models.embeddings --output models/embeddings --dim 128
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from models.sharded import _top_n
+
+# Catalog columns the content features are built from (see app.build_similarity)
+TEXT_COLUMNS = ('title', 'author', 'category', 'level', 'description', 'content')
+
+
+def lsa_embeddings(tfidf_matrix, dim=128, random_state=0):
+    """Truncated SVD of the TF-IDF rows (latent semantic analysis), one dim-sized row per book"""
+    from sklearn.decomposition import TruncatedSVD
+
+    dim = min(dim, tfidf_matrix.shape[0] - 1, tfidf_matrix.shape[1] - 1)
+    if dim < 1:
+        # Too few books or terms to factorize; the TF-IDF rows are the embedding
+        return np.asarray(tfidf_matrix.todense() if hasattr(tfidf_matrix, 'todense') else tfidf_matrix)
+    return TruncatedSVD(n_components=dim, random_state=random_state).fit_transform(tfidf_matrix)
+
+
+def embed_books(books_df, tfidf_matrix=None, dim=128, model=None):
+    """(vectors, method) for every book, in catalog order.
+
+    model names a sentence-transformers model (e.g. 'all-MiniLM-L6-v2') run on
+    the CPU over the 'content' column; without it, or when the package is not
+    installed, the embeddings are LSA over tfidf_matrix.
+    """
+    if model:
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:  # optional, falls back to LSA
+            print(f"⚠ sentence-transformers is not installed; using LSA instead of {model}")
+        else:
+            encoder = SentenceTransformer(model, device='cpu')
+            return encoder.encode(books_df['content'].tolist(), batch_size=256), model
+    if tfidf_matrix is None:
+        raise ValueError("LSA embeddings need the TF-IDF matrix")
+    return lsa_embeddings(tfidf_matrix, dim), 'lsa'
+
+
+def catalog_fingerprint(books_df, **settings):
+    """Hash of the catalog's text columns and the embedding settings, for VectorStore.matches"""
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode())
+    for column in TEXT_COLUMNS:
+        if column in books_df:
+            digest.update(column.encode())
+            digest.update('\x1f'.join(books_df[column].astype(str)).encode())
+    return digest.hexdigest()
+
+
+class VectorStore:
+    """Memory-mapped, L2-normalized float32 book vectors written by VectorStore.write"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        self.book_ids = np.load(os.path.join(path, 'book_ids.npy'), allow_pickle=True)
+
+    @classmethod
+    def write(cls, path, vectors, book_ids, **meta):
+        """Normalize the rows of vectors, store them with their book ids and open the store"""
+        os.makedirs(path, exist_ok=True)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        stored = np.lib.format.open_memmap(os.path.join(path, 'vectors.npy'), mode='w+',
+                                           dtype=np.float32, shape=vectors.shape)
+        # Rows with no terms stay zero and score 0 against every query
+        np.divide(vectors, norms, out=stored, where=norms > 0)
+        stored[(norms == 0).ravel()] = 0
+        stored.flush()
+        del stored
+        np.save(os.path.join(path, 'book_ids.npy'), np.asarray(book_ids))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'books': vectors.shape[0], 'dim': vectors.shape[1],
+                       'created': time.strftime('%Y-%m-%dT%H:%M:%S'), **meta}, f)
+        return cls(path)
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(os.path.join(path, 'meta.json'))
+
+    def matches(self, book_ids, fingerprint=None):
+        """Whether the store's rows are these books, in this order, embedded with this fingerprint"""
+        if fingerprint is not None and self.meta.get('fingerprint') != fingerprint:
+            return False
+        return np.array_equal(self.book_ids, np.asarray(book_ids))
+
+    def row_mean(self, positions, weights=None):
+        """Mean of the given book vectors (or their sum weighted by weights), as a query vector"""
+        rows = np.asarray(self.vectors[positions], dtype=np.float64)
+        if weights is not None:
+            return np.asarray(weights, dtype=np.float64) @ rows
+        return rows.mean(axis=0)
+
+    def top_n(self, query, n, exclude=None, allowed=None):
+        """(positions, scores) of the n books closest to query, best first.
+
+        exclude lists positions to skip; allowed is an optional FilterMask.
+        """
+        scores = (self.vectors @ np.asarray(query, dtype=np.float32)).astype(np.float64)
+        if exclude is not None:
+            scores[np.asarray(exclude, dtype=np.int64)] = -np.inf
+        if allowed is not None:
+            scores[~allowed.contains(np.arange(len(scores)))] = -np.inf
+        return _top_n(scores, n)
+
+    def search(self, queries, n):
+        """Top n (positions, scores) for each row of queries, from one batched matrix product"""
+        scores = np.asarray(queries, dtype=np.float32) @ self.vectors.T
+        return [_top_n(row.astype(np.float64), n) for row in scores]
+
+    def close(self):
+        # Nothing to release: the memory map is shared and read-only
+        pass
+
+
+if __name__ == '__main__':
+    import argparse
+
+    import pandas as pd
+
+    from app import build_similarity, tech_books_data
+
+    parser = argparse.ArgumentParser(description='Compute book embeddings into a memory-mapped vector store')
+    parser.add_argument('--catalog', help='books CSV (default: the sample catalog)')
+    parser.add_argument('--output', default='models/embeddings', help='output directory')
+    parser.add_argument('--dim', type=int, default=128, help='LSA dimensions')
+    parser.add_argument('--model', help='sentence-transformers model (default: LSA)')
+    args = parser.parse_args()
+
+    books_df = pd.read_csv(args.catalog) if args.catalog else pd.DataFrame(tech_books_data)
+    tfidf, tfidf_matrix, _ = build_similarity(books_df)
+    vectors, method = embed_books(books_df, tfidf_matrix, args.dim, args.model)
+    fingerprint = catalog_fingerprint(books_df, dim=args.dim, model=args.model, features=type(tfidf).__name__)
+    store = VectorStore.write(args.output, vectors, books_df['book_id'], method=method, fingerprint=fingerprint)
+    print(f"✓ {store.meta['books']} embeddings ({method}, {store.meta['dim']} dims) written to {args.output}")
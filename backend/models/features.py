@@ -0,0 +1,91 @@
+"""
+Hashed TF-IDF features for book content.
+
+Terms are hashed into a fixed number of columns (no vocabulary dict), so
+memory is bounded by n_features and transforming a book needs no fit.
+Document frequencies are kept as one counter per column and can be
+updated as books are added; transform() weights term counts by the
+current IDF and L2-normalizes, like TfidfVectorizer with smooth_idf.
+Large catalogs are transformed in chunks across worker processes.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+CONTENT_FIELDS = ('title', 'author', 'category', 'level', 'description')
+
+
+def _vectorizer(n_features):
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(n_features=n_features, stop_words='english', alternate_sign=False, norm=None)
+
+
+def _count_chunk(texts, n_features):
+    """Term counts for a list of texts (runs in the worker processes)"""
+    return _vectorizer(n_features).transform(texts)
+
+
+class HashedFeatures:
+    """HashingVectorizer term counts with incrementally maintained IDF weights"""
+
+    def __init__(self, n_features=2 ** 18, fields=CONTENT_FIELDS, chunk_size=20000, n_jobs=None):
+        self.n_features = n_features
+        self.fields = fields
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+        self.document_counts = np.zeros(n_features, dtype=np.int64)
+        self.n_documents = 0
+
+    def texts(self, books_df):
+        """One text per book from the configured fields that the frame has"""
+        fields = [field for field in self.fields if field in books_df]
+        if not fields:
+            raise ValueError(f"books_df has none of the content fields: {', '.join(self.fields)}")
+        text = books_df[fields[0]].fillna('').astype(str)
+        for field in fields[1:]:
+            text = text + ' ' + books_df[field].fillna('').astype(str)
+        return text.tolist()
+
+    def counts(self, books_df):
+        """Sparse term-count matrix, chunks transformed in parallel for large frames"""
+        from scipy.sparse import vstack
+
+        texts = self.texts(books_df)
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        n_jobs = self.n_jobs if self.n_jobs is not None else os.cpu_count() or 1
+        if len(chunks) <= 1 or n_jobs <= 1:
+            parts = [_count_chunk(chunk, self.n_features) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunks))) as pool:
+                parts = list(pool.map(_count_chunk, chunks, [self.n_features] * len(chunks)))
+        if not parts:
+            return _count_chunk([], self.n_features)
+        return vstack(parts, format='csr')
+
+    def partial_fit(self, books_df=None, counts=None):
+        """Add books to the document frequencies (pass counts to reuse a counts() result)"""
+        if counts is None:
+            counts = self.counts(books_df)
+        self.document_counts += np.bincount(counts.indices, minlength=self.n_features)
+        self.n_documents += counts.shape[0]
+        return self
+
+    def idf(self):
+        return np.log((1 + self.n_documents) / (1 + self.document_counts)) + 1.0
+
+    def transform(self, books_df=None, counts=None):
+        """L2-normalized TF-IDF rows using the current document frequencies (no fitting)"""
+        from sklearn.preprocessing import normalize
+
+        if counts is None:
+            counts = self.counts(books_df)
+        weighted = counts.astype(np.float64)
+        weighted.data *= self.idf()[weighted.indices]
+        return normalize(weighted, copy=False)
+
+    def fit_transform(self, books_df):
+        counts = self.counts(books_df)
+        self.partial_fit(counts=counts)
+        return self.transform(counts=counts)
@@ -1,3 +1,11 @@
+import importlib
+
+from models.content_based import ContentBasedRecommender
+from utils.preferences import has_dislikes, signed_weights
+
+# knn-model.py is not a valid module identifier, so it is imported by name
+KNNRecommender = importlib.import_module('models.knn-model').KNNRecommender
+
 
 
 class HybridRecommender:
@@ -28,14 +36,16 @@ class HybridRecommender:
         if not user_ratings:
             return self._get_popular_books(n_recommendations)
         
-        # Get liked books
-        liked_books = [book_id for book_id, rating in user_ratings.items() if rating >= 4]
+        # Get liked (+1) and disliked (negative) books
+        weights = signed_weights(user_ratings)
+        liked_books = [book_id for book_id, weight in weights.items() if weight > 0]
         
-        if not liked_books:
+        if not weights:
             return self._get_popular_books(n_recommendations)
         
-        # Get recommendations from content-based
-        content_recs = self.content_model.recommend(liked_books, n_recommendations * 2)
+        # Get recommendations from content-based (disliked books lower similar books)
+        content_recs = self.content_model.recommend(list(weights), n_recommendations * 2,
+                                                    list(weights.values()) if has_dislikes(weights) else None)
         
         # Get recommendations from KNN
         knn_recs = []
@@ -57,6 +67,9 @@ class HybridRecommender:
             score = (len(knn_recs) - i) * self.collab_weight
             all_recs[book_id] = all_recs.get(book_id, 0) + score
         
+        if not all_recs:
+            return self._get_popular_books(n_recommendations)
+        
         # Add popularity score
         for book_id, score in all_recs.items():
             book = self.books_df[self.books_df['book_id'] == book_id]
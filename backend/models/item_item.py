@@ -0,0 +1,303 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pickle
+
+# Added co-rating pairs kept in dicts before they are merged into the CSR counts
+MAX_ADDED_COUNTS = 100000
+
+
+class ItemItemRecommender:
+    """Item-item collaborative filtering from rating co-occurrence (cosine similarity).
+
+    In binary mode the raw co-rating counts are kept (keep_counts) so that
+    add_cooccurrences() can rebuild rows exactly; they take about as much
+    memory as one pass of the similarity product. A lock guards the neighbor
+    rows, which event updates rewrite while requests read them.
+    """
+
+    def __init__(self, top_k=50, binary=True, min_rating=0, max_item_users=5000,
+                 block_size=2048, random_state=42, keep_counts=True):
+        self.top_k = top_k
+        self.binary = binary
+        self.min_rating = min_rating
+        self.max_item_users = max_item_users
+        self.block_size = block_size
+        self.random_state = random_state
+        self.keep_counts = keep_counts
+        self.neighbors = None      # (n_items, top_k) item positions, -1 padded
+        self.similarities = None   # (n_items, top_k) cosine similarities, best first
+        self.norms = None          # L2 norm of each item's rating column
+        self.item_ids = None
+        self.item_positions = None
+        self.books_df = None
+        self.counts = None         # (n_items, n_items) CSR co-rating counts from the fit (binary mode)
+        self.added_counts = {}     # {row: {col: count}} co-ratings added since the fit
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault('counts', None)
+        state.setdefault('added_counts', {})
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def fit_ratings(self, ratings_df, books_df):
+        """Build the neighbor index from a user_id/book_id/rating log"""
+        import scipy.sparse as sp
+
+        item_ids = books_df['book_id'].to_numpy()
+        item_codes = pd.Index(item_ids).get_indexer(ratings_df['book_id'])
+        known = (item_codes >= 0) & (ratings_df['rating'].to_numpy() >= self.min_rating)
+        user_codes, user_ids = pd.factorize(ratings_df['user_id'][known])
+        matrix = sp.csr_matrix(
+            (ratings_df['rating'].to_numpy(dtype=np.float32)[known], (user_codes, item_codes[known])),
+            shape=(len(user_ids), len(item_ids))
+        )
+        self.fit(matrix, books_df)
+
+    def fit(self, rating_matrix, books_df):
+        """Build the neighbor index from a (users x items) sparse matrix in books_df column order"""
+        import scipy.sparse as sp
+
+        start = time.perf_counter()
+        self.books_df = books_df
+        self.item_ids = books_df['book_id'].to_numpy()
+        self.item_positions = {book_id: pos for pos, book_id in enumerate(self.item_ids.tolist())}
+
+        X = sp.csc_matrix(rating_matrix, dtype=np.float32)
+        X.sum_duplicates()
+        if self.binary:
+            X.data[:] = 1.0
+        X = self._sample_popular(X)
+
+        # Cosine similarity = dot products of L2-normalized item columns
+        self.norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=0)).ravel())
+        keep_counts = self.binary and self.keep_counts
+        if not keep_counts:
+            X = (X @ sp.diags(1.0 / np.where(self.norms > 0, self.norms, 1.0))).tocsc()
+        Xt = X.T.tocsr()
+
+        n_items = X.shape[1]
+        k = min(self.top_k, max(n_items - 1, 1))
+        self.neighbors = np.full((n_items, k), -1, dtype=np.int32)
+        self.similarities = np.zeros((n_items, k), dtype=np.float32)
+        self.added_counts = {}
+
+        # Blocks of items bound the size of the sparse product
+        blocks = []
+        for block_start in range(0, n_items, self.block_size):
+            block_stop = min(block_start + self.block_size, n_items)
+            S = Xt[block_start:block_stop] @ X
+            if keep_counts:
+                # Binary products are co-rating counts: keep them, then normalize
+                blocks.append(S.tocsr())
+                S = S.tocoo()
+                values = S.data / np.maximum(self.norms[S.row + block_start] * self.norms[S.col], 1e-12)
+                self._keep_top_k(S.row, S.col, values.astype(np.float32), block_start)
+            else:
+                S = S.tocoo()
+                self._keep_top_k(S.row, S.col, S.data, block_start)
+        self.counts = sp.vstack(blocks, format='csr') if keep_counts and blocks else None
+
+        print(f"✓ Item-item model built for {n_items} books "
+              f"(top {k} neighbors) in {time.perf_counter() - start:.2f}s")
+
+    def _sample_popular(self, X):
+        """Keep a random sample of max_item_users raters for very popular items"""
+        import scipy.sparse as sp
+
+        counts = np.diff(X.indptr)
+        heavy = np.flatnonzero(counts > self.max_item_users)
+        if len(heavy) == 0:
+            return X
+        rng = np.random.default_rng(self.random_state)
+        keep = np.ones(X.nnz, dtype=bool)
+        for col in heavy:
+            lo, hi = X.indptr[col], X.indptr[col + 1]
+            keep[lo:hi] = False
+            keep[lo + rng.choice(hi - lo, self.max_item_users, replace=False)] = True
+        cols = np.repeat(np.arange(X.shape[1]), counts)
+        return sp.csc_matrix((X.data[keep], (X.indices[keep], cols[keep])), shape=X.shape)
+
+    def _keep_top_k(self, rows, cols, values, offset):
+        # Drop self-similarity, then sort each row by descending similarity
+        # (ties by position) in one lexsort and keep the first k entries of every row
+        rows = rows + offset
+        other = rows != cols
+        rows, cols, values = rows[other], cols[other], values[other]
+        order = np.lexsort((cols, -values, rows))
+        rows, cols, values = rows[order], cols[order], values[order]
+
+        starts = np.searchsorted(rows, rows, side='left')
+        rank = np.arange(len(rows)) - starts
+        top = rank < self.neighbors.shape[1]
+        self.neighbors[rows[top], rank[top]] = cols[top]
+        self.similarities[rows[top], rank[top]] = values[top]
+
+    def add_cooccurrences(self, rater_counts, pair_counts):
+        """Fold new co-rating counts into the index without refitting (binary mode).
+
+        rater_counts maps book_id to its number of new raters and pair_counts
+        maps (book_a, book_b) to new co-ratings. The rows of the books in
+        pair_counts are rebuilt from their full co-rating counts (the fit's
+        counts plus every pair added since), as a refit would; other rows keep
+        their similarities until one of their own pairs changes. Models loaded
+        without counts rebuild rows from the stored top-k neighbors only, which
+        loses co-ratings outside the top-k: refit those periodically.
+        """
+        if not self.binary or self.neighbors is None:
+            return
+        positions = self.item_positions
+        old_norms = self.norms.copy()
+        for book_id, count in rater_counts.items():
+            pos = positions.get(book_id)
+            if pos is not None:
+                self.norms[pos] = np.sqrt(self.norms[pos] ** 2 + count)
+        
+        new_pairs = {}
+        for (a, b), count in pair_counts.items():
+            a, b = positions.get(a), positions.get(b)
+            if a is None or b is None:
+                continue
+            new_pairs.setdefault(a, {})[b] = count
+            new_pairs.setdefault(b, {})[a] = count
+        
+        k = self.neighbors.shape[1]
+        for row, additions in new_pairs.items():
+            if self.counts is not None:
+                added = self.added_counts.setdefault(row, {})
+                for col, count in additions.items():
+                    added[col] = added.get(col, 0) + count
+                lo, hi = self.counts.indptr[row], self.counts.indptr[row + 1]
+                counts = dict(zip(self.counts.indices[lo:hi].tolist(), self.counts.data[lo:hi].tolist()))
+                counts.pop(row, None)
+                additions = added
+            else:
+                neighbors = self.neighbors[row]
+                valid = neighbors >= 0
+                counts = dict(zip(neighbors[valid].tolist(), (self.similarities[row][valid] * old_norms[row] *
+                                                              old_norms[neighbors[valid]]).tolist()))
+            for col, count in additions.items():
+                counts[col] = counts.get(col, 0.0) + count
+            cols = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+            values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+            values /= np.maximum(self.norms[row] * self.norms[cols], 1e-12)
+            order = np.lexsort((cols, -values))[:k]
+            neighbors = np.full(k, -1, dtype=np.int32)
+            similarities = np.zeros(k, dtype=np.float32)
+            neighbors[:len(order)] = cols[order]
+            similarities[:len(order)] = values[order]
+            with self._lock:
+                self.neighbors[row] = neighbors
+                self.similarities[row] = similarities
+        if sum(len(added) for added in self.added_counts.values()) > MAX_ADDED_COUNTS:
+            self._merge_added_counts()
+
+    def _merge_added_counts(self):
+        """Fold the pairs added since the fit into the CSR counts"""
+        import scipy.sparse as sp
+
+        rows, cols, values = [], [], []
+        for row, added in self.added_counts.items():
+            rows += [row] * len(added)
+            cols += added.keys()
+            values += added.values()
+        self.counts = (self.counts + sp.csr_matrix((values, (rows, cols)), shape=self.counts.shape)).tocsr()
+        self.added_counts = {}
+
+    def similar_ranking(self, book_id, n_recommendations=5, allowed=None):
+        """Nearest neighbors of one book, as (book_id, similarity) pairs.
+
+        allowed is an optional filter over catalog positions with a
+        contains(positions) method (see utils/filters.py).
+        """
+        pos = self.item_positions.get(book_id)
+        if pos is None:
+            return []
+        with self._lock:
+            neighbors = self.neighbors[pos].copy()
+            similarities = self.similarities[pos].copy()
+        valid = neighbors >= 0
+        if allowed is not None:
+            valid[valid] = allowed.contains(neighbors[valid])
+        neighbors = neighbors[valid][:n_recommendations]
+        similarities = similarities[valid][:n_recommendations]
+        return list(zip(self.item_ids[neighbors].tolist(), similarities.tolist()))
+
+    def ranking(self, weights, n_recommendations=5, allowed=None):
+        """Rank books by the weighted sum of neighbor similarities of {book_id: weight}"""
+        rated = [(self.item_positions[b], w) for b, w in weights.items() if b in self.item_positions]
+        if not rated:
+            return []
+        positions = [pos for pos, _ in rated]
+        item_weights = np.array([w for _, w in rated], dtype=np.float32)
+
+        # Only the neighbors of the rated books can score above zero
+        with self._lock:
+            neighbors = self.neighbors[positions]
+            similarities = self.similarities[positions]
+        contributions = similarities * item_weights[:, None]
+        valid = neighbors >= 0
+        candidates, inverse = np.unique(neighbors[valid], return_inverse=True)
+        scores = np.bincount(inverse, contributions[valid], minlength=len(candidates))
+
+        unrated = ~np.isin(candidates, positions)
+        if allowed is not None:
+            unrated &= allowed.contains(candidates)
+        candidates, scores = candidates[unrated], scores[unrated]
+        if n_recommendations < len(candidates):
+            top = np.argpartition(-scores, n_recommendations - 1)[:n_recommendations]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return list(zip(self.item_ids[candidates[order]].tolist(), scores[order].tolist()))
+
+    def recommend(self, user_ratings, n_recommendations=5):
+        """Get recommendations for {book_id: rating}, weighting neighbors by rating"""
+        return self._records(self.ranking(user_ratings, n_recommendations))
+
+    def similar(self, book_id, n_recommendations=5):
+        """Get the books most often rated together with book_id"""
+        return self._records(self.similar_ranking(book_id, n_recommendations))
+
+    def _records(self, ranking):
+        rows = [self.item_positions[book_id] for book_id, _ in ranking]
+        records = self.books_df.iloc[rows].to_dict('records')
+        for record, (_, score) in zip(records, ranking):
+            record['score'] = score
+        return records
+
+    def save_model(self, path='models/item_item_model.pkl'):
+        """Save the trained model"""
+        with open(path, 'wb') as f:
+            pickle.dump({
+                'top_k': self.top_k,
+                'neighbors': self.neighbors,
+                'similarities': self.similarities,
+                'norms': self.norms,
+                'counts': self.counts,
+                'added_counts': self.added_counts,
+                'books_df': self.books_df
+            }, f)
+        print(f"✓ Model saved to {path}")
+
+    def load_model(self, path='models/item_item_model.pkl'):
+        """Load a trained model"""
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+            self.top_k = data['top_k']
+            self.neighbors = data['neighbors']
+            self.similarities = data['similarities']
+            self.norms = data['norms']
+            self.counts = data.get('counts')
+            self.added_counts = data.get('added_counts', {})
+            self.books_df = data['books_df']
+            self.item_ids = self.books_df['book_id'].to_numpy()
+            self.item_positions = {book_id: pos for pos, book_id in enumerate(self.item_ids.tolist())}
+        print(f"✓ Model loaded from {path}")
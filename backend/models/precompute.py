@@ -0,0 +1,135 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Per-process state for the scoring workers (set by _init_worker)
+_worker = {}
+
+
+def _init_worker(user_factors, item_factors, indptr, indices, item_ids, n, path):
+    _worker.update(
+        user_factors=user_factors, item_factors=item_factors, indptr=indptr,
+        indices=indices, item_ids=item_ids, n=n,
+        book_ids=np.load(os.path.join(path, 'book_ids.npy'), mmap_mode='r+'),
+        scores=np.load(os.path.join(path, 'scores.npy'), mmap_mode='r+')
+    )
+
+
+def _score_block(start, stop):
+    """Score users [start, stop) against every item and write their top N"""
+    w = _worker
+    scores = w['user_factors'][start:stop] @ w['item_factors'].T
+
+    # Mask already-rated items using the CSR rows of the block
+    indptr = w['indptr']
+    counts = np.diff(indptr[start:stop + 1])
+    rows = np.repeat(np.arange(stop - start), counts)
+    scores[rows, w['indices'][indptr[start]:indptr[stop]]] = -np.inf
+
+    n = w['n']
+    if n < scores.shape[1]:
+        top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    else:
+        top = np.broadcast_to(np.arange(scores.shape[1]), (stop - start, scores.shape[1]))
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    # Users with fewer than N unrated items get -1 padding
+    book_ids = w['item_ids'][top]
+    book_ids[~np.isfinite(top_scores)] = -1
+    w['book_ids'][start:stop, :top.shape[1]] = book_ids
+    w['scores'][start:stop, :top.shape[1]] = top_scores
+    return stop - start
+
+
+def precompute_user_topn(model, path, n=50, batch_size=1024, n_workers=None):
+    """Write top-N lists for every user of a fitted CollaborativeFilteringRecommender.
+
+    Users are scored in blocks (one matrix multiply plus argpartition per
+    block) across a process pool; results go straight into .npy files that
+    UserTopNTable memory-maps. n_workers=0 scores in the current process.
+    """
+    start_time = time.perf_counter()
+    os.makedirs(path, exist_ok=True)
+    n_users = model.user_factors.shape[0]
+    n = min(n, len(model.item_ids))
+
+    id_dtype = np.int32 if np.abs(model.item_ids).max(initial=0) < 2 ** 31 else np.int64
+    book_ids = np.lib.format.open_memmap(os.path.join(path, 'book_ids.npy'), mode='w+',
+                                         dtype=id_dtype, shape=(n_users, n))
+    book_ids[:] = -1
+    scores = np.lib.format.open_memmap(os.path.join(path, 'scores.npy'), mode='w+',
+                                       dtype=np.float32, shape=(n_users, n))
+    scores[:] = -np.inf
+    del book_ids, scores
+    np.save(os.path.join(path, 'user_ids.npy'), np.asarray(model.user_ids))
+
+    # Quantized factors are expanded once here rather than per block
+    args = (model.user_factors, np.asarray(model.item_factors), model.rating_matrix.indptr,
+            model.rating_matrix.indices, np.asarray(model.item_ids), n, path)
+    blocks = [(s, min(s + batch_size, n_users)) for s in range(0, n_users, batch_size)]
+    if n_workers == 0:
+        _init_worker(*args)
+        for block in blocks:
+            _score_block(*block)
+        _worker.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=args) as pool:
+            list(pool.map(_score_block, *zip(*blocks)))
+
+    seconds = time.perf_counter() - start_time
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'n': n, 'users': n_users, 'algorithm': model.algorithm,
+                   'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seconds': seconds}, f)
+    print(f"✓ Precomputed top-{n} lists for {n_users} users in {seconds:.2f}s ({path})")
+    return path
+
+
+class UserTopNTable:
+    """Memory-mapped per-user top-N recommendations written by precompute_user_topn"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.n = self.meta['n']
+        self.book_ids = np.load(os.path.join(path, 'book_ids.npy'), mmap_mode='r')
+        self.scores = np.load(os.path.join(path, 'scores.npy'), mmap_mode='r')
+        user_ids = np.load(os.path.join(path, 'user_ids.npy'), allow_pickle=True)
+        self.user_rows = {user_id: row for row, user_id in enumerate(user_ids.tolist())}
+
+    def __contains__(self, user_id):
+        return user_id in self.user_rows
+
+    def lookup(self, user_id, n=None):
+        """(book_ids, scores) for a known user, best first; None for unknown users"""
+        row = self.user_rows.get(user_id)
+        if row is None:
+            return None
+        n = self.n if n is None else min(n, self.n)
+        book_ids = self.book_ids[row, :n]
+        valid = book_ids >= 0
+        return np.asarray(book_ids[valid]), np.asarray(self.scores[row, :n][valid])
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from models.collaborative import CollaborativeFilteringRecommender
+
+    parser = argparse.ArgumentParser(description='Precompute per-user top-N recommendation tables')
+    parser.add_argument('--model', default='models/collaborative_model.pkl', help='saved collaborative model')
+    parser.add_argument('--output', default='models/user_topn', help='output directory')
+    parser.add_argument('--n', type=int, default=50, help='recommendations stored per user')
+    parser.add_argument('--batch-size', type=int, default=1024, help='users scored per block')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (0 = in-process)')
+    args = parser.parse_args()
+
+    model = CollaborativeFilteringRecommender()
+    model.load_model(args.model)
+    precompute_user_topn(model, args.output, args.n, args.batch_size, args.workers)
@@ -0,0 +1,167 @@
+"""
+Sharded top-N scoring over worker processes.
+
+The item matrix (dense factors or sparse TF-IDF rows) is copied once into
+shared memory and split into contiguous row shards. A query scores every
+shard in parallel, each worker returns its own top N, and the parent merges
+the candidates. Ties are broken by catalog position, so results match a
+stable argsort over the full catalog.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Per-process state for the scoring workers (set by _attach)
+_worker = {}
+
+
+def _share(array):
+    """Copy array into a new shared memory block; returns (block, view)"""
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    view[...] = array
+    return block, view
+
+
+def _attach(specs, shape, sparse):
+    """Worker initializer: map the shared arrays (name, shape, dtype) into this process"""
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    arrays = [np.ndarray(s, dtype=dtype, buffer=block.buf) for block, (_, s, dtype) in zip(blocks, specs)]
+    _worker.update(blocks=blocks, matrix=_matrix(arrays, shape, sparse), shards={})
+
+
+def _matrix(arrays, shape, sparse):
+    if not sparse:
+        return arrays[0]
+    from scipy.sparse import csr_matrix
+    return csr_matrix(tuple(arrays), shape=shape, copy=False)
+
+
+def _shard(state, start, stop):
+    # Sparse row slices are copies, so each worker keeps the ones it has scored
+    shards = state['shards']
+    if (start, stop) not in shards:
+        shards[(start, stop)] = state['matrix'][start:stop]
+    return shards[(start, stop)]
+
+
+def _top_n(scores, n, offset=0):
+    """(positions, scores) of the n best finite scores, best first, ties by position"""
+    if n < len(scores):
+        kth = np.partition(scores, len(scores) - n)[len(scores) - n]
+        greater = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:n - len(greater)]
+        candidates = np.concatenate([greater, ties])
+    else:
+        candidates = np.arange(len(scores))
+    candidates = candidates[np.isfinite(scores[candidates])]
+    order = np.lexsort((candidates, -scores[candidates]))
+    candidates = candidates[order]
+    return candidates + offset, scores[candidates]
+
+
+def _score_shard(start, stop, query, n, exclude, allowed, state=None):
+    """Top n of rows [start, stop) for one query; exclude holds global positions"""
+    scores = np.asarray(_shard(state or _worker, start, stop) @ query, dtype=np.float64).ravel()
+    if exclude is not None:
+        local = exclude[(exclude >= start) & (exclude < stop)] - start
+        scores[local] = -np.inf
+    if allowed is not None:
+        scores[~allowed.contains(np.arange(start, stop))] = -np.inf
+    return _top_n(scores, n, start)
+
+
+class ShardedScorer:
+    """Top-N dot-product scoring of a query vector against item rows in shards.
+
+    n_workers=0 scores the shards in this process (useful for tests and
+    single-core hosts); otherwise a pool of n_workers processes (default: one
+    per CPU) attaches to the shared matrix once and scores one shard per task.
+    """
+
+    def __init__(self, matrix, n_shards=None, n_workers=None):
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        self.n_workers = n_workers
+        self.n_shards = n_shards or max(n_workers, 1)
+        self.shape = matrix.shape
+        self.sparse = hasattr(matrix, 'tocsr')
+        if self.sparse:
+            matrix = matrix.tocsr()
+            arrays = [matrix.data, matrix.indices, matrix.indptr]
+        else:
+            arrays = [np.asarray(matrix)]
+
+        self._blocks = []
+        views = []
+        for array in arrays:
+            block, view = _share(array)
+            self._blocks.append(block)
+            views.append(view)
+        # The parent's view of the shared matrix, for building queries from item rows
+        self.matrix = _matrix(views, self.shape, self.sparse)
+
+        n_rows = self.shape[0]
+        bounds = np.linspace(0, n_rows, self.n_shards + 1).astype(int)
+        self.shards = [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+        specs = [(block.name, view.shape, view.dtype.str) for block, view in zip(self._blocks, views)]
+        initargs = (specs, self.shape, self.sparse)
+        self._local = None
+        if n_workers == 0:
+            self._pool = None
+            self._local = {'matrix': self.matrix, 'shards': {}}
+        else:
+            self._pool = ProcessPoolExecutor(max_workers=n_workers, initializer=_attach, initargs=initargs)
+            # Start the workers now rather than inside the first request
+            self._pool.submit(int).result()
+
+    def row_mean(self, positions, weights=None):
+        """Mean of the given item rows (or their sum weighted by weights), as a dense query vector"""
+        rows = self.matrix[positions]
+        if weights is not None:
+            return np.asarray(rows.T @ np.asarray(weights, dtype=np.float64), dtype=np.float64).ravel()
+        return np.asarray(rows.mean(axis=0), dtype=np.float64).ravel()
+
+    def top_n(self, query, n, exclude=None, allowed=None):
+        """(positions, scores) of the n highest-scoring rows, best first.
+
+        exclude lists positions to skip; allowed is an optional FilterMask.
+        """
+        query = np.asarray(query, dtype=np.float64).ravel()
+        if exclude is not None:
+            exclude = np.asarray(exclude, dtype=np.int64)
+        tasks = [(start, stop, query, n, exclude, allowed) for start, stop in self.shards]
+        if self._pool is None:
+            results = [_score_shard(*task, self._local) for task in tasks]
+        else:
+            futures = [self._pool.submit(_score_shard, *task) for task in tasks]
+            results = [future.result() for future in futures]
+
+        # Merge the per-shard top lists (at most n_shards * n candidates)
+        positions = np.concatenate([r[0] for r in results])
+        scores = np.concatenate([r[1] for r in results])
+        order = np.lexsort((positions, -scores))[:n]
+        return positions[order], scores[order]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        # Views must be gone before the shared blocks can be closed
+        self.matrix = None
+        self._local = None
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,94 @@
+"""
+Admission control for /api/recommend under overload.
+
+AdmissionController counts the recommend requests in flight and keeps a
+moving average of their latency (queue time, when a proxy reports it in
+X-Request-Start, plus service time). Each request is admitted in a serving
+mode instead of queueing behind slow ones:
+
+    full     the requested method
+    content  content-only top-K (no collaborative scoring or diversity),
+             when more than degrade_in_flight requests are running or the
+             latency average exceeds degrade_latency seconds
+    popular  the precomputed popularity list, when more than shed_in_flight
+             requests are running
+
+A cached full result is served in any mode. Degraded responses carry an
+X-Degraded-Mode header (content, popular or cached) and are not cached.
+"""
+
+import os
+import threading
+import time
+
+MODES = ('full', 'content', 'popular')
+
+
+def request_queue_seconds(header, now=None):
+    """Seconds since the X-Request-Start timestamp ('t=<seconds|ms|us>'); 0 when missing or malformed"""
+    if not header:
+        return 0.0
+    try:
+        start = float(header.strip().removeprefix('t='))
+    except ValueError:
+        return 0.0
+    # Proxies send seconds (nginx $msec), milliseconds or microseconds since the epoch
+    if start > 1e14:
+        start /= 1e6
+    elif start > 1e11:
+        start /= 1e3
+    return max((now if now is not None else time.time()) - start, 0.0)
+
+
+class AdmissionController:
+    """In-flight and latency based choice of serving mode (thresholds of None are off)"""
+
+    def __init__(self, degrade_in_flight=None, shed_in_flight=None, degrade_latency=None, smoothing=0.2):
+        self.degrade_in_flight = degrade_in_flight
+        self.shed_in_flight = shed_in_flight
+        self.degrade_latency = degrade_latency
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.latency = 0.0   # exponential moving average, seconds
+        self.admitted = {mode: 0 for mode in MODES}
+        self._lock = threading.Lock()
+
+    def enter(self, queue_seconds=0.0):
+        """Admit a request; returns its serving mode. Every enter() needs a matching leave()"""
+        with self._lock:
+            self.in_flight += 1
+            in_flight = self.in_flight
+            latency = max(self.latency, queue_seconds)
+            if self.shed_in_flight is not None and in_flight > self.shed_in_flight:
+                mode = 'popular'
+            elif ((self.degrade_in_flight is not None and in_flight > self.degrade_in_flight) or
+                  (self.degrade_latency is not None and latency > self.degrade_latency)):
+                mode = 'content'
+            else:
+                mode = 'full'
+            self.admitted[mode] += 1
+            return mode
+
+    def leave(self, seconds):
+        """Finish a request that took seconds (queue plus service time)"""
+        with self._lock:
+            self.in_flight -= 1
+            self.latency += self.smoothing * (seconds - self.latency)
+
+    def status(self):
+        with self._lock:
+            return {'in_flight': self.in_flight, 'latency_ms': self.latency * 1000, 'admitted': dict(self.admitted)}
+
+
+def admission_from_env():
+    """Build a controller from DEGRADE_IN_FLIGHT, SHED_IN_FLIGHT and DEGRADE_LATENCY_MS; None when none is set"""
+    degrade_in_flight = os.environ.get('DEGRADE_IN_FLIGHT')
+    shed_in_flight = os.environ.get('SHED_IN_FLIGHT')
+    degrade_latency_ms = os.environ.get('DEGRADE_LATENCY_MS')
+    if not (degrade_in_flight or shed_in_flight or degrade_latency_ms):
+        return None
+    return AdmissionController(
+        degrade_in_flight=int(degrade_in_flight) if degrade_in_flight else None,
+        shed_in_flight=int(shed_in_flight) if shed_in_flight else None,
+        degrade_latency=float(degrade_latency_ms) / 1000 if degrade_latency_ms else None
+    )
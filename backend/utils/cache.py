@@ -0,0 +1,41 @@
+"""
+Bounded LRU cache for rendered API responses.
+
+Keys include the model version and catalog generation they were computed
+against, so hot swaps and rating updates never serve stale entries; old
+keys simply age out.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Thread-safe least-recently-used cache with at most max_size entries"""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The cached value for key (marking it recently used), or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,450 @@
+"""
+Cluster mode: a router that consistent-hashes requests to backend nodes.
+
+/api/recommend requests are keyed on the normalized ratings profile and
+/api/similar/<id> on the book id, so repeated requests land on the node
+whose result cache (RESULT_CACHE_SIZE) already holds them. Other reads go
+round robin; admin writes and rating events are sent to every node so
+their catalogs stay identical. The ratings a /api/recommend request with a
+user_id logs on its node are posted to the other nodes' /api/events by a
+background thread, off the request path. Events a node misses (it is down
+or the post fails) are kept, up to MAX_MISSED_EVENTS batches, and replayed
+in order once its health check passes again.
+
+A health-check thread polls each node's /api/health. Nodes that fail
+max_failures checks in a row (or refuse a proxied request) leave the ring
+and rejoin on their next good check; consistent hashing moves only the
+keys of the node that left or joined.
+
+Run a local cluster of three backend processes behind a router on :5000:
+
+    cd backend
+    python -m utils.cluster --spawn 3 --port 5000
+
+or route to nodes that are already running:
+
+    python -m utils.cluster --nodes http://10.0.0.1:5000 http://10.0.0.2:5000
+"""
+
+import bisect
+import collections
+import hashlib
+import itertools
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Request headers passed through to the nodes
+FORWARDED_HEADERS = ('Content-Type', 'Accept', 'X-User-Id', 'X-Model-Variant', 'X-Admin-Token', 'X-Profile',
+                     'X-Request-Start')
+# Response headers passed back to the client
+RETURNED_HEADERS = ('Content-Type', 'X-Model-Variant', 'X-Cache', 'Server-Timing', 'X-Profile-Id',
+                    'X-Degraded-Mode', 'Vary')
+# Event batches kept per node while it is unreachable; older ones are dropped
+MAX_MISSED_EVENTS = 10000
+EVENTS_PATH = '/api/events'
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hash ring with `replicas` virtual points per node"""
+
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        self._points = []   # sorted hashes
+        self._owners = []   # node of each point
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self):
+        return sorted(set(self._owners))
+
+    def add(self, node):
+        if node in self._owners:
+            return
+        for i in range(self.replicas):
+            point = _hash(f'{node}#{i}')
+            at = bisect.bisect(self._points, point)
+            self._points.insert(at, point)
+            self._owners.insert(at, node)
+
+    def remove(self, node):
+        keep = [i for i, owner in enumerate(self._owners) if owner != node]
+        self._points = [self._points[i] for i in keep]
+        self._owners = [self._owners[i] for i in keep]
+
+    def preference(self, key):
+        """Distinct nodes clockwise from key: the owner first, then fallbacks"""
+        if not self._points:
+            return []
+        start = bisect.bisect(self._points, _hash(key))
+        seen = []
+        for i in range(len(self._owners)):
+            owner = self._owners[(start + i) % len(self._owners)]
+            if owner not in seen:
+                seen.append(owner)
+        return seen
+
+    def node_for(self, key):
+        preference = self.preference(key)
+        return preference[0] if preference else None
+
+
+def routing_key(method, path, body=None):
+    """Hash key for a request, or None when any node may serve it"""
+    if method == 'POST' and path == '/api/recommend':
+        try:
+            ratings = json.loads(body or b'{}').get('ratings') or {}
+            profile = sorted((int(book_id), float(rating)) for book_id, rating in ratings.items())
+        except (ValueError, TypeError, AttributeError):
+            return None
+        return 'recommend:' + ','.join(f'{book_id}={rating:g}' for book_id, rating in profile)
+    if method == 'GET' and path.startswith('/api/similar/'):
+        return 'similar:' + path.rsplit('/', 1)[-1]
+    return None
+
+
+def recommend_events(method, path, body=None):
+    """/api/events body for the ratings a /api/recommend request logs (one with a user_id), else None"""
+    if method != 'POST' or path != '/api/recommend':
+        return None
+    try:
+        data = json.loads(body or b'{}')
+        user_id = data.get('user_id')
+        events = [{'user_id': user_id, 'book_id': int(book_id), 'rating': rating}
+                  for book_id, rating in (data.get('ratings') or {}).items()]
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if user_id is None or not events:
+        return None
+    return json.dumps({'events': events}).encode('utf-8')
+
+
+def is_broadcast(method, path):
+    """Requests that change node state and must reach every node"""
+    return method != 'GET' and (path.startswith('/api/admin/') or path == '/api/events')
+
+
+class NodeUnavailable(Exception):
+    pass
+
+
+class Router:
+    """Healthy-node ring plus the HTTP forwarding and health checks"""
+
+    def __init__(self, nodes, replicas=64, check_interval=1.0, max_failures=2, timeout=10.0):
+        self.nodes = list(nodes)
+        self.ring = HashRing(self.nodes, replicas)
+        self.check_interval = check_interval
+        self.max_failures = max_failures
+        self.timeout = timeout
+        self.failures = {node: 0 for node in self.nodes}
+        self.routed = {node: 0 for node in self.nodes}
+        # Event batches each node has yet to receive, oldest first, and how many were dropped
+        self.missed = {node: collections.deque() for node in self.nodes}
+        self.dropped = {node: 0 for node in self.nodes}
+        self._events = queue.Queue()
+        self._event_worker = None
+        self._event_worker_lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checker = None
+
+    def healthy(self):
+        with self._lock:
+            return self.ring.nodes
+
+    def mark_down(self, node):
+        with self._lock:
+            self.failures[node] = max(self.failures[node], self.max_failures)
+            self.ring.remove(node)
+
+    def record_check(self, node, ok):
+        """Update a node's state from one health check; a healthy node is sent the events it missed"""
+        with self._lock:
+            if ok:
+                self.failures[node] = 0
+                self.ring.add(node)
+                if self.missed[node]:
+                    self._queue_events(('resync', node))
+            else:
+                self.failures[node] += 1
+                if self.failures[node] >= self.max_failures:
+                    self.ring.remove(node)
+
+    def check(self, node):
+        try:
+            with urllib.request.urlopen(f'{node}/api/health', timeout=self.timeout) as response:
+                return response.status == 200
+        except (urllib.error.URLError, OSError):
+            return False
+
+    def check_all(self):
+        for node in self.nodes:
+            self.record_check(node, self.check(node))
+
+    def start(self):
+        """Run health checks every check_interval seconds in a daemon thread"""
+        def loop():
+            while not self._stop.wait(self.check_interval):
+                self.check_all()
+        self._checker = threading.Thread(target=loop, name='cluster-health', daemon=True)
+        self._checker.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def candidates(self, method, path, body=None):
+        """Nodes to try for a request, in order"""
+        key = routing_key(method, path, body)
+        with self._lock:
+            if key is not None:
+                return self.ring.preference(key)
+            nodes = self.ring.nodes
+        if not nodes:
+            return []
+        first = next(self._round_robin) % len(nodes)
+        return nodes[first:] + nodes[:first]
+
+    def send(self, node, method, path_and_query, body, headers):
+        """(status, body, headers) from one node; NodeUnavailable if it cannot be reached"""
+        request = urllib.request.Request(node + path_and_query, data=body if method != 'GET' else None,
+                                         headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            # The node answered; pass its error through
+            return e.code, e.read(), e.headers
+        except (urllib.error.URLError, OSError) as e:
+            raise NodeUnavailable(f'{node}: {e}')
+
+    def forward(self, method, path, query_string, body, headers):
+        """(status, body, headers, node) for a request, failing over along the ring"""
+        path_and_query = path + ('?' + query_string if query_string else '')
+        headers = {name: headers[name] for name in FORWARDED_HEADERS if name in headers}
+        if is_broadcast(method, path):
+            return self._broadcast(method, path_and_query, body, headers)
+        for node in self.candidates(method, path, body):
+            try:
+                status, data, response_headers = self.send(node, method, path_and_query, body, headers)
+            except NodeUnavailable:
+                self.mark_down(node)
+                continue
+            with self._lock:
+                self.routed[node] += 1
+            events = recommend_events(method, path, body)
+            if events is not None and status == 200:
+                # The serving node logged these ratings itself; the others get them in the background
+                self._queue_events(('copy', events, node))
+            return status, data, response_headers, node
+        raise NodeUnavailable('No healthy nodes')
+
+    def _broadcast(self, method, path_and_query, body, headers):
+        events = path_and_query == EVENTS_PATH
+        result = None
+        reached = []
+        for node in self.nodes:
+            with self._lock:
+                healthy = node in self.ring.nodes
+                if events and (not healthy or self.missed[node]):
+                    # Keep the node's events in order: it gets these after the ones it missed
+                    self._keep_missed(node, body)
+                    continue
+            if not healthy:
+                continue
+            try:
+                response = self.send(node, method, path_and_query, body, headers)
+            except NodeUnavailable:
+                self.mark_down(node)
+                if events:
+                    with self._lock:
+                        self._keep_missed(node, body)
+                continue
+            reached.append(node)
+            result = result or response
+        if result is None:
+            raise NodeUnavailable('No healthy nodes')
+        return (*result, ','.join(reached))
+
+    def _keep_missed(self, node, body):
+        """Hold an event batch for node (caller holds the lock)"""
+        missed = self.missed[node]
+        if len(missed) >= MAX_MISSED_EVENTS:
+            missed.popleft()
+            self.dropped[node] += 1
+        missed.append(body)
+
+    def _queue_events(self, job):
+        """Hand ('copy', body, served_by) or ('resync', node) to the event thread, starting it if needed"""
+        with self._event_worker_lock:
+            # One thread, so each node receives its events in order
+            if self._event_worker is None:
+                self._event_worker = threading.Thread(target=self._event_loop, name='cluster-events', daemon=True)
+                self._event_worker.start()
+        self._events.put(job)
+
+    def _event_loop(self):
+        while True:
+            job = self._events.get()
+            try:
+                if job[0] == 'copy':
+                    _, body, served_by = job
+                    for node in self.nodes:
+                        if node != served_by:
+                            self._deliver(node, body)
+                else:
+                    self._resync(job[1])
+            finally:
+                self._events.task_done()
+
+    def wait_for_events(self):
+        """Block until every queued event copy and resync has been attempted"""
+        self._events.join()
+
+    def _deliver(self, node, body):
+        with self._lock:
+            if self.missed[node] or node not in self.ring.nodes:
+                self._keep_missed(node, body)
+                return
+        if not self._post_events(node, body):
+            with self._lock:
+                self._keep_missed(node, body)
+
+    def _resync(self, node):
+        """Replay the events node missed, oldest first, stopping at the first failure"""
+        while True:
+            with self._lock:
+                if not self.missed[node]:
+                    return
+                body = self.missed[node][0]
+            if not self._post_events(node, body):
+                return
+            with self._lock:
+                self.missed[node].popleft()
+
+    def _post_events(self, node, body):
+        """Whether node took the event batch (client errors count: retrying would not help)"""
+        try:
+            status, _, _ = self.send(node, 'POST', EVENTS_PATH, body, {'Content-Type': 'application/json'})
+        except NodeUnavailable:
+            self.mark_down(node)
+            return False
+        return status < 500
+
+    def status(self):
+        with self._lock:
+            return {
+                'nodes': [{'url': node, 'healthy': node in self.ring.nodes, 'failures': self.failures[node],
+                           'routed': self.routed[node], 'missed_events': len(self.missed[node]),
+                           'dropped_events': self.dropped[node]} for node in self.nodes]
+            }
+
+
+def create_router(nodes, **options):
+    """Flask app that forwards every /api request through a Router"""
+    from flask import Flask, Response, jsonify, request
+
+    router = Router(nodes, **options)
+    router.check_all()
+    router.start()
+
+    app = Flask(__name__)
+    app.extensions['router'] = router
+
+    @app.route('/cluster/status', methods=['GET'])
+    def cluster_status():
+        return jsonify(router.status())
+
+    @app.route('/api/<path:rest>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+    def proxy(rest):
+        try:
+            status, body, headers, node = router.forward(
+                request.method, request.path, request.query_string.decode('latin-1'),
+                request.get_data(), request.headers
+            )
+        except NodeUnavailable as e:
+            return jsonify({'error': str(e)}), 503
+        response = Response(body, status=status)
+        for name in RETURNED_HEADERS:
+            if headers.get(name):
+                response.headers[name] = headers[name]
+        response.headers['X-Routed-To'] = node
+        return response
+
+    return app
+
+
+def node_environment(i, env):
+    """Environment of spawned node i: its NODE_ID, a result cache and its own EVENT_LOG file"""
+    import os
+
+    node_env = dict(env, NODE_ID=f'node-{i}')
+    node_env.setdefault('RESULT_CACHE_SIZE', '4096')
+    if node_env.get('EVENT_LOG'):
+        # Every node logs every event; one shared file would hold each event once per node
+        root, ext = os.path.splitext(node_env['EVENT_LOG'])
+        node_env['EVENT_LOG'] = f'{root}.node-{i}{ext}'
+    return node_env
+
+
+def spawn_nodes(count, base_port, env=None):
+    """Start count backend processes on base_port, base_port + 1, ...; returns (processes, urls)"""
+    import os
+    import subprocess
+    import sys
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    processes, urls = [], []
+    for i in range(count):
+        port = base_port + i
+        processes.append(subprocess.Popen(
+            [sys.executable, 'app.py', '--host', '127.0.0.1', '--port', str(port), '--no-debug'],
+            cwd=backend_dir, env=node_environment(i, dict(os.environ, **(env or {})))
+        ))
+        urls.append(f'http://127.0.0.1:{port}')
+    return processes, urls
+
+
+def wait_until_healthy(router, timeout=60.0):
+    """Block until every node passes a health check (or timeout); returns the healthy nodes"""
+    deadline = time.monotonic() + timeout
+    pending = list(router.nodes)
+    while pending and time.monotonic() < deadline:
+        pending = [node for node in pending if not router.check(node)]
+        if pending:
+            time.sleep(0.2)
+    router.check_all()
+    return router.healthy()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Consistent-hash router for backend nodes')
+    parser.add_argument('--nodes', nargs='*', default=[], help='node base URLs')
+    parser.add_argument('--spawn', type=int, default=0, help='start this many local nodes')
+    parser.add_argument('--base-port', type=int, default=5001, help='first port for spawned nodes')
+    parser.add_argument('--port', type=int, default=5000, help='router port')
+    parser.add_argument('--check-interval', type=float, default=1.0, help='seconds between health checks')
+    args = parser.parse_args()
+
+    processes, nodes = spawn_nodes(args.spawn, args.base_port) if args.spawn else ([], [])
+    nodes += args.nodes
+    try:
+        if processes:
+            wait_until_healthy(Router(nodes))
+        app = create_router(nodes, check_interval=args.check_interval)
+        print(f"✓ Routing to {len(nodes)} node(s): {', '.join(nodes)}")
+        app.run(host='0.0.0.0', port=args.port, threaded=True)
+    finally:
+        for process in processes:
+            process.terminate()
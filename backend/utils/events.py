@@ -0,0 +1,213 @@
+"""
+Rating event ingestion.
+
+Events are appended to a JSON-lines log by a single writer thread that
+commits them in batches (one write and one fsync per batch), so many
+concurrent producers share each fsync. Committed batches are handed to a
+second thread that folds them into running statistics, keeping slow
+consumers off the write path.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from itertools import islice
+
+from utils.metrics import metrics
+
+_STOP = object()
+
+
+def validate_event(data):
+    """Normalize one rating event; raises ValueError for malformed input"""
+    if not isinstance(data, dict):
+        raise ValueError("Event must be an object")
+    user_id = data.get('user_id')
+    if user_id is None or isinstance(user_id, (dict, list, bool)):
+        raise ValueError("user_id is required")
+    try:
+        book_id = int(data['book_id'])
+        rating = float(data['rating'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("book_id and rating must be numbers")
+    if not 1 <= rating <= 5:
+        raise ValueError("rating must be between 1 and 5")
+    return {'user_id': user_id, 'book_id': book_id, 'rating': rating,
+            'ts': float(data.get('ts') or time.time())}
+
+
+def read_events(path):
+    """Yield the events of a log file in order, skipping a torn last line"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:  # partial write from a crash
+                continue
+
+
+class EventLog:
+    """Append-only event log with group-committed fsyncs.
+
+    append() only enqueues; the writer thread collects up to max_batch events
+    (waiting at most flush_interval after the first) and makes them durable
+    with a single fsync, then passes the batch to on_batch.
+    """
+
+    def __init__(self, path, on_batch=None, flush_interval=0.05, max_batch=5000, fsync=True):
+        self.path = path
+        self.on_batch = on_batch
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self.written = 0
+        self._queue = queue.Queue()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+        self._thread.start()
+
+    def append(self, events):
+        for event in events:
+            self._queue.put(event)
+
+    def close(self):
+        """Commit everything queued so far and stop the writer"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._file.close()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = time.perf_counter() + self.flush_interval
+            stopping = False
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    event = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if event is _STOP:
+                    stopping = True
+                    break
+                batch.append(event)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch):
+        start = time.perf_counter()
+        self._file.write(''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in batch))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.written += len(batch)
+        metrics.observe('event_commit_seconds', time.perf_counter() - start)
+        metrics.inc('events_written_total', len(batch))
+        if self.on_batch is not None:
+            self.on_batch(batch)
+
+
+class BatchWorker:
+    """Background thread that applies committed batches in order"""
+
+    def __init__(self, apply):
+        self.apply = apply
+        self.applied = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='event-stats-worker', daemon=True)
+        self._thread.start()
+
+    def submit(self, batch):
+        self._queue.put(batch)
+
+    def drain(self):
+        """Block until every submitted batch has been applied"""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is _STOP:
+                    return
+                # Merge whatever else is waiting into one update
+                while True:
+                    try:
+                        more = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if more is _STOP:
+                        self._queue.put(_STOP)
+                        self._queue.task_done()
+                        break
+                    batch = batch + more
+                    self._queue.task_done()
+                start = time.perf_counter()
+                self.apply(batch)
+                self.applied += len(batch)
+                metrics.observe('event_apply_seconds', time.perf_counter() - start)
+            except Exception as e:
+                print(f"✗ Failed to apply {len(batch)} events: {e}")
+            finally:
+                self._queue.task_done()
+
+
+class RatingAggregator:
+    """Turns rating events into per-book and co-rating deltas.
+
+    Keeps each user's ratings so re-ratings adjust a book's sum instead of
+    adding a review, and so a new rating pairs with the user's most recent
+    max_history books.
+    """
+
+    def __init__(self, max_history=200):
+        self.max_history = max_history
+        self.user_ratings = {}
+
+    def seed(self, ratings_df):
+        """Load existing user histories (e.g. the ratings the models were fit on)"""
+        for user_id, book_id, rating in zip(ratings_df['user_id'].tolist(), ratings_df['book_id'].tolist(),
+                                            ratings_df['rating'].tolist()):
+            self.user_ratings.setdefault(user_id, {})[book_id] = rating
+
+    def process(self, events):
+        """Returns (review_deltas, sum_deltas, pair_counts) for a batch of events.
+
+        review_deltas counts new reviews per book, sum_deltas the change in
+        each book's rating total and pair_counts the new co-ratings per
+        (book_a, book_b) pair with book_a < book_b.
+        """
+        review_deltas = Counter()
+        sum_deltas = Counter()
+        pair_counts = Counter()
+        for event in events:
+            book_id, rating = event['book_id'], event['rating']
+            history = self.user_ratings.setdefault(event['user_id'], {})
+            previous = history.get(book_id)
+            if previous is not None:
+                sum_deltas[book_id] += rating - previous
+                history[book_id] = rating
+                continue
+            review_deltas[book_id] += 1
+            sum_deltas[book_id] += rating
+            for other in islice(reversed(history), self.max_history):
+                pair_counts[(book_id, other) if book_id < other else (other, book_id)] += 1
+            history[book_id] = rating
+        return review_deltas, sum_deltas, pair_counts
@@ -0,0 +1,218 @@
+"""
+Bitset filters over the catalog.
+
+Every filterable value (a category, a level, a year or rating threshold) is
+precomputed as a packed bitset with one bit per book, in catalog row order.
+A request's filters are combined with a few word-wise ANDs over N/64 uint64
+words, and rankers test candidate positions against the result before they
+select their top N.
+"""
+
+import numpy as np
+
+FILTER_FIELDS = ('category', 'level', 'year_min', 'year_max', 'min_rating', 'exclude')
+
+
+def pack(mask):
+    """Pack a boolean array into little-endian uint64 words"""
+    n_words = (len(mask) + 63) // 64
+    padded = np.zeros(n_words * 64, dtype=bool)
+    padded[:len(mask)] = mask
+    return np.packbits(padded, bitorder='little').view('<u8')
+
+
+def _values(source, key, split=False):
+    """List of values for key from request args (repeated) or a JSON dict (one value or a list).
+
+    split=True also splits string values on commas; only numeric lists use it,
+    since category and level names may contain commas.
+    """
+    if hasattr(source, 'getlist'):
+        values = source.getlist(key)
+    else:
+        values = source.get(key)
+        if values is None:
+            return []
+        if not isinstance(values, list):
+            values = [values]
+    out = []
+    for value in values:
+        if split and isinstance(value, str):
+            out.extend(part.strip() for part in value.split(',') if part.strip())
+        else:
+            out.append(value)
+    return out
+
+
+def parse_filters(source):
+    """Normalize filter parameters; raises ValueError for malformed values.
+
+    Accepts category and level (one or several; 'All' means any), year_min,
+    year_max, min_rating and exclude (book ids).
+    """
+    source = source or {}
+    if not (hasattr(source, 'getlist') or isinstance(source, dict)):
+        raise ValueError("filters must be an object")
+    filters = {}
+    for field in ('category', 'level'):
+        values = [str(value) for value in _values(source, field) if value != 'All']
+        if values:
+            filters[field] = values
+    try:
+        for field, cast in (('year_min', int), ('year_max', int), ('min_rating', float)):
+            values = _values(source, field)
+            if values:
+                filters[field] = cast(values[0])
+        exclude = [int(value) for value in _values(source, 'exclude', split=True)]
+    except (TypeError, ValueError):
+        raise ValueError("year_min, year_max, min_rating and exclude must be numbers")
+    if exclude:
+        filters['exclude'] = exclude
+    return filters
+
+
+class FilterMask:
+    """A combined filter: one bit per catalog row, set when the book passes"""
+
+    __slots__ = ('words', 'n')
+
+    def __init__(self, words, n):
+        self.words = words
+        self.n = n
+
+    def contains(self, positions):
+        """Boolean array: which catalog positions pass the filter"""
+        positions = np.asarray(positions, dtype=np.int64)
+        return ((self.words[positions >> 6] >> (positions & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+
+    def to_bool(self):
+        return np.unpackbits(self.words.view(np.uint8), count=self.n, bitorder='little').astype(bool)
+
+    def positions(self):
+        """Catalog positions that pass, in row order"""
+        return np.flatnonzero(self.to_bool())
+
+
+class _ThresholdIndex:
+    """Bitsets for value >= x and value <= x, one per distinct value.
+
+    Columns with more than max_levels distinct values are compared on demand.
+    The (levels, ge, le) tables are replaced as one tuple, so concurrent
+    readers always see matching levels and bitset rows.
+    """
+
+    def __init__(self, values, max_levels=256):
+        self.values = np.array(values)
+        self.max_levels = max_levels
+        levels = np.unique(self.values)
+        self.tables = None
+        if len(levels) <= max_levels:
+            self.tables = (levels,
+                           np.stack([pack(self.values >= level) for level in levels]),
+                           np.stack([pack(self.values <= level) for level in levels]))
+
+    @property
+    def precomputed(self):
+        return self.tables is not None
+
+    def update(self, positions, values):
+        """Set the values at positions, patching only their bits.
+
+        A value that is not a level yet adds one bitset row; levels no book
+        holds any more are kept, which leaves the thresholds correct. Each
+        book's bits change one word at a time: a concurrent read sees either
+        its old or its new value.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        self.values[positions] = values
+        if self.tables is None:
+            return
+        levels, ge, le = self.tables
+        new = np.setdiff1d(self.values[positions], levels)
+        if len(levels) + len(new) > self.max_levels:
+            self.tables = None
+            return
+        if len(new):
+            for level in new:
+                i = np.searchsorted(levels, level)
+                levels = np.insert(levels, i, level)
+                ge = np.insert(ge, i, pack(self.values >= level), axis=0)
+                le = np.insert(le, i, pack(self.values <= level), axis=0)
+            self.tables = (levels, ge, le)
+        words = positions >> 6
+        bits = np.uint64(1) << (positions & 63).astype(np.uint64)
+        for word, bit, value in zip(words, bits, self.values[positions]):
+            for table, passes in ((ge, value >= levels), (le, value <= levels)):
+                table[:, word] = np.where(passes, table[:, word] | bit, table[:, word] & ~bit)
+
+    def at_least(self, x):
+        tables = self.tables
+        if tables is None:
+            return pack(self.values >= x)
+        levels, ge, _ = tables
+        i = np.searchsorted(levels, x, side='left')
+        return ge[i] if i < len(levels) else np.zeros_like(ge[0])
+
+    def at_most(self, x):
+        tables = self.tables
+        if tables is None:
+            return pack(self.values <= x)
+        levels, _, le = tables
+        i = np.searchsorted(levels, x, side='right') - 1
+        return le[i] if i >= 0 else np.zeros_like(le[0])
+
+
+class FilterIndex:
+    """Precomputed bitsets for the filterable columns of a catalog"""
+
+    def __init__(self, books_df):
+        self.refresh(books_df)
+
+    def refresh(self, books_df):
+        """Rebuild every bitset (after rows are added or removed)"""
+        self.books_df = books_df
+        self.n = len(books_df)
+        self.positions = {book_id: pos for pos, book_id in enumerate(books_df['book_id'].tolist())}
+        self.all = pack(np.ones(self.n, dtype=bool))
+        self.by_value = {}
+        for field in ('category', 'level'):
+            if field in books_df:
+                column = books_df[field].to_numpy()
+                self.by_value[field] = {value: pack(column == value) for value in np.unique(column)}
+        self.years = _ThresholdIndex(books_df['year'].to_numpy()) if 'year' in books_df else None
+        self.refresh_ratings()
+
+    def refresh_ratings(self):
+        """Rebuild the rating thresholds"""
+        self.ratings = _ThresholdIndex(self.books_df['rating'].to_numpy()) if 'rating' in self.books_df else None
+
+    def update_ratings(self, positions, ratings):
+        """Patch the rating thresholds for books at positions whose ratings changed"""
+        if self.ratings is not None:
+            self.ratings.update(positions, ratings)
+
+    def mask(self, filters):
+        """FilterMask for parsed filters, or None when nothing is filtered"""
+        if not filters:
+            return None
+        words = self.all.copy()
+        for field in ('category', 'level'):
+            if field in filters:
+                bitsets = self.by_value.get(field, {})
+                allowed = np.zeros_like(words)
+                for value in filters[field]:
+                    if value in bitsets:
+                        allowed |= bitsets[value]
+                words &= allowed
+        if self.years is not None:
+            if 'year_min' in filters:
+                words &= self.years.at_least(filters['year_min'])
+            if 'year_max' in filters:
+                words &= self.years.at_most(filters['year_max'])
+        if self.ratings is not None and 'min_rating' in filters:
+            words &= self.ratings.at_least(filters['min_rating'])
+        for book_id in filters.get('exclude', ()):
+            pos = self.positions.get(book_id)
+            if pos is not None:
+                words[pos >> 6] &= ~np.uint64(1 << (pos & 63))
+        return FilterMask(words, self.n)
@@ -0,0 +1,188 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Timers, counters and gauges are keyed by metric name plus a sorted tuple of
+label pairs. When metrics are disabled every call returns immediately, so
+instrumentation can stay in the request path.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+# Latency buckets in seconds (upper bounds, +Inf is implicit)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    """Fixed-bucket histogram with interpolated quantile estimates"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate the q-quantile by linear interpolation inside its bucket"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets):
+                    # Overflow bucket has no upper bound; report its lower bound
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+
+class _Timer:
+    """Context manager that records elapsed seconds into a histogram"""
+
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(label_pairs, extra=()):
+    pairs = list(label_pairs) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return '{' + body + '}'
+
+
+class Metrics:
+    """Registry of counters, gauges and latency histograms"""
+
+    def __init__(self, enabled=True, namespace='bookrec'):
+        self.enabled = enabled
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def timer(self, name, **labels):
+        """Time a block: ``with metrics.timer('stage_seconds', stage='scoring'):``"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(_key(labels))
+            if histogram is None:
+                histogram = series[_key(labels)] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            key = _key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges.setdefault(name, {})[_key(labels)] = value
+
+    def cache_lookup(self, cache, hit):
+        """Count a cache hit or miss; hit ratios are derived at render time"""
+        self.inc('cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        ns = self.namespace
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f'# TYPE {ns}_{name} counter')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{ns}_{name}{_format_labels(key)} {value}')
+
+            cache_series = self.counters.get('cache_requests_total', {})
+            if cache_series:
+                totals = {}
+                for key, value in cache_series.items():
+                    labels = dict(key)
+                    hits, total = totals.get(labels['cache'], (0, 0))
+                    if labels['result'] == 'hit':
+                        hits += value
+                    totals[labels['cache']] = (hits, total + value)
+                lines.append(f'# TYPE {ns}_cache_hit_ratio gauge')
+                for cache, (hits, total) in sorted(totals.items()):
+                    lines.append(f'{ns}_cache_hit_ratio{_format_labels([("cache", cache)])} {hits / total:.6f}')
+
+            for name, series in sorted(self.gauges.items()):
+                lines.append(f'# TYPE {ns}_{name} gauge')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{ns}_{name}{_format_labels(key)} {value:.6f}')
+
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f'# TYPE {ns}_{name} histogram')
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f'{ns}_{name}_bucket{_format_labels(key, [("le", bound)])} {cumulative}')
+                    lines.append(f'{ns}_{name}_bucket{_format_labels(key, [("le", "+Inf")])} {histogram.count}')
+                    lines.append(f'{ns}_{name}_sum{_format_labels(key)} {histogram.sum:.6f}')
+                    lines.append(f'{ns}_{name}_count{_format_labels(key)} {histogram.count}')
+                lines.append(f'# TYPE {ns}_{name}_quantile gauge')
+                for key, histogram in sorted(series.items()):
+                    for q in QUANTILES:
+                        value = histogram.quantile(q)
+                        lines.append(f'{ns}_{name}_quantile{_format_labels(key, [("quantile", q)])} {value:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry; set METRICS_ENABLED=0 to turn instrumentation off
+metrics = Metrics(enabled=os.environ.get('METRICS_ENABLED', '1') != '0')
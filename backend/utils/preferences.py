@@ -0,0 +1,28 @@
+"""
+Signed preference weights for a ratings profile.
+
+Liked books (rated LIKED_RATING or higher) pull recommendations towards
+similar books and disliked books (rated below NEUTRAL_RATING) push them
+away at DISLIKE_WEIGHT times that strength; neutral ratings carry no
+weight. The rankers apply these weights in the same matrix product that
+averages liked books, so dislikes add no extra pass over the catalog.
+"""
+
+LIKED_RATING = 4
+NEUTRAL_RATING = 3
+DISLIKE_WEIGHT = 0.5
+
+
+def signed_weights(user_ratings):
+    """{book_id: weight} of the liked (+1) and disliked (-DISLIKE_WEIGHT) books, in profile order"""
+    weights = {}
+    for book_id, rating in user_ratings.items():
+        if rating >= LIKED_RATING:
+            weights[book_id] = 1.0
+        elif rating < NEUTRAL_RATING:
+            weights[book_id] = -DISLIKE_WEIGHT
+    return weights
+
+
+def has_dislikes(weights):
+    return any(weight < 0 for weight in weights.values())
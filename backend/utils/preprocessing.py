@@ -1,9 +1,97 @@
 
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.preprocessing import LabelEncoder
+
+from utils.statistics import CatalogStatistics
+
+
+def _median_from_counts(counts):
+    """Exact median of the values counted in counts ({value: count}), like Series.median"""
+    total = sum(counts.values())
+    if total == 0:
+        return np.nan
+    values = sorted(counts)
+    cumulative = np.cumsum([counts[v] for v in values])
+    lower = values[np.searchsorted(cumulative, (total - 1) // 2, side='right')]
+    upper = values[np.searchsorted(cumulative, total // 2, side='right')]
+    return (lower + upper) / 2
+
+
+def _clean_chunk(chunk, median_rating):
+    """Fill, strip and hash one partition: (chunk, key hashes, valid-rating mask).
+
+    Duplicates are detected on the normalized (title, author) key: stripped,
+    case-folded and with internal whitespace collapsed.
+    """
+    title = chunk['title'].fillna('Unknown').astype(str).str.strip()
+    author = chunk['author'].fillna('Unknown').astype(str).str.strip()
+    rating = pd.to_numeric(chunk['rating'], errors='coerce').fillna(median_rating)
+    key = (title.str.casefold().str.replace(r'\s+', ' ', regex=True) + '\x1f' +
+           author.str.casefold().str.replace(r'\s+', ' ', regex=True))
+    hashes = pd.util.hash_array(key.to_numpy(dtype=object))
+    # Columns are replaced rather than copied and modified in place
+    chunk = chunk.assign(title=title, author=author, rating=rating)
+    valid = ((rating >= 0) & (rating <= 5)).to_numpy()
+    return chunk, hashes, valid
+
+
+def _first_occurrences(hashes, seen):
+    """Mask of rows whose key was not seen before (in seen or earlier in hashes); updates seen"""
+    first = ~pd.Series(hashes).duplicated().to_numpy()
+    first &= np.fromiter((h not in seen for h in hashes.tolist()), dtype=bool, count=len(hashes))
+    seen.update(hashes[first].tolist())
+    return first
+
+
+def render_charts(aggregates, path, fmt='png', dpi=300):
+    """Draw the four dataset charts from precomputed aggregates; returns (figure, seconds)"""
+    # The object-oriented API renders with Agg without touching pyplot's global backend
+    from matplotlib.figure import Figure
+    
+    start = time.perf_counter()
+    fig = Figure(figsize=(15, 12))
+    axes = fig.subplots(2, 2)
+    
+    # 1. Category distribution
+    categories = aggregates['categories']
+    axes[0, 0].bar(list(categories), list(categories.values()), color='skyblue')
+    axes[0, 0].set_title('Books by Category', fontsize=14, fontweight='bold')
+    axes[0, 0].set_xlabel('Category')
+    axes[0, 0].set_ylabel('Count')
+    axes[0, 0].tick_params(axis='x', rotation=45)
+    
+    # 2. Level distribution
+    levels = aggregates['levels']
+    axes[0, 1].pie(list(levels.values()), labels=list(levels), autopct='%1.1f%%')
+    axes[0, 1].set_title('Books by Difficulty Level', fontsize=14, fontweight='bold')
+    
+    # 3. Rating distribution (bins counted while the statistics were built)
+    edges = aggregates['rating_edges']
+    axes[1, 0].bar(edges[:-1], aggregates['rating_counts'], width=np.diff(edges), align='edge',
+                   color='lightcoral', edgecolor='black')
+    axes[1, 0].set_title('Rating Distribution', fontsize=14, fontweight='bold')
+    axes[1, 0].set_xlabel('Rating')
+    axes[1, 0].set_ylabel('Frequency')
+    
+    # 4. Books published over years
+    years = aggregates['years']
+    axes[1, 1].plot(list(years), list(years.values()), marker='o', color='green')
+    axes[1, 1].set_title('Books Published by Year', fontsize=14, fontweight='bold')
+    axes[1, 1].set_xlabel('Year')
+    axes[1, 1].set_ylabel('Number of Books')
+    axes[1, 1].grid(True, alpha=0.3)
+    
+    fig.tight_layout()
+    fig.savefig(path, format=fmt, dpi=dpi, bbox_inches='tight')
+    seconds = time.perf_counter() - start
+    print(f"Visualization saved to {path} in {seconds:.2f}s")
+    return fig, seconds
+
 
 class BookDataProcessor:
     def __init__(self, csv_path=None):
@@ -11,6 +99,8 @@ class BookDataProcessor:
         self.csv_path = csv_path
         self.df = None
         self.cleaned_df = None
+        # Streaming statistics of the cleaned data, filled in by clean_data/clean_csv
+        self.stats = None
         
     def load_sample_data(self):
         """Load sample tech books data"""
@@ -82,30 +172,75 @@ class BookDataProcessor:
     
     def clean_data(self):
         """Clean and preprocess the data"""
-        self.cleaned_df = self.df.copy()
+        # Fill missing values (rating with the median) and strip text columns
+        median_rating = pd.to_numeric(self.df['rating'], errors='coerce').median()
+        cleaned, hashes, valid = _clean_chunk(self.df, median_rating)
         
-        # Handle missing values
-        self.cleaned_df['title'] = self.cleaned_df['title'].fillna('Unknown')
-        self.cleaned_df['author'] = self.cleaned_df['author'].fillna('Unknown')
-        self.cleaned_df['rating'] = self.cleaned_df['rating'].fillna(self.cleaned_df['rating'].median())
+        # Remove duplicates (first occurrence wins), then ratings outside 0-5
+        keep = _first_occurrences(hashes, set()) & valid
+        self.cleaned_df = cleaned[keep]
+        self.stats = CatalogStatistics.from_frame(self.cleaned_df)
+        
+        return self.cleaned_df
+    
+    def clean_csv(self, output_path, chunksize=100_000, n_workers=None):
+        """Clean csv_path into output_path chunk by chunk, for dumps too large for memory.
         
-        # Remove duplicates
-        self.cleaned_df = self.cleaned_df.drop_duplicates(subset=['title', 'author'])
+        Chunks are cleaned in a pool of n_workers processes (0 cleans in this
+        process) and appended to the output in input order; duplicates are
+        tracked across chunks by 64-bit key hashes. Memory is bounded by a few
+        chunks plus the set of hashes. Returns row counts.
+        """
+        if not self.csv_path:
+            raise ValueError("CSV path not provided")
         
-        # Clean text columns
-        self.cleaned_df['title'] = self.cleaned_df['title'].str.strip()
-        self.cleaned_df['author'] = self.cleaned_df['author'].str.strip()
+        # First pass over the rating column only: the exact median for filling gaps
+        counts = Counter()
+        for ratings in pd.read_csv(self.csv_path, usecols=['rating'], chunksize=chunksize):
+            counts.update(pd.to_numeric(ratings['rating'], errors='coerce').dropna().value_counts().to_dict())
+        median_rating = _median_from_counts(counts)
         
-        # Ensure rating is in valid range
-        self.cleaned_df = self.cleaned_df[
-            (self.cleaned_df['rating'] >= 0) & 
-            (self.cleaned_df['rating'] <= 5)
-        ]
+        stats = {'rows_in': 0, 'rows_out': 0, 'duplicates': 0, 'invalid_rating': 0}
+        self.stats = CatalogStatistics()
+        seen = set()
+        chunks = pd.read_csv(self.csv_path, chunksize=chunksize)
+        if os.path.exists(output_path):
+            os.remove(output_path)
         
-        return self.cleaned_df
+        def write(result):
+            cleaned, hashes, valid = result
+            first = _first_occurrences(hashes, seen)
+            keep = first & valid
+            stats['rows_in'] += len(cleaned)
+            stats['duplicates'] += int((~first).sum())
+            stats['invalid_rating'] += int((first & ~valid).sum())
+            stats['rows_out'] += int(keep.sum())
+            cleaned = cleaned[keep]
+            self.stats.update(cleaned)
+            cleaned.to_csv(output_path, mode='a', header=not os.path.exists(output_path), index=False)
+        
+        if n_workers == 0:
+            for chunk in chunks:
+                write(_clean_chunk(chunk, median_rating))
+        else:
+            n_workers = n_workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                # A bounded window of chunks in flight, written back in input order
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(_clean_chunk, chunk, median_rating))
+                    if len(pending) >= 2 * n_workers:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+        
+        print(f"Cleaned {stats['rows_in']} rows into {stats['rows_out']} ({output_path})")
+        return stats
     
     def encode_features(self):
         """Encode categorical features"""
+        from sklearn.preprocessing import LabelEncoder
+        
         le_category = LabelEncoder()
         le_level = LabelEncoder()
         
@@ -115,50 +250,38 @@ class BookDataProcessor:
         return self.cleaned_df, le_category, le_level
     
     def get_statistics(self):
-        """Get comprehensive statistics about the dataset"""
-        stats = {
-            'total_books': len(self.cleaned_df),
-            'categories': self.cleaned_df['category'].value_counts().to_dict(),
-            'levels': self.cleaned_df['level'].value_counts().to_dict(),
-            'avg_rating': self.cleaned_df['rating'].mean(),
-            'year_range': (self.cleaned_df['year'].min(), self.cleaned_df['year'].max()),
-            'top_rated': self.cleaned_df.nlargest(5, 'rating')[['title', 'rating']].to_dict('records')
-        }
-        return stats
+        """Get comprehensive statistics about the dataset (maintained while cleaning, O(1) to read)"""
+        if self.stats is None:
+            self.stats = CatalogStatistics.from_frame(self.cleaned_df)
+        return self.stats.to_dict()
     
-    def visualize_data(self, save_path='visualizations'):
-        """Create visualizations of the dataset"""
-        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-        
-        # 1. Category distribution
-        self.cleaned_df['category'].value_counts().plot(kind='bar', ax=axes[0, 0], color='skyblue')
-        axes[0, 0].set_title('Books by Category', fontsize=14, fontweight='bold')
-        axes[0, 0].set_xlabel('Category')
-        axes[0, 0].set_ylabel('Count')
-        axes[0, 0].tick_params(axis='x', rotation=45)
-        
-        # 2. Level distribution
-        self.cleaned_df['level'].value_counts().plot(kind='pie', ax=axes[0, 1], autopct='%1.1f%%')
-        axes[0, 1].set_title('Books by Difficulty Level', fontsize=14, fontweight='bold')
-        
-        # 3. Rating distribution
-        axes[1, 0].hist(self.cleaned_df['rating'], bins=20, color='lightcoral', edgecolor='black')
-        axes[1, 0].set_title('Rating Distribution', fontsize=14, fontweight='bold')
-        axes[1, 0].set_xlabel('Rating')
-        axes[1, 0].set_ylabel('Frequency')
-        
-        # 4. Books published over years
-        year_counts = self.cleaned_df['year'].value_counts().sort_index()
-        axes[1, 1].plot(year_counts.index, year_counts.values, marker='o', color='green')
-        axes[1, 1].set_title('Books Published by Year', fontsize=14, fontweight='bold')
-        axes[1, 1].set_xlabel('Year')
-        axes[1, 1].set_ylabel('Number of Books')
-        axes[1, 1].grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        plt.savefig(f'{save_path}/data_analysis.png', dpi=300, bbox_inches='tight')
-        print(f"Visualization saved to {save_path}/data_analysis.png")
+    def visualize_data(self, save_path='visualizations', fmt='png', dpi=300, background=False):
+        """Create visualizations of the dataset.
+        
+        Charts are drawn from the streaming statistics (counts and histogram
+        bins), never from the rows, on a figure that needs no display. fmt is
+        any matplotlib format ('png', 'svg', 'pdf', ...); lower dpi or 'svg' is
+        cheaper for quick looks. With background=True the chart is rendered in
+        a separate process, which is returned (join() it to wait).
+        """
+        if self.stats is None:
+            self.stats = CatalogStatistics.from_frame(self.cleaned_df)
+        counts, edges = self.stats.rating_histogram()
+        aggregates = {
+            'categories': dict(self.stats.categories.most_common()),
+            'levels': dict(self.stats.levels.most_common()),
+            'rating_counts': counts,
+            'rating_edges': edges,
+            'years': self.stats.year_counts()
+        }
+        path = f'{save_path}/data_analysis.{fmt}'
         
+        if background:
+            import multiprocessing
+            process = multiprocessing.Process(target=render_charts, args=(aggregates, path, fmt, dpi), daemon=True)
+            process.start()
+            return process
+        fig, _ = render_charts(aggregates, path, fmt, dpi)
         return fig
     
     def export_cleaned_data(self, output_path='cleaned_books.csv'):
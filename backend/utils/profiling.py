@@ -0,0 +1,111 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when profiling is enabled and either carries the
+profile header or falls into the sampled fraction. The handler runs under
+cProfile and the result is kept in a bounded in-memory store, retrievable
+as text or as a .prof file (marshalled pstats) through the admin API.
+"""
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class ProfileStore:
+    """Keeps the most recent profiles, evicting the oldest beyond max_profiles"""
+
+    def __init__(self, max_profiles=50):
+        self.max_profiles = max_profiles
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles[profile['id']] = profile
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def summaries(self):
+        """Metadata for every stored profile, newest first"""
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [
+            {k: v for k, v in profile.items() if k not in ('text', 'raw')}
+            for profile in reversed(profiles)
+        ]
+
+
+class RequestProfiler:
+    """Decides which requests to profile and records their cProfile stats"""
+
+    def __init__(self, enabled=False, sample_rate=0.0, header='X-Profile',
+                 sort_by='cumulative', limit=40, max_profiles=50):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.header = header
+        self.sort_by = sort_by
+        self.limit = limit
+        self.store = ProfileStore(max_profiles)
+        # cProfile cannot run in two threads at once on newer Pythons
+        self._busy = threading.Lock()
+
+    def should_profile(self, headers):
+        if not self.enabled:
+            return False
+        if headers.get(self.header) == '1':
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        """Start profiling the current thread; None if another profile is running"""
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiler (e.g. a debugger) is active
+            self._busy.release()
+            return None
+        return profile, time.perf_counter()
+
+    def finish(self, handle, **metadata):
+        """Stop profiling, store the stats and return the new profile id"""
+        profile, start = handle
+        profile.disable()
+        duration = time.perf_counter() - start
+        self._busy.release()
+
+        stream = io.StringIO()
+        stats = pstats.Stats(profile, stream=stream)
+        stats.sort_stats(self.sort_by).print_stats(self.limit)
+
+        profile_id = uuid.uuid4().hex[:12]
+        self.store.add({
+            'id': profile_id,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'duration_ms': round(duration * 1000, 3),
+            **metadata,
+            'text': stream.getvalue(),
+            'raw': marshal.dumps(stats.stats)
+        })
+        return profile_id
+
+
+def profiler_from_env():
+    """Build a profiler from PROFILING_ENABLED and PROFILE_SAMPLE_RATE"""
+    return RequestProfiler(
+        enabled=os.environ.get('PROFILING_ENABLED', '0') == '1',
+        sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+    )
@@ -0,0 +1,84 @@
+"""
+Reduced-precision storage for similarity and factor matrices.
+
+'float32' and 'float16' are plain NumPy casts. 'int8' stores each row as
+int8 codes with one float32 scale per row (symmetric, round to nearest),
+a quarter of float32's size. QuantizedMatrix dequantizes only the rows
+and cells it is asked for, and supports the indexing and matrix products
+the recommenders use. Scoring code therefore works unchanged with any of
+the four precisions.
+"""
+
+import numpy as np
+
+PRECISIONS = ('float64', 'float32', 'float16', 'int8')
+
+
+class QuantizedMatrix:
+    """int8 matrix with a float32 scale per row"""
+
+    dtype = np.dtype(np.float32)
+
+    def __init__(self, matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        scale = np.abs(matrix).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        self.scale = scale.astype(np.float32)
+        self.values = np.rint(matrix / self.scale[:, None]).astype(np.int8)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.scale.nbytes
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            rows, cols = key
+            scale = self.scale[rows]
+            if np.ndim(scale) and isinstance(cols, slice):
+                scale = scale[..., None]
+        else:
+            scale = self.scale[key]
+            if np.ndim(scale):
+                scale = scale[..., None]
+        return self.values[key].astype(np.float32) * scale
+
+    def __setitem__(self, row, values):
+        """Re-quantize one row"""
+        values = np.asarray(values, dtype=np.float32)
+        scale = np.abs(values).max(initial=0.0) / 127.0 or 1.0
+        self.scale[row] = scale
+        self.values[row] = np.rint(values / scale).astype(np.int8)
+
+    def __matmul__(self, other):
+        """self @ other: each row's dot products times its scale"""
+        product = self.values.astype(np.float32) @ np.asarray(other, dtype=np.float32)
+        return product * (self.scale if product.ndim == 1 else self.scale[:, None])
+
+    def __rmatmul__(self, other):
+        """other @ self, for a vector or a matrix on the left"""
+        return (np.asarray(other, dtype=np.float32) * self.scale) @ self.values.astype(np.float32)
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self.values.astype(np.float32) * self.scale[:, None]
+        return dense if dtype is None else dense.astype(dtype)
+
+    def dequantize(self):
+        return np.asarray(self)
+
+
+def quantize(matrix, precision='float64'):
+    """Store matrix at the given precision (see PRECISIONS)"""
+    if precision == 'float64':
+        return matrix
+    if precision in ('float32', 'float16'):
+        return np.asarray(matrix, dtype=precision)
+    if precision == 'int8':
+        return QuantizedMatrix(matrix)
+    raise ValueError(f"Unknown precision: {precision} (expected one of {', '.join(PRECISIONS)})")
@@ -0,0 +1,186 @@
+"""
+Registry of named, versioned models with hot swapping.
+
+Each name (e.g. 'default', 'svd') has one active version. Requests take a
+lease on the active version, so activating a new version only changes what
+later requests get: in-flight requests keep the model they started with, and
+a replaced version is closed once its last lease is released. Traffic can be
+split across names by weight for A/B comparisons.
+"""
+
+import random
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+
+class ModelEntry:
+    """One registered model version and its lease count"""
+
+    def __init__(self, name, version, model, metadata=None):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.metadata = metadata or {}
+        self.created = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.leases = 0
+        self.retired = False
+
+    @property
+    def label(self):
+        return f'{self.name}@{self.version}'
+
+    def close(self):
+        close = getattr(self.model, 'close', None)
+        if close is not None:
+            close()
+
+
+class ModelRegistry:
+    """Thread-safe store of model versions, active versions and traffic weights"""
+
+    def __init__(self, default='default', max_versions=2):
+        self.default = default
+        self.max_versions = max_versions
+        self._versions = {}   # name -> {version: ModelEntry}, oldest first
+        self._active = {}     # name -> ModelEntry
+        self._weights = {}    # name -> traffic weight
+        self._lock = threading.Lock()
+
+    def register(self, name, version, model, activate=True, **metadata):
+        """Add a model version, making it active unless activate=False"""
+        entry = ModelEntry(name, version, model, metadata)
+        with self._lock:
+            versions = self._versions.setdefault(name, {})
+            if version in versions:
+                raise ValueError(f"{entry.label} is already registered")
+            versions[version] = entry
+            if activate or name not in self._active:
+                self._active[name] = entry
+            self._evict(name)
+        return entry
+
+    def activate(self, name, version):
+        """Atomically point name at an already registered version"""
+        with self._lock:
+            entry = self._versions.get(name, {}).get(version)
+            if entry is None or entry.retired:
+                raise KeyError(f"{name}@{version} is not registered")
+            self._active[name] = entry
+        return entry
+
+    def retire(self, name, version):
+        """Remove an inactive version; it is closed once its leases are released"""
+        with self._lock:
+            entry = self._versions.get(name, {}).get(version)
+            if entry is None:
+                raise KeyError(f"{name}@{version} is not registered")
+            if self._active.get(name) is entry:
+                raise ValueError(f"{entry.label} is active")
+            self._retire(entry)
+
+    def get(self, name=None):
+        """The active entry for name (or the default), without taking a lease"""
+        with self._lock:
+            entry = self._active.get(name or self.default)
+        if entry is None:
+            raise KeyError(f"No active model named {name or self.default}")
+        return entry
+
+    def active_models(self):
+        """The active model of every name"""
+        with self._lock:
+            return [entry.model for entry in self._active.values()]
+
+    def acquire(self, name=None):
+        """Lease the active version of name; pair every call with release()"""
+        with self._lock:
+            entry = self._active.get(name or self.default)
+            if entry is None:
+                raise KeyError(f"No active model named {name or self.default}")
+            entry.leases += 1
+        return entry
+
+    def release(self, entry):
+        with self._lock:
+            entry.leases -= 1
+            closing = entry.retired and entry.leases == 0
+        if closing:
+            entry.close()
+
+    @contextmanager
+    def lease(self, name=None):
+        entry = self.acquire(name)
+        try:
+            yield entry.model
+        finally:
+            self.release(entry)
+
+    def set_weights(self, weights):
+        """Split traffic across names, e.g. {'default': 90, 'svd': 10}; {} disables"""
+        with self._lock:
+            unknown = [name for name in weights if name not in self._active]
+            if unknown:
+                raise KeyError(f"No active model named {', '.join(unknown)}")
+            if any(weight < 0 for weight in weights.values()):
+                raise ValueError("Weights must be non-negative")
+            self._weights = {name: float(w) for name, w in weights.items() if w > 0}
+
+    def choose(self, requested=None, key=None):
+        """Name to serve: the requested one if active, else a weighted pick.
+
+        A key (such as a user id) always maps to the same name for a given set
+        of weights, so a user stays in one arm of an experiment.
+        """
+        with self._lock:
+            if requested and requested in self._active:
+                return requested
+            weights = list(self._weights.items())
+        if not weights:
+            return self.default
+        total = sum(weight for _, weight in weights)
+        if key is None:
+            point = random.random() * total
+        else:
+            point = zlib.crc32(str(key).encode('utf-8')) / 2 ** 32 * total
+        for name, weight in weights:
+            point -= weight
+            if point < 0:
+                return name
+        return weights[-1][0]
+
+    def summaries(self):
+        """Every registered version with its state, for the admin API"""
+        with self._lock:
+            return {
+                'default': self.default,
+                'weights': dict(self._weights),
+                'models': [
+                    {
+                        'name': entry.name,
+                        'version': entry.version,
+                        'active': self._active.get(entry.name) is entry,
+                        'leases': entry.leases,
+                        'created': entry.created,
+                        **entry.metadata
+                    }
+                    for versions in self._versions.values()
+                    for entry in versions.values()
+                ]
+            }
+
+    def _evict(self, name):
+        # Keep at most max_versions per name (the active one always stays)
+        versions = self._versions[name]
+        for entry in list(versions.values()):
+            if len(versions) <= self.max_versions:
+                break
+            if self._active.get(name) is not entry:
+                self._retire(entry)
+
+    def _retire(self, entry):
+        del self._versions[entry.name][entry.version]
+        entry.retired = True
+        if entry.leases == 0:
+            entry.close()
@@ -0,0 +1,39 @@
+"""
+Diversity re-ranking with maximal marginal relevance (MMR).
+
+Each step picks the candidate with the best trade-off between its relevance
+and its similarity to the books already picked. The highest similarity of
+every candidate to the selection is kept in one vector and updated with a
+single row gather per pick, so re-ranking k of C candidates is O(k*C).
+"""
+
+import numpy as np
+
+
+def rank_relevance(n_candidates):
+    """Relevance from rank order, 1.0 for the first candidate down towards 0"""
+    return 1.0 - np.arange(n_candidates) / max(n_candidates, 1)
+
+
+def mmr_rerank(positions, relevance, similarity, k, diversity=0.3):
+    """Indices into positions in MMR order.
+
+    positions are the candidates' rows in the similarity matrix, relevance
+    their scores (higher is better, roughly in [0, 1]), and diversity the
+    weight of redundancy: 0 keeps the relevance order, 1 only diversifies.
+    """
+    positions = np.asarray(positions)
+    relevance = np.asarray(relevance, dtype=np.float64)
+    k = min(k, len(positions))
+    weighted_relevance = (1.0 - diversity) * relevance
+    max_similarity = np.zeros(len(positions))
+    available = np.ones(len(positions), dtype=bool)
+    selected = []
+    for _ in range(k):
+        gain = weighted_relevance - diversity * max_similarity
+        gain[~available] = -np.inf
+        best = int(np.argmax(gain))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[positions[best], positions], out=max_similarity)
+    return selected
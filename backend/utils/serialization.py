@@ -0,0 +1,126 @@
+"""
+Pre-rendered JSON serialization for book records.
+
+Each book is encoded once when the catalog is loaded and responses are
+assembled by joining the cached byte fragments, so request handlers never
+build per-row dicts or convert numpy scalars on the hot path.
+
+Internal clients that only need ids and scores can ask for a compact
+ranking instead (see RANKING_MIMETYPES):
+
+    application/x-bookrec-topn  little-endian (int32 book_id, float32 score)
+                                records, NaN for no score; numpy reads it
+                                with np.frombuffer(body, '<i4,<f4')
+    application/x-msgpack       {"book_id": [...], "score": [...]}, None for
+                                no score (only when msgpack is installed)
+"""
+
+import json
+import struct
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the standard library encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional, the msgpack ranking format is not offered
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+TOPN_MIMETYPE = 'application/x-bookrec-topn'
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+
+_TOPN_RECORD = struct.Struct('<if')
+
+
+def _default(obj):
+    """Convert numpy scalars and arrays for the standard json encoder"""
+    # Duck-typed so that importing this module does not import numpy
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Encode obj as compact UTF-8 JSON bytes with the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+class BookSerializer:
+    """Cache of one JSON object fragment per book, keyed by book_id"""
+
+    def __init__(self, books_df=None):
+        self.fragments = {}
+        if books_df is not None:
+            self.refresh(books_df)
+
+    def refresh(self, books_df):
+        """Re-render the fragments for the whole catalog"""
+        self.fragments = {
+            record['book_id']: dumps(record)
+            for record in books_df.to_dict('records')
+        }
+
+    def update(self, books_df):
+        """Re-render only the rows in books_df (e.g. after their stats changed)"""
+        for record in books_df.to_dict('records'):
+            self.fragments[record['book_id']] = dumps(record)
+
+    def remove(self, book_ids):
+        """Drop fragments for books no longer in the catalog"""
+        for book_id in book_ids:
+            self.fragments.pop(book_id, None)
+
+    def render_book(self, book_id, extra=None):
+        """JSON bytes for a single book, optionally merged with extra fields"""
+        fragment = self.fragments[book_id]
+        if extra:
+            # Splice the extra keys into the cached object: '{...' + ',' + '...}'
+            fragment = fragment[:-1] + b',' + dumps(extra)[1:]
+        return fragment
+
+    def render(self, book_ids):
+        """JSON array of the cached book objects, in the given order"""
+        fragments = self.fragments
+        return b'[' + b','.join([fragments[book_id] for book_id in book_ids]) + b']'
+
+    def render_ranking(self, ranking, score_field='score'):
+        """JSON array for a list of (book_id, score) pairs; None scores are omitted"""
+        parts = []
+        for book_id, score in ranking:
+            if score is None:
+                parts.append(self.fragments[book_id])
+            else:
+                parts.append(self.render_book(book_id, {score_field: score}))
+        return b'[' + b','.join(parts) + b']'
+
+
+def pack_ranking(ranking):
+    """Packed (int32 book_id, float32 score) records for (book_id, score) pairs; None scores become NaN"""
+    nan = float('nan')
+    values = []
+    for book_id, score in ranking:
+        values += (book_id, nan if score is None else score)
+    return struct.pack('<' + 'if' * len(ranking), *values)
+
+
+def unpack_ranking(body):
+    """(book_id, score) pairs from pack_ranking() bytes; NaN scores become None"""
+    return [(book_id, None if score != score else score) for book_id, score in _TOPN_RECORD.iter_unpack(body)]
+
+
+def msgpack_ranking(ranking):
+    """msgpack map of parallel book_id and score arrays for (book_id, score) pairs"""
+    # int()/float() turn numpy scalars into types msgpack encodes
+    return msgpack.packb({'book_id': [int(book_id) for book_id, _ in ranking],
+                          'score': [None if score is None else float(score) for _, score in ranking]})
+
+
+# Ranking formats by media type, JSON (the default) first; None renders with BookSerializer
+RANKING_MIMETYPES = {JSON_MIMETYPE: None, TOPN_MIMETYPE: pack_ranking}
+if msgpack is not None:
+    RANKING_MIMETYPES[MSGPACK_MIMETYPE] = msgpack_ranking
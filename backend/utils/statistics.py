@@ -0,0 +1,158 @@
+"""
+Streaming catalog statistics.
+
+CatalogStatistics is updated chunk by chunk (during chunked cleaning or
+from a loaded catalog) and reads in O(1): category, level and year counts,
+the rating sum for the mean and a fixed-bin rating histogram, a top-K heap
+of the highest rated books and a HyperLogLog sketch of distinct authors.
+Statistics from separate partitions can be merged.
+"""
+
+import heapq
+from collections import Counter
+
+import numpy as np
+
+# Rating histogram bins: ratings are validated to 0-5 when cleaning
+RATING_BINS = np.linspace(0, 5, 21)
+
+
+class HyperLogLog:
+    """Distinct-count sketch with 2**precision registers (about 1.04/sqrt(2**p) relative error)"""
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """Add 64-bit hashes (a uint64 array)"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if len(hashes) == 0:
+            return
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes << np.uint64(p)
+        # Rank = position of the leftmost 1 bit in the remaining 64 - p bits
+        highest = np.floor(np.log2(np.maximum(rest, 1).astype(np.float64))).astype(np.int64)
+        rank = np.where(rest == 0, 64 - p + 1, 64 - highest).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def add(self, values):
+        """Add values (strings or numbers), hashed with pandas' stable 64-bit hash"""
+        import pandas as pd
+        self.add_hashes(pd.util.hash_array(np.asarray(values, dtype=object)))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class CatalogStatistics:
+    """Incrementally maintained dataset statistics (see BookDataProcessor.get_statistics)"""
+
+    def __init__(self, top_k=5, hll_precision=12):
+        self.top_k = top_k
+        self.total = 0
+        self.rating_sum = 0.0
+        self.categories = Counter()
+        self.levels = Counter()
+        self.years = Counter()
+        self.rating_counts = np.zeros(len(RATING_BINS) - 1, dtype=np.int64)
+        self.year_min = None
+        self.year_max = None
+        self.authors = HyperLogLog(hll_precision)
+        self._top = []   # min-heap of (rating, -row, title); earlier rows win ties
+        self._rows = 0
+
+    @classmethod
+    def from_frame(cls, df, **options):
+        stats = cls(**options)
+        stats.update(df)
+        return stats
+
+    def update(self, chunk):
+        """Add the rows of a cleaned chunk"""
+        n = len(chunk)
+        if n == 0:
+            return
+        self.total += n
+        if 'rating' in chunk:
+            ratings = chunk['rating'].to_numpy(dtype=np.float64)
+            self.rating_sum += float(ratings.sum())
+            self.rating_counts += np.histogram(ratings, RATING_BINS)[0]
+            # Only the chunk's own top K can enter the heap
+            best = np.argsort(-ratings, kind='stable')[:self.top_k]
+            titles = chunk['title'].to_numpy()[best] if 'title' in chunk else [None] * len(best)
+            for position, title in zip(best.tolist(), titles):
+                item = (float(ratings[position]), -(self._rows + position), title)
+                if len(self._top) < self.top_k:
+                    heapq.heappush(self._top, item)
+                elif item > self._top[0]:
+                    heapq.heapreplace(self._top, item)
+        for field, counter in (('category', self.categories), ('level', self.levels)):
+            if field in chunk:
+                counter.update(chunk[field].value_counts().to_dict())
+        if 'year' in chunk:
+            self.years.update(chunk['year'].value_counts().to_dict())
+            low, high = int(chunk['year'].min()), int(chunk['year'].max())
+            self.year_min = low if self.year_min is None else min(self.year_min, low)
+            self.year_max = high if self.year_max is None else max(self.year_max, high)
+        if 'author' in chunk:
+            self.authors.add(chunk['author'].to_numpy())
+        self._rows += n
+
+    def update_ratings(self, old, new):
+        """Adjust the mean and histogram after ratings change in place (the top-K heap is not revised)"""
+        self.rating_sum += float(np.sum(new) - np.sum(old))
+        self.rating_counts += np.histogram(new, RATING_BINS)[0] - np.histogram(old, RATING_BINS)[0]
+
+    def merge(self, other):
+        """Fold in statistics of rows that come after this object's rows"""
+        self.total += other.total
+        self.rating_sum += other.rating_sum
+        self.categories.update(other.categories)
+        self.levels.update(other.levels)
+        self.years.update(other.years)
+        self.rating_counts += other.rating_counts
+        for attr, pick in (('year_min', min), ('year_max', max)):
+            values = [v for v in (getattr(self, attr), getattr(other, attr)) if v is not None]
+            setattr(self, attr, pick(values) if values else None)
+        self.authors.merge(other.authors)
+        for rating, row, title in other._top:
+            item = (rating, row - self._rows, title)
+            if len(self._top) < self.top_k:
+                heapq.heappush(self._top, item)
+            elif item > self._top[0]:
+                heapq.heapreplace(self._top, item)
+        self._rows += other._rows
+
+    def top_rated(self):
+        return [{'title': title, 'rating': rating} for rating, _, title in sorted(self._top, reverse=True)]
+
+    def rating_histogram(self):
+        """(counts, bin edges) of the ratings"""
+        return self.rating_counts.copy(), RATING_BINS
+
+    def year_counts(self):
+        """{year: books}, in year order"""
+        return dict(sorted(self.years.items()))
+
+    def to_dict(self):
+        return {
+            'total_books': self.total,
+            'categories': dict(self.categories.most_common()),
+            'levels': dict(self.levels.most_common()),
+            'avg_rating': self.rating_sum / self.total if self.total else None,
+            'year_range': (self.year_min, self.year_max),
+            'top_rated': self.top_rated(),
+            'distinct_authors': self.authors.count()
+        }
@@ -0,0 +1,379 @@
+"""
+Offline Evaluation Harness for Tech Book Recommender
+Run with: python benchmarks/evaluate.py --books 2000 --users 1000 --k 10
+
+Splits the ratings per user (random or temporal leave-out), fits each
+recommender on the training part and asks it for top-k lists for the held
+out users. Precision@k, recall@k, NDCG@k, hit rate and catalog coverage are
+computed with vectorized code over shards of users, which run in parallel
+worker processes; quality and throughput are reported per model as JSON.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.append(BACKEND_DIR)
+
+import numpy as np
+import pandas as pd
+
+from synthetic import generate_catalog, generate_ratings
+
+ALL_MODELS = ['popular', 'book_content', 'book_collaborative', 'book_hybrid', 'item_item',
+              'collaborative', 'collaborative_als', 'hybrid']
+
+
+def split_ratings(ratings_df, method='random', test_fraction=0.2, min_ratings=3, seed=42):
+    """Hold out test_fraction (at least one) of the ratings of every user with min_ratings or more.
+
+    'random' holds out a random subset per user; 'temporal' holds out each
+    user's latest ratings by the timestamp column (row order if there is none).
+    """
+    if method == 'temporal':
+        key = ratings_df['timestamp'].to_numpy() if 'timestamp' in ratings_df else np.arange(len(ratings_df))
+        shuffled = ratings_df.assign(_key=key).sort_values(['user_id', '_key'], ascending=[True, False],
+                                                           kind='stable')
+    elif method == 'random':
+        rng = np.random.default_rng(seed)
+        shuffled = ratings_df.assign(_key=rng.random(len(ratings_df))).sort_values(['user_id', '_key'])
+    else:
+        raise ValueError(f"Unknown split method: {method}")
+
+    # Rank within user: 0 is the latest (temporal) or a random pick (random)
+    rank = shuffled.groupby('user_id').cumcount().to_numpy()
+    counts = shuffled.groupby('user_id')['user_id'].transform('size').to_numpy()
+    n_test = np.maximum(1, np.floor(counts * test_fraction)).astype(int)
+    is_test = (counts >= min_ratings) & (rank < n_test)
+
+    shuffled = shuffled.drop(columns='_key')
+    return shuffled[~is_test].sort_index(), shuffled[is_test].sort_index()
+
+
+def ranking_metrics(recommended, relevant_indptr, relevant_indices, k):
+    """Per-user precision, recall, NDCG and hits for a (users x k) matrix of item positions.
+
+    recommended is padded with -1; relevant items of user u are
+    relevant_indices[relevant_indptr[u]:relevant_indptr[u + 1]].
+    """
+    n_users = recommended.shape[0]
+    n_relevant = np.diff(relevant_indptr)
+    width = int(max(recommended.max(initial=0), relevant_indices.max(initial=0))) + 1
+
+    # Encode (user, item) pairs as single integers and test membership in one pass
+    relevant_keys = np.repeat(np.arange(n_users), n_relevant) * width + relevant_indices
+    recommended_keys = np.arange(n_users)[:, None] * width + recommended
+    hits = np.isin(recommended_keys, relevant_keys) & (recommended >= 0)
+
+    n_hits = hits.sum(axis=1)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = (hits * discounts[:hits.shape[1]]).sum(axis=1)
+    ideal = np.concatenate([[0.0], np.cumsum(discounts)])[np.minimum(n_relevant, k)]
+    return {
+        'precision': n_hits / k,
+        'recall': np.divide(n_hits, n_relevant, out=np.zeros(n_users), where=n_relevant > 0),
+        'ndcg': np.divide(dcg, ideal, out=np.zeros(n_users), where=ideal > 0),
+        'hit_rate': (n_hits > 0).astype(float)
+    }
+
+
+def _quiet(fit):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fit()
+
+
+def _ids_to_matrix(lists, item_positions, k):
+    """(users x k) item positions from per-user book id lists, -1 padded"""
+    matrix = np.full((len(lists), k), -1, dtype=np.int64)
+    for row, book_ids in enumerate(lists):
+        positions = [item_positions[b] for b in book_ids[:k] if b in item_positions]
+        matrix[row, :len(positions)] = positions
+    return matrix
+
+
+def _top_k(scores, exclude_rows, exclude_cols, k):
+    """Top-k columns per row of a dense score block, excluding (row, col) pairs"""
+    scores[exclude_rows, exclude_cols] = -np.inf
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    top[~np.isfinite(np.take_along_axis(top_scores, order, axis=1))] = -1
+    return top
+
+
+class EvaluationContext:
+    """Training data shared by the recommender adapters"""
+
+    def __init__(self, books_df, train_df):
+        self.books_df = books_df
+        self.train_df = train_df
+        self.item_ids = books_df['book_id'].to_numpy()
+        self.item_positions = {book_id: pos for pos, book_id in enumerate(self.item_ids.tolist())}
+        self.profiles = {
+            user_id: dict(zip(group['book_id'].tolist(), group['rating'].tolist()))
+            for user_id, group in train_df.groupby('user_id')
+        }
+
+    def train_positions(self, user_ids):
+        """(rows, cols) of the training items of each user, for masking"""
+        rows, cols = [], []
+        for row, user_id in enumerate(user_ids):
+            positions = [self.item_positions[b] for b in self.profiles.get(user_id, {}) if b in self.item_positions]
+            rows.extend([row] * len(positions))
+            cols.extend(positions)
+        return np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+
+
+def _per_user(context, query):
+    """Adapter for models queried one {book_id: rating} profile at a time"""
+    def recommend(user_ids, k):
+        lists = [[book_id for book_id, _ in query(context.profiles.get(user_id, {}), k)] for user_id in user_ids]
+        return _ids_to_matrix(lists, context.item_positions, k)
+    return recommend
+
+
+def fit_popular(context, args):
+    liked_counts = context.train_df[context.train_df['rating'] >= 4]['book_id'].value_counts()
+    scores = np.zeros(len(context.item_ids))
+    positions = [context.item_positions[b] for b in liked_counts.index]
+    scores[positions] = liked_counts.to_numpy()
+
+    def recommend(user_ids, k):
+        block = np.broadcast_to(scores, (len(user_ids), len(scores))).copy()
+        return _top_k(block, *context.train_positions(user_ids), k)
+    return recommend
+
+
+def _book_recommender(context):
+    app_module = importlib.import_module('app')
+    catalog = context.books_df.copy()
+    _, _, cosine_sim = app_module.build_similarity(catalog)
+    return app_module.BookRecommender(catalog, cosine_sim)
+
+
+def fit_book_content(context, args):
+    model = _book_recommender(context)
+    return _per_user(context, lambda profile, k: model.content_based_ranking(
+        [book_id for book_id, rating in profile.items() if rating >= 4], k))
+
+
+def fit_book_collaborative(context, args):
+    model = _book_recommender(context)
+    return _per_user(context, model.collaborative_filtering_ranking)
+
+
+def fit_book_hybrid(context, args):
+    model = _book_recommender(context)
+    return _per_user(context, model.hybrid_ranking)
+
+
+def fit_item_item(context, args):
+    from models.item_item import ItemItemRecommender
+
+    model = ItemItemRecommender()
+    model.fit_ratings(context.train_df, context.books_df)
+    return _per_user(context, lambda profile, k: model.ranking(
+        {book_id: rating for book_id, rating in profile.items() if rating >= 4}, k))
+
+
+def _fit_collaborative(context, args, algorithm):
+    from models.collaborative import CollaborativeFilteringRecommender
+
+    model = CollaborativeFilteringRecommender(n_components=args.factors, algorithm=algorithm,
+                                              iterations=args.als_iterations)
+    model.fit_ratings(context.train_df, context.books_df)
+    item_factors = np.asarray(model.item_factors)
+
+    def recommend(user_ids, k):
+        # One matrix product per shard; users without training ratings get zero vectors
+        rows = model.user_index.get_indexer(user_ids)
+        user_factors = np.where((rows >= 0)[:, None], model.user_factors[np.maximum(rows, 0)], 0.0)
+        return _top_k(user_factors @ item_factors.T, *context.train_positions(user_ids), k)
+    return recommend
+
+
+def fit_collaborative(context, args):
+    return _fit_collaborative(context, args, 'svd')
+
+
+def fit_collaborative_als(context, args):
+    return _fit_collaborative(context, args, 'als')
+
+
+def fit_hybrid(context, args):
+    from models.hybrid import HybridRecommender
+
+    model = HybridRecommender()
+    model.fit(context.books_df)
+    return _per_user(context, lambda profile, k: [
+        (rec['book_id'], None) for rec in model.recommend(profile, k)
+    ])
+
+
+FITTERS = {
+    'popular': fit_popular,
+    'book_content': fit_book_content,
+    'book_collaborative': fit_book_collaborative,
+    'book_hybrid': fit_book_hybrid,
+    'item_item': fit_item_item,
+    'collaborative': fit_collaborative,
+    'collaborative_als': fit_collaborative_als,
+    'hybrid': fit_hybrid
+}
+
+# Set in the parent before the worker pool forks, so shards share it without pickling
+_shared = {}
+
+
+def evaluate_shard(user_ids):
+    """Recommend for one shard of users; returns metric sums, recommended items and seconds"""
+    recommend, relevant, k = _shared['recommend'], _shared['relevant'], _shared['k']
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        recommended = recommend(user_ids, k)
+    seconds = time.perf_counter() - start
+
+    lists = [relevant[user_id] for user_id in user_ids]
+    indptr = np.concatenate([[0], np.cumsum([len(items) for items in lists])])
+    indices = np.concatenate(lists) if lists else np.zeros(0, dtype=np.int64)
+    metrics = ranking_metrics(recommended, indptr, indices.astype(np.int64), k)
+    sums = {name: float(values.sum()) for name, values in metrics.items()}
+    return sums, np.unique(recommended[recommended >= 0]), seconds
+
+
+def evaluate_model(recommend, relevant, n_items, k, shard_size, workers):
+    """Run every shard (in parallel when workers != 0) and aggregate the metrics"""
+    user_ids = list(relevant)
+    shards = [user_ids[i:i + shard_size] for i in range(0, len(user_ids), shard_size)]
+    _shared.update(recommend=recommend, relevant=relevant, k=k)
+
+    wall_start = time.perf_counter()
+    if workers == 0 or 'fork' not in multiprocessing.get_all_start_methods():
+        results = [evaluate_shard(shard) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            results = list(pool.map(evaluate_shard, shards))
+    wall_seconds = time.perf_counter() - wall_start
+    _shared.clear()
+
+    totals = {}
+    for sums, _, _ in results:
+        for name, value in sums.items():
+            totals[name] = totals.get(name, 0.0) + value
+    covered = np.unique(np.concatenate([items for _, items, _ in results])) if results else []
+    recommend_seconds = sum(seconds for _, _, seconds in results)
+    n_users = max(len(user_ids), 1)
+    return {
+        'users': len(user_ids),
+        f'precision@{k}': totals.get('precision', 0.0) / n_users,
+        f'recall@{k}': totals.get('recall', 0.0) / n_users,
+        f'ndcg@{k}': totals.get('ndcg', 0.0) / n_users,
+        'hit_rate': totals.get('hit_rate', 0.0) / n_users,
+        'coverage': len(covered) / n_items if n_items else 0.0,
+        'recommend_seconds': recommend_seconds,
+        'users_per_second': len(user_ids) / recommend_seconds if recommend_seconds > 0 else 0.0,
+        'wall_seconds': wall_seconds
+    }
+
+
+def load_data(args):
+    if args.ratings:
+        ratings_df = pd.read_csv(args.ratings, comment='#')
+        books_df = pd.read_csv(args.catalog) if args.catalog else pd.DataFrame(
+            importlib.import_module('app').tech_books_data)
+        return books_df, ratings_df
+    books_df = generate_catalog(args.books, args.categories, args.category_skew, args.seed)
+    return books_df, generate_ratings(books_df, args.users, args.density, args.seed)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--ratings', help='user_id,book_id,rating CSV (default: synthetic data)')
+    parser.add_argument('--catalog', help='books CSV for --ratings (default: the sample catalog)')
+    parser.add_argument('--books', type=int, default=2000, help='number of synthetic books')
+    parser.add_argument('--users', type=int, default=1000, help='number of synthetic users')
+    parser.add_argument('--density', type=float, default=0.01, help='fraction of user/book pairs rated')
+    parser.add_argument('--categories', type=int, default=12, help='number of categories')
+    parser.add_argument('--category-skew', type=float, default=1.0, help='Zipf exponent for category sizes')
+    parser.add_argument('--split', choices=['random', 'temporal'], default='random')
+    parser.add_argument('--test-fraction', type=float, default=0.2, help='share of each user\'s ratings held out')
+    parser.add_argument('--relevant-rating', type=float, default=4, help='held-out ratings counted as relevant')
+    parser.add_argument('--eval-users', type=int, default=500, help='users evaluated per model (0 for all)')
+    parser.add_argument('--k', type=int, default=10, help='length of the recommendation lists')
+    parser.add_argument('--factors', type=int, default=10, help='latent factors for collaborative')
+    parser.add_argument('--als-iterations', type=int, default=15, help='maximum ALS epochs')
+    parser.add_argument('--models', nargs='+', default=ALL_MODELS, choices=ALL_MODELS)
+    parser.add_argument('--shard-size', type=int, default=256, help='users per shard')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (0 = in-process)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmarks/results/evaluation.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print("="*60)
+    print("TECH BOOK RECOMMENDER - OFFLINE EVALUATION")
+    print("="*60)
+
+    books_df, ratings_df = load_data(args)
+    train_df, test_df = split_ratings(ratings_df, args.split, args.test_fraction, seed=args.seed)
+    context = EvaluationContext(books_df, train_df)
+
+    relevant_df = test_df[test_df['rating'] >= args.relevant_rating]
+    relevant_df = relevant_df[relevant_df['book_id'].isin(context.item_positions)]
+    relevant = {
+        user_id: np.array([context.item_positions[b] for b in group['book_id']], dtype=np.int64)
+        for user_id, group in relevant_df.groupby('user_id')
+    }
+    if args.eval_users and len(relevant) > args.eval_users:
+        keep = np.random.default_rng(args.seed).choice(list(relevant), size=args.eval_users, replace=False)
+        relevant = {user_id: relevant[user_id] for user_id in keep.tolist()}
+    print(f"Ratings: {len(train_df)} train / {len(test_df)} test ({args.split} split), "
+          f"{len(relevant)} users evaluated at k={args.k}")
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'config': vars(args)
+        },
+        'models': {}
+    }
+
+    for name in args.models:
+        print(f"\n{name}")
+        start = time.perf_counter()
+        recommend = _quiet(lambda: FITTERS[name](context, args))
+        fit_seconds = time.perf_counter() - start
+        result = evaluate_model(recommend, relevant, len(books_df), args.k, args.shard_size, args.workers)
+        result['fit_seconds'] = fit_seconds
+        results['models'][name] = result
+        print(f"  precision@{args.k} {result[f'precision@{args.k}']:.4f}, recall@{args.k} "
+              f"{result[f'recall@{args.k}']:.4f}, ndcg@{args.k} {result[f'ndcg@{args.k}']:.4f}, "
+              f"coverage {result['coverage']:.3f}")
+        print(f"  fit {fit_seconds:.2f}s, {result['users_per_second']:.0f} users/s")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✓ Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
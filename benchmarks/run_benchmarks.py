@@ -0,0 +1,517 @@
+"""
+Benchmark Suite for Tech Book Recommender
+Run with: python benchmarks/run_benchmarks.py --books 5000 --users 2000
+
+Fits every recommender on a synthetic catalog, measures fit time, peak
+traced memory, per-query latency and throughput, then load-tests the Flask
+API over HTTP, also past saturation with and without admission control.
+Results are written as JSON; pass --compare with an earlier
+results file to flag regressions.
+"""
+
+import argparse
+import contextlib
+import copy
+import importlib
+import io
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.append(BACKEND_DIR)
+
+import numpy as np
+
+from synthetic import generate_catalog, generate_ratings, sample_profiles
+from models.sharded import ShardedScorer
+from utils.quantization import PRECISIONS, quantize
+
+ALL_MODELS = ['book_recommender', 'content_based', 'knn', 'collaborative', 'collaborative_als', 'item_item', 'hybrid']
+
+
+def measure_fit(fit):
+    """Run fit() quietly, returning (result, seconds, peak traced memory in MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fit()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / 1024 ** 2
+
+
+def latency_summary(latencies, wall_seconds):
+    """Percentiles in milliseconds plus throughput for a list of latencies in seconds"""
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        'count': len(latencies),
+        'mean_ms': float(latencies_ms.mean()),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'throughput_qps': len(latencies) / wall_seconds if wall_seconds > 0 else 0.0
+    }
+
+
+def measure_queries(query, inputs):
+    """Call query(x) for every input sequentially and summarize the latencies"""
+    latencies = []
+    wall_start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for x in inputs:
+            start = time.perf_counter()
+            query(x)
+            latencies.append(time.perf_counter() - start)
+    return latency_summary(latencies, time.perf_counter() - wall_start)
+
+
+def liked(profile):
+    return [book_id for book_id, rating in profile.items() if rating >= 4]
+
+
+def bench_book_recommender(books_df, ratings_df, profiles, args):
+    app_module = importlib.import_module('app')
+
+    def fit():
+        catalog = books_df.copy()
+        _, _, cosine_sim = app_module.build_similarity(catalog)
+        return app_module.BookRecommender(catalog, cosine_sim)
+
+    model, fit_seconds, peak_mb = measure_fit(fit)
+    queries = {
+        'content': measure_queries(lambda p: model.content_based_ranking(liked(p), args.n), profiles),
+        'collaborative': measure_queries(lambda p: model.collaborative_filtering_ranking(p, args.n), profiles),
+        'hybrid': measure_queries(lambda p: model.hybrid_ranking(p, args.n), profiles)
+    }
+    return fit_seconds, peak_mb, queries
+
+
+def bench_content_based(books_df, ratings_df, profiles, args):
+    from models.content_based import ContentBasedRecommender
+
+    def fit():
+        model = ContentBasedRecommender()
+        model.fit(books_df)
+        return model
+
+    model, fit_seconds, peak_mb = measure_fit(fit)
+    queries = {'recommend': measure_queries(lambda p: model.recommend(liked(p), args.n), profiles)}
+    return fit_seconds, peak_mb, queries
+
+
+def bench_knn(books_df, ratings_df, profiles, args):
+    KNNRecommender = importlib.import_module('models.knn-model').KNNRecommender
+
+    def fit():
+        model = KNNRecommender()
+        model.fit(books_df)
+        return model
+
+    model, fit_seconds, peak_mb = measure_fit(fit)
+    book_ids = [next(iter(p)) for p in profiles]
+    queries = {'recommend': measure_queries(lambda book_id: model.recommend(book_id, args.n), book_ids)}
+    return fit_seconds, peak_mb, queries
+
+
+def bench_collaborative(books_df, ratings_df, profiles, args):
+    from models.collaborative import CollaborativeFilteringRecommender
+
+    def fit():
+        user_item_matrix = ratings_df.pivot_table(
+            index='user_id', columns='book_id', values='rating', fill_value=0
+        )
+        model = CollaborativeFilteringRecommender(n_components=args.factors)
+        model.fit(user_item_matrix, books_df)
+        return model
+
+    model, fit_seconds, peak_mb = measure_fit(fit)
+    n_users = model.user_factors.shape[0]
+    user_indices = np.random.default_rng(args.seed).integers(0, n_users, size=len(profiles))
+    queries = {
+        'recommend_for_user': measure_queries(lambda u: model.recommend_for_user(u, args.n), user_indices)
+    }
+    return fit_seconds, peak_mb, queries
+
+
+def bench_collaborative_als(books_df, ratings_df, profiles, args):
+    from models.collaborative import CollaborativeFilteringRecommender
+
+    def fit():
+        model = CollaborativeFilteringRecommender(n_components=args.factors, algorithm='als',
+                                                  iterations=args.als_iterations)
+        model.fit_ratings(ratings_df, books_df)
+        return model
+
+    model, fit_seconds, peak_mb = measure_fit(fit)
+    n_users = model.user_factors.shape[0]
+    user_indices = np.random.default_rng(args.seed).integers(0, n_users, size=len(profiles))
+    queries = {
+        'recommend_for_user': measure_queries(lambda u: model.recommend_for_user(u, args.n), user_indices)
+    }
+    return fit_seconds, peak_mb, queries
+
+
+def bench_item_item(books_df, ratings_df, profiles, args):
+    from models.item_item import ItemItemRecommender
+
+    def fit():
+        model = ItemItemRecommender()
+        model.fit_ratings(ratings_df, books_df)
+        return model
+
+    model, fit_seconds, peak_mb = measure_fit(fit)
+    book_ids = np.random.default_rng(args.seed).choice(books_df['book_id'].to_numpy(), size=len(profiles))
+    queries = {
+        'ranking': measure_queries(lambda p: model.ranking(p, args.n), profiles),
+        'similar_ranking': measure_queries(lambda b: model.similar_ranking(b, args.n), book_ids)
+    }
+    return fit_seconds, peak_mb, queries
+
+
+def bench_hybrid(books_df, ratings_df, profiles, args):
+    from models.hybrid import HybridRecommender
+
+    def fit():
+        model = HybridRecommender()
+        model.fit(books_df, ratings_df)
+        return model
+
+    model, fit_seconds, peak_mb = measure_fit(fit)
+    queries = {'recommend': measure_queries(lambda p: model.recommend(p, args.n), profiles)}
+    return fit_seconds, peak_mb, queries
+
+
+BENCHMARKS = {
+    'book_recommender': bench_book_recommender,
+    'content_based': bench_content_based,
+    'knn': bench_knn,
+    'collaborative': bench_collaborative,
+    'collaborative_als': bench_collaborative_als,
+    'item_item': bench_item_item,
+    'hybrid': bench_hybrid
+}
+
+
+def _agreement(rankings, reference):
+    """Mean fraction of each reference top-n that a ranking also returns"""
+    overlaps = [len(set(a) & set(b)) / len(b) for a, b in zip(rankings, reference) if b]
+    return float(np.mean(overlaps)) if overlaps else 1.0
+
+
+def bench_quantization(books_df, ratings_df, profiles, args):
+    """Memory, latency and top-n agreement with float64 for each storage precision"""
+    app_module = importlib.import_module('app')
+    from models.collaborative import CollaborativeFilteringRecommender
+
+    catalog = books_df.copy()
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, _, cosine_sim = app_module.build_similarity(catalog)
+        base_model = CollaborativeFilteringRecommender(n_components=args.factors)
+        base_model.fit_ratings(ratings_df, books_df)
+
+    def content_query(recommender):
+        return lambda p: [book_id for book_id, _ in recommender.content_based_ranking(liked(p), args.n)]
+
+    def collaborative_query(model):
+        return lambda p: [book['book_id'] for book in model.recommend_for_ratings(p, args.n)]
+
+    results = {}
+    reference = {}
+    for precision in ['float64'] + [p for p in args.precisions if p != 'float64']:
+        recommender = app_module.BookRecommender(catalog, quantize(cosine_sim, precision))
+        model = copy.copy(base_model)
+        model.quantize(precision)
+        entry = {}
+        for name, matrix, query in (('content_similarity', recommender.similarity_matrix, content_query(recommender)),
+                                    ('collaborative_factors', model.item_factors, collaborative_query(model))):
+            with contextlib.redirect_stdout(io.StringIO()):
+                rankings = [query(p) for p in profiles]
+            reference.setdefault(name, rankings)
+            entry[name] = {
+                'bytes': int(matrix.nbytes),
+                'agreement': _agreement(rankings, reference[name]),
+                'latency': measure_queries(query, profiles)
+            }
+        results[precision] = entry
+    for entry in results.values():
+        for name, stats in entry.items():
+            stats['memory_ratio'] = stats['bytes'] / results['float64'][name]['bytes']
+    return results
+
+
+def bench_sharding(books_df, ratings_df, profiles, args):
+    """Content ranking latency with the TF-IDF rows scored by 1..N worker processes"""
+    app_module = importlib.import_module('app')
+
+    catalog = books_df.copy()
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, tfidf_matrix, cosine_sim = app_module.build_similarity(catalog)
+    recommender = app_module.BookRecommender(catalog, cosine_sim)
+
+    def query(p):
+        return [book_id for book_id, _ in recommender.content_based_ranking(liked(p), args.n)]
+
+    reference = [query(p) for p in profiles]
+    results = {'single_process': measure_queries(query, profiles)}
+    for n_workers in args.scoring_workers:
+        with ShardedScorer(tfidf_matrix, n_workers=n_workers) as scorer:
+            recommender.scorer = scorer
+            rankings = [query(p) for p in profiles]
+            results[f'{n_workers}_workers'] = measure_queries(query, profiles)
+            results[f'{n_workers}_workers']['agreement'] = _agreement(rankings, reference)
+        recommender.scorer = None
+    return results
+
+
+def _http_call(url, payload=None):
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    http_request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(http_request) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def _serve(flask_app):
+    """Serve flask_app on a free local port for the duration of the block; yields the API base URL"""
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}/api'
+    finally:
+        server.shutdown()
+
+
+def bench_http(books_df, ratings_df, profiles, args):
+    """Serve the Flask app on a local port and load-test its main endpoints"""
+    app_module = importlib.import_module('app')
+    with contextlib.redirect_stdout(io.StringIO()):
+        flask_app = app_module.create_app(books_df.copy(), ratings_df=ratings_df)
+
+    with _serve(flask_app) as base_url:
+        rng = np.random.default_rng(args.seed)
+        book_ids = books_df['book_id'].to_numpy()
+        categories = books_df['category'].unique()
+        endpoints = {
+            'POST /api/recommend': lambda i: _http_call(
+                f'{base_url}/recommend',
+                {'ratings': {str(k): v for k, v in profiles[i % len(profiles)].items()}, 'n': args.n}
+            ),
+            'POST /api/recommend item_item': lambda i: _http_call(
+                f'{base_url}/recommend',
+                {'ratings': {str(k): v for k, v in profiles[i % len(profiles)].items()},
+                 'n': args.n, 'method': 'item_item'}
+            ),
+            'GET /api/similar': lambda i: _http_call(f'{base_url}/similar/{rng.choice(book_ids)}?n={args.n}'),
+            'GET /api/similar item_item': lambda i: _http_call(
+                f'{base_url}/similar/{rng.choice(book_ids)}?n={args.n}&method=item_item'
+            ),
+            'GET /api/books': lambda i: _http_call(
+                f'{base_url}/books?category={urllib.parse.quote(str(rng.choice(categories)))}'
+            )
+        }
+
+        results = {}
+        for name, call in endpoints.items():
+            wall_start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                latencies = list(pool.map(call, range(args.http_requests)))
+            results[name] = latency_summary(latencies, time.perf_counter() - wall_start)
+            results[name]['concurrency'] = args.concurrency
+    return results
+
+
+def bench_overload(books_df, ratings_df, profiles, args):
+    """Load-test /api/recommend at --overload-concurrency clients with and without admission control"""
+    from utils.admission import AdmissionController
+
+    app_module = importlib.import_module('app')
+    setups = {
+        'no admission control': None,
+        'admission control': lambda: AdmissionController(
+            args.degrade_in_flight, args.shed_in_flight,
+            args.degrade_latency_ms / 1000 if args.degrade_latency_ms else None
+        )
+    }
+    results = {}
+    for setup, make_controller in setups.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            flask_app = app_module.create_app(books_df.copy(), ratings_df=ratings_df)
+        flask_app.extensions['admission'] = make_controller() if make_controller else None
+
+        modes = {}
+        lock = threading.Lock()
+
+        with _serve(flask_app) as base_url:
+            def call(i):
+                payload = {'ratings': {str(k): v for k, v in profiles[i % len(profiles)].items()}, 'n': args.n}
+                http_request = urllib.request.Request(f'{base_url}/recommend', data=json.dumps(payload).encode('utf-8'),
+                                                      headers={'Content-Type': 'application/json'})
+                start = time.perf_counter()
+                with urllib.request.urlopen(http_request) as response:
+                    response.read()
+                    mode = response.headers.get('X-Degraded-Mode') or 'full'
+                with lock:
+                    modes[mode] = modes.get(mode, 0) + 1
+                return time.perf_counter() - start
+
+            wall_start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.overload_concurrency) as pool:
+                latencies = list(pool.map(call, range(args.http_requests)))
+        results[setup] = latency_summary(latencies, time.perf_counter() - wall_start)
+        results[setup].update(concurrency=args.overload_concurrency, modes=modes)
+    return results
+
+
+def compare_results(current, baseline, threshold):
+    """Print ratios against a baseline run; return the list of regressions"""
+    regressions = []
+    print(f"\nComparison against baseline (regression threshold x{threshold:.2f})")
+    for model, result in current['models'].items():
+        old = baseline.get('models', {}).get(model)
+        if not old:
+            continue
+        pairs = [('fit_seconds', result['fit_seconds'], old['fit_seconds'])]
+        for query, stats in result['queries'].items():
+            if query in old['queries']:
+                pairs.append((f'{query}.p50_ms', stats['p50_ms'], old['queries'][query]['p50_ms']))
+        for label, new_value, old_value in pairs:
+            ratio = new_value / old_value if old_value else float('inf')
+            flag = '  REGRESSION' if ratio > threshold else ''
+            print(f"  {model}.{label}: {old_value:.3f} -> {new_value:.3f} (x{ratio:.2f}){flag}")
+            if flag:
+                regressions.append(f'{model}.{label}')
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=2000, help='number of synthetic books')
+    parser.add_argument('--users', type=int, default=1000, help='number of synthetic users')
+    parser.add_argument('--density', type=float, default=0.01, help='fraction of user/book pairs rated')
+    parser.add_argument('--categories', type=int, default=12, help='number of categories')
+    parser.add_argument('--category-skew', type=float, default=1.0, help='Zipf exponent for category sizes')
+    parser.add_argument('--queries', type=int, default=200, help='queries per model')
+    parser.add_argument('--n', type=int, default=6, help='recommendations per query')
+    parser.add_argument('--factors', type=int, default=10, help='latent factors for collaborative')
+    parser.add_argument('--als-iterations', type=int, default=15, help='maximum ALS epochs')
+    parser.add_argument('--models', nargs='+', default=ALL_MODELS, choices=ALL_MODELS)
+    parser.add_argument('--precisions', nargs='*', default=['float32', 'float16', 'int8'], choices=PRECISIONS,
+                        help='storage precisions compared with float64 (none to skip)')
+    parser.add_argument('--scoring-workers', type=int, nargs='*', default=[],
+                        help='worker counts for sharded content scoring (none to skip)')
+    parser.add_argument('--http-requests', type=int, default=300, help='requests per endpoint (0 to skip)')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent HTTP clients')
+    parser.add_argument('--overload-concurrency', type=int, default=32,
+                        help='concurrent clients for the admission control load test (0 to skip)')
+    parser.add_argument('--degrade-in-flight', type=int, default=4,
+                        help='recommend requests in flight before content-only degradation')
+    parser.add_argument('--shed-in-flight', type=int, default=16,
+                        help='recommend requests in flight before popular-list shedding')
+    parser.add_argument('--degrade-latency-ms', type=float, default=50,
+                        help='moving-average latency before content-only degradation')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmarks/results/latest.json')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=1.2, help='slowdown ratio counted as regression')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print("="*60)
+    print("TECH BOOK RECOMMENDER - BENCHMARK SUITE")
+    print("="*60)
+
+    books_df = generate_catalog(args.books, args.categories, args.category_skew, args.seed)
+    ratings_df = generate_ratings(books_df, args.users, args.density, args.seed)
+    profiles = sample_profiles(ratings_df, args.queries, seed=args.seed)
+    print(f"Synthetic catalog: {len(books_df)} books, {ratings_df['user_id'].nunique()} users, "
+          f"{len(ratings_df)} ratings")
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'config': vars(args)
+        },
+        'models': {},
+        'quantization': {},
+        'sharding': {},
+        'http': {},
+        'overload': {}
+    }
+
+    for name in args.models:
+        print(f"\n{name}")
+        fit_seconds, peak_mb, queries = BENCHMARKS[name](books_df, ratings_df, profiles, args)
+        results['models'][name] = {'fit_seconds': fit_seconds, 'peak_memory_mb': peak_mb, 'queries': queries}
+        print(f"  fit: {fit_seconds:.3f}s, peak memory: {peak_mb:.1f} MB")
+        for query, stats in queries.items():
+            print(f"  {query}: p50 {stats['p50_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms, "
+                  f"{stats['throughput_qps']:.0f} q/s")
+
+    if args.precisions:
+        print("\nquantization")
+        results['quantization'] = bench_quantization(books_df, ratings_df, profiles, args)
+        for precision, entry in results['quantization'].items():
+            for name, stats in entry.items():
+                print(f"  {precision} {name}: {stats['bytes'] / 1024 ** 2:.2f} MB ({stats['memory_ratio']:.2f}x), "
+                      f"agreement {stats['agreement']:.3f}, p50 {stats['latency']['p50_ms']:.3f} ms")
+
+    if args.scoring_workers:
+        print("\nsharded scoring")
+        results['sharding'] = bench_sharding(books_df, ratings_df, profiles, args)
+        for setup, stats in results['sharding'].items():
+            agreement = f", agreement {stats['agreement']:.3f}" if 'agreement' in stats else ''
+            print(f"  {setup}: p50 {stats['p50_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms{agreement}")
+
+    if args.http_requests > 0:
+        print("\nHTTP")
+        results['http'] = bench_http(books_df, ratings_df, profiles, args)
+        for endpoint, stats in results['http'].items():
+            print(f"  {endpoint}: p50 {stats['p50_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms, "
+                  f"{stats['throughput_qps']:.0f} req/s")
+
+    if args.http_requests > 0 and args.overload_concurrency > 0:
+        print("\noverload")
+        results['overload'] = bench_overload(books_df, ratings_df, profiles, args)
+        for setup, stats in results['overload'].items():
+            modes = ', '.join(f'{mode} {count}' for mode, count in sorted(stats['modes'].items()))
+            print(f"  {setup}: p50 {stats['p50_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms, "
+                  f"{stats['throughput_qps']:.0f} req/s ({modes})")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✓ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
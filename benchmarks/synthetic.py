@@ -0,0 +1,98 @@
+"""
+Synthetic catalog and ratings generator for benchmarks.
+
+Produces DataFrames with the same columns as the sample tech books data
+(plus num_reviews) and a user_id/book_id/rating table, at any size.
+"""
+
+import numpy as np
+import pandas as pd
+
+BASE_CATEGORIES = [
+    "Machine Learning", "Deep Learning", "Data Science", "NLP", "Computer Vision",
+    "Reinforcement Learning", "MLOps", "Algorithms", "Python", "Statistics",
+    "Databases", "Distributed Systems"
+]
+
+LEVELS = ["Beginner", "Intermediate", "Advanced"]
+
+TITLE_WORDS = [
+    "Practical", "Applied", "Modern", "Hands-On", "Advanced", "Introduction", "Guide",
+    "Handbook", "Patterns", "Systems", "Engineering", "Foundations", "Essentials",
+    "Learning", "Programming", "Models", "Networks", "Analysis", "Design", "Theory",
+    "Probabilistic", "Scalable", "Neural", "Statistical", "Bayesian", "Graph", "Vision",
+    "Language", "Optimization", "Inference", "Production", "Data", "Algorithms",
+    "Python", "Rust", "Cloud", "Streaming", "Search", "Ranking", "Recommendation"
+]
+
+
+def category_names(n_categories):
+    """Base category names, padded with numbered ones if more are requested"""
+    names = BASE_CATEGORIES[:n_categories]
+    names += [f"Category {i}" for i in range(len(names) + 1, n_categories + 1)]
+    return names
+
+
+def generate_catalog(n_books=2000, n_categories=12, category_skew=1.0, seed=42):
+    """Generate a book catalog; category sizes follow a Zipf law with exponent category_skew"""
+    rng = np.random.default_rng(seed)
+    categories = np.array(category_names(n_categories))
+
+    weights = 1.0 / np.arange(1, n_categories + 1) ** category_skew
+    weights /= weights.sum()
+
+    words = np.array(TITLE_WORDS)
+    title_words = rng.choice(words, size=(n_books, 3))
+    book_categories = rng.choice(categories, size=n_books, p=weights)
+    titles = [
+        f"{a} {b} {c} for {category}"
+        for (a, b, c), category in zip(title_words, book_categories)
+    ]
+
+    n_authors = max(1, n_books // 3)
+    authors = [f"Author {i}" for i in rng.integers(1, n_authors + 1, size=n_books)]
+
+    return pd.DataFrame({
+        'book_id': np.arange(1, n_books + 1),
+        'title': titles,
+        'author': authors,
+        'category': book_categories,
+        'level': rng.choice(LEVELS, size=n_books),
+        'rating': np.clip(rng.normal(4.3, 0.3, size=n_books), 1.0, 5.0).round(1),
+        'year': rng.integers(1995, 2025, size=n_books),
+        'num_reviews': rng.lognormal(5.5, 1.0, size=n_books).astype(int) + 1
+    })
+
+
+def generate_ratings(books_df, n_users=1000, density=0.01, seed=42):
+    """Generate explicit 1-5 ratings; popular books (by num_reviews) are rated more often"""
+    rng = np.random.default_rng(seed)
+    n_books = len(books_df)
+    n_ratings = max(1, int(n_users * n_books * density))
+
+    popularity = books_df['num_reviews'].to_numpy(dtype=float)
+    popularity /= popularity.sum()
+
+    user_ids = rng.integers(1, n_users + 1, size=n_ratings)
+    positions = rng.choice(n_books, size=n_ratings, p=popularity)
+    noise = rng.normal(0, 0.8, size=n_ratings)
+    ratings = np.clip(np.rint(books_df['rating'].to_numpy()[positions] + noise), 1, 5).astype(int)
+
+    ratings_df = pd.DataFrame({
+        'user_id': user_ids,
+        'book_id': books_df['book_id'].to_numpy()[positions],
+        'rating': ratings
+    })
+    return ratings_df.drop_duplicates(subset=['user_id', 'book_id']).reset_index(drop=True)
+
+
+def sample_profiles(ratings_df, n_profiles=200, max_ratings=8, seed=42):
+    """Request-style {book_id: rating} profiles drawn from real synthetic users"""
+    rng = np.random.default_rng(seed)
+    grouped = ratings_df.groupby('user_id')
+    user_ids = list(grouped.groups.keys())
+    profiles = []
+    for user_id in rng.choice(user_ids, size=min(n_profiles, len(user_ids)), replace=False):
+        user_rows = grouped.get_group(user_id).head(max_ratings)
+        profiles.append(dict(zip(user_rows['book_id'].tolist(), user_rows['rating'].tolist())))
+    return profiles
@@ -243,6 +243,39 @@ def test_post_recommendations_empty_ratings():
         return False
 
 
+def test_cold_start_profiles():
+    """Test POST /api/recommend with unknown books (cold start) and only negative ratings"""
+    print("\n" + "="*60)
+    print("TEST: POST /api/recommend (cold-start profiles)")
+    print("="*60)
+    
+    try:
+        response = requests.post(f'{BASE_URL}/recommend', json={'ratings': {'9999': 5}, 'method': 'hybrid', 'n': 3})
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        data = response.json()
+        assert len(data) == 3, f"Unknown books should still get 3 recommendations, got {len(data)}"
+        ratings = [book['rating'] for book in data]
+        assert ratings == sorted(ratings, reverse=True), "Hybrid results should be sorted by rating"
+        
+        response = requests.post(f'{BASE_URL}/recommend', json={'ratings': {'1': 2, '3': 1}, 'n': 3})
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        data = response.json()
+        assert len(data) == 3, f"Only negative ratings should still get 3 recommendations, got {len(data)}"
+        assert not {book['book_id'] for book in data} & {1, 3}, "Disliked books should not be recommended"
+        
+        metrics = requests.get(f'{BASE_URL}/metrics').text
+        for profile in ('unknown', 'negative'):
+            assert f'profile="{profile}"' in metrics, f"No recommend_profiles_total counter for {profile}"
+        
+        print("✓ Unknown profile answered on the cold-start path, negative profile by signed scoring")
+        print("✓ TEST PASSED")
+        return True
+        
+    except Exception as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
 def test_get_similar_books():
     """Test GET /api/similar/:id endpoint"""
     print("\n" + "="*60)
@@ -320,6 +353,7 @@ def run_all_tests():
         ("Get invalid book (404)", test_get_book_not_found),
         ("Get recommendations", test_post_recommendations),
         ("Get recommendations (empty)", test_post_recommendations_empty_ratings),
+        ("Get recommendations (cold start)", test_cold_start_profiles),
         ("Get similar books", test_get_similar_books),
         ("Different methods", test_different_recommendation_methods),
     ]
@@ -7,6 +7,8 @@ Run with: python test_models.py
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
 
 import pandas as pd
 import numpy as np
@@ -355,6 +357,409 @@ def test_year_normalization():
         return False
 
 
+def test_als_collaborative_model():
+    """Test ALS training on a sparse rating log"""
+    print("\n" + "="*60)
+    print("TEST: ALS Collaborative Model")
+    print("="*60)
+    
+    try:
+        from models.collaborative import CollaborativeFilteringRecommender
+        
+        # Two groups of users with opposite tastes
+        ratings = pd.DataFrame({
+            'user_id': [1, 1, 1, 2, 2, 2, 3, 3, 4, 4, 4, 5, 5, 6, 6],
+            'book_id': [1, 2, 10, 1, 2, 3, 2, 10, 4, 5, 6, 5, 6, 4, 6],
+            'rating':  [5, 5, 4, 4, 5, 5, 5, 4, 5, 4, 5, 5, 4, 4, 5]
+        })
+        
+        for implicit in (False, True):
+            model = CollaborativeFilteringRecommender(
+                n_components=3, algorithm='als', implicit=implicit, iterations=20, n_jobs=2
+            )
+            model.fit_ratings(ratings, df)
+            
+            losses = [epoch['loss'] for epoch in model.als.history]
+            assert losses[-1] < losses[0], f"Loss should decrease: {losses[0]:.4f} -> {losses[-1]:.4f}"
+            assert all('seconds' in epoch for epoch in model.als.history), "Missing epoch timings"
+            
+            user_idx = list(model.user_ids).index(3)
+            recs = model.recommend_for_user(user_idx, 3)
+            rec_ids = [rec['book_id'] for rec in recs]
+            assert not set(rec_ids) & {2, 10}, f"Rated books recommended: {rec_ids}"
+            assert 1 in rec_ids, f"Book 1 (liked by similar users) should be recommended: {rec_ids}"
+            
+            print(f"✓ {'Implicit' if implicit else 'Explicit'} ALS: {len(losses)} epochs, "
+                  f"loss {losses[0]:.4f} -> {losses[-1]:.4f}, recs {rec_ids}")
+        
+        print("✓ TEST PASSED")
+        return True
+        
+    except Exception as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_precomputed_user_tables():
+    """Test precomputed top-N tables against live scoring"""
+    print("\n" + "="*60)
+    print("TEST: Precomputed User Tables")
+    print("="*60)
+    
+    try:
+        import tempfile
+        from models.collaborative import CollaborativeFilteringRecommender
+        from models.precompute import precompute_user_topn, UserTopNTable
+        
+        ratings = pd.DataFrame({
+            'user_id': [1, 1, 1, 2, 2, 2, 3, 3, 4, 4, 4, 5, 5, 6, 6],
+            'book_id': [1, 2, 10, 1, 2, 3, 2, 10, 4, 5, 6, 5, 6, 4, 6],
+            'rating':  [5, 5, 4, 4, 5, 5, 5, 4, 5, 4, 5, 5, 4, 4, 5]
+        })
+        model = CollaborativeFilteringRecommender(n_components=3, algorithm='als', iterations=10)
+        model.fit_ratings(ratings, df)
+        
+        with tempfile.TemporaryDirectory() as path:
+            precompute_user_topn(model, path, n=4, batch_size=2, n_workers=0)
+            table = UserTopNTable(path)
+            
+            for user_idx, user_id in enumerate(model.user_ids):
+                live = [rec['book_id'] for rec in model.recommend_for_user(user_idx, 4)]
+                stored, _ = table.lookup(user_id)
+                assert sorted(live) == sorted(stored.tolist()), f"User {user_id}: {live} != {stored}"
+            
+            assert table.lookup(99) is None, "Unknown users should not be in the table"
+            
+            model.attach_topn_table(table)
+            served = [rec['book_id'] for rec in model.recommend_for_user_id(3, 2)]
+            assert served == table.lookup(3, 2)[0].tolist(), "Known user should be served from the table"
+            
+            new_user = [rec['book_id'] for rec in model.recommend_for_user_id(99, 3, {4: 5, 5: 5})]
+            assert len(new_user) == 3 and not {4, 5} & set(new_user), f"Bad fallback: {new_user}"
+        
+        print(f"✓ Tables match live scoring for {len(model.user_ids)} users")
+        print(f"✓ New user fallback: {new_user}")
+        print("✓ TEST PASSED")
+        return True
+        
+    except Exception as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_item_item_model():
+    """Test the item-item co-occurrence model"""
+    print("\n" + "="*60)
+    print("TEST: Item-Item Co-occurrence Model")
+    print("="*60)
+    
+    try:
+        from models.item_item import ItemItemRecommender
+        
+        # Books 1 and 2 are always rated together; book 3 is rated with 1 once
+        ratings = pd.DataFrame({
+            'user_id': [1, 1, 2, 2, 3, 3, 3, 4, 4, 5, 5],
+            'book_id': [1, 2, 1, 2, 1, 2, 3, 4, 5, 4, 5],
+            'rating':  [5, 5, 4, 5, 5, 4, 3, 5, 4, 4, 5]
+        })
+        model = ItemItemRecommender(top_k=3)
+        model.fit_ratings(ratings, df)
+        
+        # Popular items are subsampled to max_item_users raters
+        sampled = ItemItemRecommender(top_k=3, max_item_users=2)
+        sampled.fit_ratings(ratings, df)
+        assert sampled.similar_ranking(4, 1)[0][0] == 5, "Sampling should keep unaffected items intact"
+        
+        assert model.neighbors.shape == (len(df), 3), f"Unexpected index shape {model.neighbors.shape}"
+        similar = model.similar_ranking(4, 2)
+        assert similar[0][0] == 5, f"Book 5 should be closest to book 4: {similar}"
+        assert abs(similar[0][1] - 1.0) < 1e-6, f"Always co-rated books should have similarity 1: {similar}"
+        
+        recommendations = model.recommend({1: 5}, 3)
+        rec_ids = [rec['book_id'] for rec in recommendations]
+        assert 1 not in rec_ids, "Rated books should be excluded"
+        assert rec_ids and rec_ids[0] == 2, f"Book 2 should rank first: {rec_ids}"
+        assert model.ranking({99: 5}) == [], "Unknown books should give no ranking"
+        
+        # New co-ratings rebuild rows from the full counts: the same as refitting on all ratings
+        import pickle
+        more = pd.DataFrame({'user_id': [6, 6, 6, 7, 7], 'book_id': [1, 3, 4, 3, 4], 'rating': [5, 4, 5, 4, 4]})
+        incremental = pickle.loads(pickle.dumps(model))
+        incremental.add_cooccurrences({1: 1, 3: 2, 4: 2}, {(1, 3): 1, (1, 4): 1, (3, 4): 2})
+        refit = ItemItemRecommender(top_k=3)
+        refit.fit_ratings(pd.concat([ratings, more]), df)
+        for book_id in (1, 3, 4):
+            got, expected = incremental.similar_ranking(book_id, 3), refit.similar_ranking(book_id, 3)
+            assert [b for b, _ in got] == [b for b, _ in expected] and \
+                np.allclose([s for _, s in got], [s for _, s in expected]), f"Book {book_id}: {got} != {expected}"
+        
+        print(f"✓ Similar to book 4: {similar}")
+        print(f"✓ Recommendations for book 1 fans: {rec_ids}")
+        print("✓ TEST PASSED")
+        return True
+        
+    except Exception as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_sharded_scoring():
+    """Test sharded top-N scoring against single-process rankings"""
+    print("\n" + "="*60)
+    print("TEST: Sharded Scoring")
+    print("="*60)
+    
+    try:
+        from models.collaborative import CollaborativeFilteringRecommender
+        from models.content_based import ContentBasedRecommender
+        from models.sharded import ShardedScorer
+        
+        rng = np.random.default_rng(0)
+        matrix = np.round(rng.normal(size=(101, 4)), 1)
+        query = rng.normal(size=4)
+        scores = matrix @ query
+        scores[[3, 50]] = -np.inf
+        expected = np.argsort(-scores, kind='stable')[:7]
+        for n_workers in (0, 2):
+            with ShardedScorer(matrix, n_shards=4, n_workers=n_workers) as scorer:
+                positions, _ = scorer.top_n(query, 7, exclude=[3, 50])
+                assert positions.tolist() == expected.tolist(), f"{n_workers} workers: {positions} != {expected}"
+        
+        ratings = pd.DataFrame({
+            'user_id': [1, 1, 1, 2, 2, 2, 3, 3, 4, 4, 4, 5, 5, 6, 6],
+            'book_id': [1, 2, 10, 1, 2, 3, 2, 10, 4, 5, 6, 5, 6, 4, 6],
+            'rating':  [5, 5, 4, 5, 4, 5, 5, 4, 5, 4, 5, 5, 4, 4, 5]
+        })
+        collaborative = CollaborativeFilteringRecommender(n_components=3)
+        collaborative.fit_ratings(ratings, df)
+        content = ContentBasedRecommender()
+        content.fit(df)
+        single = (collaborative.recommend_for_ratings({1: 5, 4: 3}, 4), content.recommend([1, 2], 4))
+        collaborative.enable_sharding(n_workers=0, n_shards=3)
+        content.enable_sharding(n_workers=0, n_shards=3)
+        try:
+            sharded = (collaborative.recommend_for_ratings({1: 5, 4: 3}, 4), content.recommend([1, 2], 4))
+        finally:
+            collaborative.close()
+            content.close()
+        for name, a, b in zip(('collaborative', 'content'), single, sharded):
+            a, b = [rec['book_id'] for rec in a], [rec['book_id'] for rec in b]
+            assert a == b, f"Sharded {name} ranking differs: {b} != {a}"
+        
+        print(f"✓ Top-7 over 4 shards: {expected.tolist()}")
+        print("✓ TEST PASSED")
+        return True
+        
+    except Exception as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_hashed_features():
+    """Test hashed TF-IDF features against TfidfVectorizer and incremental fitting"""
+    print("\n" + "="*60)
+    print("TEST: Hashed Features")
+    print("="*60)
+    
+    try:
+        from models.content_based import ContentBasedRecommender
+        from models.features import HashedFeatures
+        
+        features = HashedFeatures(n_features=2 ** 20, chunk_size=3, n_jobs=1)
+        hashed = features.fit_transform(df)
+        text = features.texts(df)
+        expected = cosine_similarity(TfidfVectorizer(stop_words='english').fit_transform(text))
+        assert np.allclose(cosine_similarity(hashed), expected), "Hashed similarities differ from TfidfVectorizer"
+        
+        # Adding books updates the document frequencies as a full fit would
+        incremental = HashedFeatures(n_features=2 ** 20).partial_fit(df.iloc[:6]).partial_fit(df.iloc[6:])
+        assert np.array_equal(incremental.document_counts, features.document_counts), "partial_fit differs"
+        new_book = pd.DataFrame({'title': ['Python Machine Learning'], 'category': ['Machine Learning']})
+        assert features.transform(new_book).shape == (1, 2 ** 20), "transform of a new book failed"
+        
+        model = ContentBasedRecommender(features='hashed')
+        model.fit(df)
+        recs = model.recommend([1], 3)
+        assert len(recs) == 3 and 1 not in [rec['book_id'] for rec in recs], f"Bad recommendations: {recs}"
+        
+        print(f"✓ {hashed.nnz} hashed terms over {len(df)} books")
+        print("✓ TEST PASSED")
+        return True
+        
+    except Exception as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_embedding_store():
+    """Test LSA embeddings in the memory-mapped vector store"""
+    print("\n" + "="*60)
+    print("TEST: Embedding Store")
+    print("="*60)
+    
+    try:
+        import tempfile
+        from models.embeddings import VectorStore, embed_books
+        from models.sharded import ShardedScorer
+        
+        tfidf_matrix = TfidfVectorizer(stop_words='english').fit_transform(
+            df['title'] + ' ' + df['category'] + ' ' + df['level'])
+        vectors, method = embed_books(df, tfidf_matrix, dim=4)
+        assert method == 'lsa' and vectors.shape == (10, 4), f"Unexpected embeddings: {method} {vectors.shape}"
+        
+        with tempfile.TemporaryDirectory() as path:
+            store = VectorStore.write(path, vectors, df['book_id'], method=method)
+            reopened = VectorStore(path)
+            assert isinstance(reopened.vectors, np.memmap) and reopened.vectors.dtype == np.float32
+            assert np.allclose(np.linalg.norm(reopened.vectors, axis=1), 1, atol=1e-6), "Rows not normalized"
+            assert reopened.matches(df['book_id']) and not reopened.matches(df['book_id'][::-1])
+            
+            positions, _ = store.top_n(store.row_mean([0]), 3, exclude=[0])
+            expected = np.argsort(-cosine_similarity(vectors)[0], kind='stable')
+            assert positions.tolist() == [p for p in expected if p != 0][:3], f"Wrong neighbours: {positions}"
+            batched = store.search(store.vectors[[0, 1]], 3)
+            assert batched[0][0][0] == 0 and batched[1][0][0] == 1, "A book should be closest to itself"
+            with ShardedScorer(store.vectors, n_shards=3, n_workers=0) as scorer:
+                sharded, _ = scorer.top_n(store.row_mean([0]), 3, exclude=[0])
+            assert sharded.tolist() == positions.tolist(), f"Sharded {sharded} != {positions}"
+            del store, reopened
+        
+        # A store is reused only for the same catalog text and settings
+        from models.embeddings import catalog_fingerprint
+        fingerprint = catalog_fingerprint(df, dim=4, model=None)
+        edited = df.assign(title=df['title'].str.upper())
+        assert fingerprint == catalog_fingerprint(df.copy(), dim=4, model=None), "Fingerprint should be stable"
+        assert fingerprint != catalog_fingerprint(edited, dim=4, model=None), "Text change not detected"
+        assert fingerprint != catalog_fingerprint(df, dim=8, model=None), "Settings change not detected"
+        with tempfile.TemporaryDirectory() as path:
+            store = VectorStore.write(path, vectors, df['book_id'], method=method, fingerprint=fingerprint)
+            assert store.matches(df['book_id'], fingerprint) and store.matches(df['book_id'])
+            assert not store.matches(df['book_id'], catalog_fingerprint(edited, dim=4, model=None)), "Stale store"
+            del store
+        
+        # A snapshot has no TF-IDF matrix: its embeddings come from the catalog text
+        import app as app_module
+        catalog = app_module.CatalogState.build(df.copy())
+        with tempfile.TemporaryDirectory() as path:
+            catalog.save(os.path.join(path, 'catalog.pkl'))
+            snapshot = app_module.CatalogState.load(os.path.join(path, 'catalog.pkl'))
+            assert snapshot.tfidf_matrix is None
+            snapshot.enable_embeddings(os.path.join(path, 'store'), dim=4)
+            written = os.stat(os.path.join(path, 'store', 'vectors.npy')).st_mtime_ns
+            catalog.enable_embeddings(os.path.join(path, 'store'), dim=4)
+            assert os.stat(os.path.join(path, 'store', 'vectors.npy')).st_mtime_ns == written, \
+                "A built catalog should reuse the store its snapshot wrote"
+            catalog.books_df = catalog.books_df.assign(content=catalog.books_df['content'] + ' edited')
+            catalog.enable_embeddings(os.path.join(path, 'store'), dim=4)
+            assert catalog.embeddings.meta['fingerprint'] != snapshot.embeddings.meta['fingerprint'], \
+                "Changed catalog text should rebuild the store"
+            del catalog, snapshot
+        
+        print(f"✓ Nearest to book 1: {df['book_id'].iloc[positions].tolist()}")
+        print("✓ TEST PASSED")
+        return True
+        
+    except Exception as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_negative_feedback():
+    """Test signed preference weights for disliked books"""
+    print("\n" + "="*60)
+    print("TEST: Negative Feedback")
+    print("="*60)
+    
+    try:
+        from models.content_based import ContentBasedRecommender
+        from models.hybrid import HybridRecommender
+        from utils.preferences import DISLIKE_WEIGHT, signed_weights
+        
+        weights = signed_weights({1: 5, 2: 3, 3: 1, 4: 4})
+        assert weights == {1: 1.0, 3: -DISLIKE_WEIGHT, 4: 1.0}, f"Unexpected weights: {weights}"
+        
+        model = ContentBasedRecommender()
+        model.fit(df)
+        liked = [rec['book_id'] for rec in model.recommend([1], 9)]
+        assert [rec['book_id'] for rec in model.recommend([1], 9, [1.0])] == liked, "Positive weights changed results"
+        
+        # Disliking book 10 (also Machine Learning) pushes the other Machine Learning books down
+        signed = [rec['book_id'] for rec in model.recommend([1, 10], 8, [1.0, -DISLIKE_WEIGHT])]
+        assert 10 not in signed, "Disliked book should be excluded"
+        similar = cosine_similarity(model.tfidf_matrix)
+        expected = np.argsort(-(similar[0] - DISLIKE_WEIGHT * similar[9]), kind='stable')
+        expected = [int(df['book_id'].iloc[i]) for i in expected if i not in (0, 9)][:8]
+        assert signed == expected, f"Signed ranking {signed} != {expected}"
+        
+        hybrid = HybridRecommender()
+        hybrid.fit(df)
+        recs = hybrid.recommend({1: 1, 10: 2}, 3)
+        assert len(recs) == 3 and not {1, 10} & {rec['book_id'] for rec in recs}, f"Bad recommendations: {recs}"
+        
+        print(f"✓ Liking book 1 and disliking book 10: {signed}")
+        print("✓ TEST PASSED")
+        return True
+        
+    except Exception as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_evaluation_metrics():
+    """Test the offline evaluation metrics and rating splits against hand-computed values"""
+    print("\n" + "="*60)
+    print("TEST: Evaluation Metrics")
+    print("="*60)
+    
+    try:
+        from evaluate import ranking_metrics, split_ratings
+        
+        # k=3. User 0: 2 of 4 relevant items at ranks 2 and 3; user 1: its only relevant
+        # item at rank 1 (padded list); user 2: its only relevant item at rank 2; user 3: none relevant
+        recommended = np.array([[0, 5, 2], [4, -1, -1], [1, 3, 7], [0, 1, 2]])
+        relevant_indptr = np.array([0, 4, 5, 6, 6])
+        relevant_indices = np.array([2, 5, 8, 9, 4, 3])
+        metrics = ranking_metrics(recommended, relevant_indptr, relevant_indices, 3)
+        
+        d2, d3 = 1 / np.log2(3), 1 / np.log2(4)
+        expected = {
+            'precision': [2 / 3, 1 / 3, 1 / 3, 0.0],
+            'recall': [2 / 4, 1.0, 1.0, 0.0],
+            # The ideal DCG counts min(relevant, k) hits: 3 for user 0, 1 for users 1 and 2
+            'ndcg': [(d2 + d3) / (1 + d2 + d3), 1.0, d2, 0.0],
+            'hit_rate': [1.0, 1.0, 1.0, 0.0]
+        }
+        for name, values in expected.items():
+            assert np.allclose(metrics[name], values), f"{name}: {metrics[name]} != {values}"
+        
+        # Temporal split: the latest floor(0.4 * count) (at least one) ratings of users with 3+ ratings
+        ratings = pd.DataFrame({
+            'user_id':   [1, 1, 1, 1, 1, 2, 2, 3, 3, 3],
+            'book_id':   [1, 2, 3, 4, 5, 1, 2, 6, 7, 8],
+            'rating':    [5, 4, 3, 4, 5, 3, 4, 5, 2, 4],
+            'timestamp': [10, 50, 30, 40, 20, 1, 2, 5, 7, 6]
+        })
+        train, test = split_ratings(ratings, 'temporal', test_fraction=0.4)
+        assert list(zip(test['user_id'], test['book_id'])) == [(1, 2), (1, 4), (3, 7)], f"Test rows: {test}"
+        assert sorted(train.index.tolist() + test.index.tolist()) == list(range(len(ratings))), "Rows lost"
+        
+        # Without timestamps the last rows of each user count as the latest
+        _, test = split_ratings(ratings.drop(columns='timestamp'), 'temporal', test_fraction=0.4)
+        assert list(zip(test['user_id'], test['book_id'])) == [(1, 4), (1, 5), (3, 8)], f"Row order: {test}"
+        
+        train, test = split_ratings(ratings, 'random', test_fraction=0.4, seed=1)
+        assert test['user_id'].value_counts().to_dict() == {1: 2, 3: 1}, "Random split sizes"
+        assert not set(train.index) & set(test.index), "Train and test should not overlap"
+        
+        print(f"✓ NDCG per user: {np.round(metrics['ndcg'], 4).tolist()}")
+        print("✓ TEST PASSED")
+        return True
+        
+    except Exception as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
 def run_all_tests():
     """Run all model tests"""
     print("\n" + "="*60)
@@ -372,6 +777,14 @@ def run_all_tests():
         ("Exclude Rated Books", test_recommendation_excludes_rated_books),
         ("Empty Recommendations", test_empty_recommendations),
         ("Year Normalization", test_year_normalization),
+        ("ALS Collaborative Model", test_als_collaborative_model),
+        ("Precomputed User Tables", test_precomputed_user_tables),
+        ("Item-Item Model", test_item_item_model),
+        ("Sharded Scoring", test_sharded_scoring),
+        ("Hashed Features", test_hashed_features),
+        ("Embedding Store", test_embedding_store),
+        ("Negative Feedback", test_negative_feedback),
+        ("Evaluation Metrics", test_evaluation_metrics),
     ]
     
     results = []
@@ -0,0 +1,868 @@
+# tests/test_utils.py
+"""
+Backend Utilities Testing Suite for Tech Book Recommender
+Run with: python test_utils.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+import json
+
+import pandas as pd
+import numpy as np
+
+from utils.admission import AdmissionController, request_queue_seconds
+from utils.cache import ResultCache
+from utils.cluster import HashRing, NodeUnavailable, Router, node_environment, routing_key
+from utils.events import EventLog, RatingAggregator, read_events, validate_event
+from utils.filters import FilterIndex, parse_filters
+from utils.metrics import Histogram, Metrics
+from utils.preprocessing import BookDataProcessor
+from utils.profiling import RequestProfiler
+from utils.quantization import QuantizedMatrix, quantize
+from utils.registry import ModelRegistry
+from utils.rerank import mmr_rerank, rank_relevance
+from utils.serialization import TOPN_MIMETYPE, BookSerializer, pack_ranking, unpack_ranking
+from utils.statistics import CatalogStatistics, HyperLogLog
+
+# Sample data for testing
+test_books_data = {
+    'book_id': range(1, 6),
+    'title': [
+        "Machine Learning Basics",
+        "Deep Learning Advanced",
+        "Python for Data Science",
+        "Reinforcement Learning Guide",
+        "Neural Networks Explained"
+    ],
+    'author': ["John Doe", "Jane Smith", "Bob Johnson", "Alice Williams", "Charlie Brown"],
+    'category': ["Machine Learning", "Deep Learning", "Data Science",
+                 "Reinforcement Learning", "Deep Learning"],
+    'level': ["Beginner", "Advanced", "Beginner", "Advanced", "Intermediate"],
+    'rating': [4.5, 4.7, 4.4, 4.6, 4.5],
+    'year': [2022, 2021, 2023, 2020, 2022]
+}
+
+df = pd.DataFrame(test_books_data)
+
+
+def test_serializer_matches_records():
+    """Test that cached fragments decode to the same records as to_dict"""
+    print("\n" + "="*60)
+    print("TEST: Serializer Matches Records")
+    print("="*60)
+
+    try:
+        serializer = BookSerializer(df)
+
+        decoded = json.loads(serializer.render([3, 1, 2]))
+        expected = df.set_index('book_id', drop=False).loc[[3, 1, 2]].to_dict('records')
+
+        assert decoded == expected, "Rendered books differ from DataFrame records"
+        assert json.loads(serializer.render([])) == [], "Empty render should be an empty list"
+
+        print(f"✓ Cached {len(serializer.fragments)} fragments")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_serializer_scores_and_updates():
+    """Test score splicing and refreshing fragments after an update"""
+    print("\n" + "="*60)
+    print("TEST: Serializer Scores and Updates")
+    print("="*60)
+
+    try:
+        serializer = BookSerializer(df)
+
+        decoded = json.loads(serializer.render_ranking([(2, np.float64(71.5)), (4, None)]))
+        assert decoded[0]['score'] == 71.5, "Score should be merged into the book object"
+        assert 'score' not in decoded[1], "Books without a score should not get one"
+
+        updated = df[df['book_id'] == 2].copy()
+        updated['rating'] = 3.9
+        serializer.update(updated)
+        assert json.loads(serializer.render_book(2))['rating'] == 3.9, "Update should re-render the book"
+
+        print("✓ Scores spliced into cached fragments")
+        print("✓ Updated fragment re-rendered")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_metrics_histogram_and_render():
+    """Test latency quantiles and Prometheus text output"""
+    print("\n" + "="*60)
+    print("TEST: Metrics Histogram and Render")
+    print("="*60)
+
+    try:
+        histogram = Histogram(buckets=(0.01, 0.02, 0.05))
+        for value in [0.005] * 50 + [0.015] * 45 + [0.04] * 5:
+            histogram.observe(value)
+
+        assert histogram.quantile(0.5) <= 0.01, f"p50 too high: {histogram.quantile(0.5)}"
+        assert 0.01 < histogram.quantile(0.95) <= 0.02, f"p95 out of range: {histogram.quantile(0.95)}"
+        assert 0.02 < histogram.quantile(0.99) <= 0.05, f"p99 out of range: {histogram.quantile(0.99)}"
+
+        metrics = Metrics()
+        with metrics.timer('stage_seconds', stage='scoring'):
+            pass
+        metrics.cache_lookup('results', True)
+        metrics.cache_lookup('results', False)
+        text = metrics.render()
+
+        assert 'bookrec_stage_seconds_count{stage="scoring"} 1' in text, "Timer not recorded"
+        assert 'bookrec_cache_hit_ratio{cache="results"} 0.500000' in text, "Hit ratio missing"
+
+        print(f"✓ p50/p95/p99: {histogram.quantile(0.5):.4f} / "
+              f"{histogram.quantile(0.95):.4f} / {histogram.quantile(0.99):.4f}")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_metrics_disabled():
+    """Test that a disabled registry records nothing"""
+    print("\n" + "="*60)
+    print("TEST: Metrics Disabled")
+    print("="*60)
+
+    try:
+        metrics = Metrics(enabled=False)
+        with metrics.timer('stage_seconds', stage='scoring'):
+            pass
+        metrics.inc('requests_total')
+
+        assert not metrics.histograms and not metrics.counters, "Disabled metrics should stay empty"
+
+        print("✓ No series recorded while disabled")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_request_profiler():
+    """Test profile selection, recording and eviction"""
+    print("\n" + "="*60)
+    print("TEST: Request Profiler")
+    print("="*60)
+
+    try:
+        disabled = RequestProfiler(enabled=False, sample_rate=1.0)
+        assert not disabled.should_profile({'X-Profile': '1'}), "Disabled profiler should never profile"
+
+        profiler = RequestProfiler(enabled=True, max_profiles=2)
+        assert profiler.should_profile({'X-Profile': '1'}), "Header should trigger profiling"
+        assert not profiler.should_profile({}), "Sample rate 0 should not profile unmarked requests"
+
+        profile_ids = []
+        for _ in range(3):
+            handle = profiler.start()
+            assert handle is not None, "Profiler should start when idle"
+            sorted(range(1000), key=lambda x: -x)
+            profile_ids.append(profiler.finish(handle, path='/api/recommend'))
+
+        summaries = profiler.store.summaries()
+        assert len(summaries) == 2, f"Expected 2 stored profiles, got {len(summaries)}"
+        assert summaries[0]['id'] == profile_ids[-1], "Newest profile should be listed first"
+        assert profiler.store.get(profile_ids[0]) is None, "Oldest profile should be evicted"
+        assert 'function calls' in profiler.store.get(profile_ids[-1])['text'], "Missing stats text"
+
+        # Stored profiles hold request payloads: readable only with the admin token
+        import app as app_module
+        flask_app = app_module.create_app()
+        flask_app.extensions['profiler'] = profiler
+        client = flask_app.test_client()
+        token = os.environ.pop('ADMIN_TOKEN', None)
+        try:
+            assert client.get('/api/admin/profiles').status_code == 404, "No ADMIN_TOKEN should disable admin"
+            os.environ['ADMIN_TOKEN'] = 'secret'
+            assert client.get('/api/admin/profiles').status_code == 401, "Missing token should be refused"
+            response = client.get('/api/admin/profiles', headers={'X-Admin-Token': 'secret'})
+            assert response.status_code == 200 and len(response.get_json()) == 2, "Token should grant access"
+        finally:
+            os.environ.pop('ADMIN_TOKEN', None)
+            if token is not None:
+                os.environ['ADMIN_TOKEN'] = token
+
+        print(f"✓ Stored profiles: {[p['id'] for p in summaries]}")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+class _Model:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_model_registry_hot_swap():
+    """Test leases across a hot swap, version eviction and variant weights"""
+    print("\n" + "="*60)
+    print("TEST: Model Registry Hot Swap")
+    print("="*60)
+
+    try:
+        registry = ModelRegistry(max_versions=2)
+        v1, v2, v3 = _Model('v1'), _Model('v2'), _Model('v3')
+        registry.register('default', '1', v1)
+
+        in_flight = registry.acquire()
+        registry.register('default', '2', v2)
+        assert in_flight.model is v1, "In-flight lease should keep the old model"
+        with registry.lease() as model:
+            assert model is v2, "New requests should get the new version"
+
+        registry.register('default', '3', v3)
+        assert not v1.closed, "Evicted version should stay open while leased"
+        registry.release(in_flight)
+        assert v1.closed, "Evicted version should close after its last lease"
+
+        registry.activate('default', '2')
+        assert registry.get().model is v2, "Activate should roll back to version 2"
+        try:
+            registry.retire('default', '2')
+            assert False, "Retiring the active version should fail"
+        except ValueError:
+            pass
+
+        registry.register('candidate', '1', _Model('c1'))
+        registry.set_weights({'default': 1, 'candidate': 1})
+        picks = [registry.choose(key=user_id) for user_id in range(400)]
+        assert picks == [registry.choose(key=user_id) for user_id in range(400)], "Picks should be sticky per key"
+        share = picks.count('candidate') / len(picks)
+        assert 0.4 < share < 0.6, f"Candidate share {share:.2f} should be near 0.5"
+        assert registry.choose('default', key=3) == 'default', "Explicit variant should win"
+
+        print(f"✓ Models: {[(m['name'], m['version'], m['active']) for m in registry.summaries()['models']]}")
+        print(f"✓ Candidate traffic share: {share:.2f}")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_admin_snapshot_loading():
+    """Test that snapshots load only from SNAPSHOT_DIR and bad files are client errors"""
+    print("\n" + "="*60)
+    print("TEST: Admin Snapshot Loading")
+    print("="*60)
+
+    import tempfile
+    import app as app_module
+
+    saved = {name: os.environ.pop(name, None) for name in ('ADMIN_TOKEN', 'SNAPSHOT_DIR')}
+    try:
+        flask_app = app_module.create_app()
+        client = flask_app.test_client()
+        with tempfile.TemporaryDirectory() as directory:
+            snapshots = os.path.join(directory, 'snapshots')
+            os.makedirs(snapshots)
+            flask_app.extensions['registry'].get().model.save(os.path.join(snapshots, 'v2.pkl'))
+            with open(os.path.join(snapshots, 'broken.pkl'), 'wb') as f:
+                f.write(b'not a pickle')
+            outside = os.path.join(directory, 'outside.pkl')
+            flask_app.extensions['registry'].get().model.save(outside)
+
+            def post(snapshot):
+                return client.post('/api/admin/models', json={'version': '2', 'snapshot': snapshot,
+                                                              'activate': False},
+                                   headers={'X-Admin-Token': 'secret'}).status_code
+
+            os.environ['ADMIN_TOKEN'] = 'secret'
+            assert post('v2.pkl') == 404, "Loading should be disabled without SNAPSHOT_DIR"
+            os.environ['SNAPSHOT_DIR'] = snapshots
+            assert post(outside) == 400, "Absolute paths outside SNAPSHOT_DIR should be refused"
+            assert post('../outside.pkl') == 400, "Relative escapes should be refused"
+            assert post('missing.pkl') == 404, "Missing snapshot"
+            assert post('broken.pkl') == 400, "Malformed snapshot should be a client error"
+            assert post('v2.pkl') == 201, "Snapshot inside SNAPSHOT_DIR should load"
+
+        print("✓ Only snapshots inside SNAPSHOT_DIR load")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+    finally:
+        for name, value in saved.items():
+            os.environ.pop(name, None)
+            if value is not None:
+                os.environ[name] = value
+
+
+def test_event_log_and_aggregator():
+    """Test batched event logging, replay and incremental rating deltas"""
+    print("\n" + "="*60)
+    print("TEST: Event Log and Aggregator")
+    print("="*60)
+
+    try:
+        import tempfile
+
+        try:
+            validate_event({'user_id': 1, 'book_id': 2, 'rating': 7})
+            assert False, "Out of range ratings should be rejected"
+        except ValueError:
+            pass
+
+        events = [validate_event({'user_id': user_id, 'book_id': book_id, 'rating': rating})
+                  for user_id, book_id, rating in [(1, 1, 5), (1, 2, 4), (2, 1, 3), (1, 1, 3), (2, 3, 5)]]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'events.jsonl')
+            batches = []
+            log = EventLog(path, on_batch=batches.append, flush_interval=0.05)
+            log.append(events)
+            log.close()
+            assert sum(len(batch) for batch in batches) == len(events), "Every event should be committed"
+            assert len(batches) < len(events), "Events should be committed in batches"
+            replayed = list(read_events(path))
+            assert replayed == events, "Replayed events should match the appended ones"
+
+        aggregator = RatingAggregator()
+        aggregator.seed(pd.DataFrame({'user_id': [2], 'book_id': [2], 'rating': [4]}))
+        review_deltas, sum_deltas, pair_counts = aggregator.process(replayed)
+        assert review_deltas == {1: 2, 2: 1, 3: 1}, f"Unexpected review deltas: {review_deltas}"
+        # User 1 re-rated book 1 from 5 to 3: no new review, sum changes by -2
+        assert sum_deltas[1] == 5 + 3 - 2, f"Unexpected rating sum for book 1: {sum_deltas[1]}"
+        assert pair_counts == {(1, 2): 2, (1, 3): 1, (2, 3): 1}, f"Unexpected pairs: {pair_counts}"
+
+        # Applying the batch moves only the rated books within the popularity order
+        import app as app_module
+        catalog = app_module.CatalogState.build(pd.DataFrame(app_module.tech_books_data))
+        before = catalog.books_df
+        catalog.apply_rating_events({1: 40, 2: 40}, {1: 40 * 1.0, 2: 40 * 5.0}, {})
+        assert before['rating'].iloc[0] == app_module.tech_books_data['rating'][0] and catalog.books_df is not before, \
+            "Readers' frame should not change"
+        assert catalog.recommender.books_df is catalog.filters.books_df is catalog.books_df, "Frame swapped everywhere"
+        ratings = catalog.books_df['rating'].to_numpy()
+        assert (catalog.recommender.popular_order == np.argsort(-ratings, kind='stable')).all(), "Popular order"
+        assert (catalog.recommender.prior_order ==
+                np.argsort(-catalog.recommender.prior_scores, kind='stable')).all(), "Prior order"
+        assert catalog.recommender.popular_ranking(1) == [(2, None)], "Book 2 should now be the most popular"
+        assert catalog.filters.mask({'min_rating': 4.6}).contains([0, 1]).tolist() == [False, True], "Filters"
+
+        # One event per batch adds up to the same average as one batch of all of them
+        books = pd.DataFrame(app_module.tech_books_data).assign(num_reviews=1000)
+        books.loc[0, 'rating'] = 4.6
+        one_by_one = app_module.CatalogState.build(books.copy())
+        for _ in range(500):
+            one_by_one.apply_rating_events({1: 1}, {1: 5.0}, {})
+        batched = app_module.CatalogState.build(books.copy())
+        batched.apply_rating_events({1: 500}, {1: 500 * 5.0}, {})
+        expected = round((4.6 * 1000 + 5 * 500) / 1500, 2)
+        assert one_by_one.books_df['rating'].iloc[0] == batched.books_df['rating'].iloc[0] == expected, \
+            f"Per-event rating {one_by_one.books_df['rating'].iloc[0]} != batched {expected}"
+
+        print(f"✓ {len(events)} events committed in {len(batches)} batch(es)")
+        print(f"✓ Co-rating pairs: {dict(pair_counts)}")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_filter_index():
+    """Test bitset filters against pandas boolean indexing"""
+    print("\n" + "="*60)
+    print("TEST: Filter Index")
+    print("="*60)
+
+    try:
+        index = FilterIndex(df)
+        assert index.mask(parse_filters({})) is None, "No filters should give no mask"
+
+        filters = parse_filters({'category': ['Deep Learning', 'Data Science'], 'year_min': '2021',
+                                 'min_rating': 4.4, 'exclude': '5'})
+        mask = index.mask(filters)
+        expected = (df['category'].isin(['Deep Learning', 'Data Science']) & (df['year'] >= 2021) &
+                    (df['rating'] >= 4.4) & (df['book_id'] != 5)).to_numpy()
+        assert (mask.to_bool() == expected).all(), f"Mask {mask.to_bool()} != {expected}"
+        assert (mask.contains(np.arange(len(df))) == expected).all(), "contains() should match the mask"
+
+        mask = index.mask(parse_filters({'level': 'Advanced', 'year_max': 2020}))
+        assert df.iloc[mask.positions()]['book_id'].tolist() == [4], "Level and year_max should combine"
+        assert not index.mask({'year_min': 2030}).to_bool().any(), "Out of range year should match nothing"
+
+        # Rating changes patch the threshold bits in place, including new levels
+        changed = df.copy()
+        index = FilterIndex(changed)
+        changed.loc[[0, 3], 'rating'] = [4.75, 4.4]
+        index.update_ratings([0, 3], [4.75, 4.4])
+        for min_rating in (4.4, 4.5, 4.6, 4.7, 4.75, 4.8):
+            got = index.mask({'min_rating': min_rating}).to_bool()
+            assert (got == (changed['rating'] >= min_rating).to_numpy()).all(), f"min_rating {min_rating}: {got}"
+
+        try:
+            parse_filters({'min_rating': 'high'})
+            assert False, "Non-numeric min_rating should be rejected"
+        except ValueError:
+            pass
+        assert parse_filters({'category': 'Foo, Bar'}) == {'category': ['Foo, Bar']}, "Names keep their commas"
+        from werkzeug.datastructures import MultiDict
+        args = MultiDict([('level', 'Beginner'), ('level', 'Advanced'), ('exclude', '1,2')])
+        assert parse_filters(args) == {'level': ['Beginner', 'Advanced'], 'exclude': [1, 2]}, "Repeated params"
+        for malformed in (['Deep Learning'], 'Deep Learning', 3):
+            try:
+                parse_filters(malformed)
+                assert False, f"Non-object filters {malformed!r} should be rejected"
+            except ValueError:
+                pass
+
+        print(f"✓ Filtered books: {df[expected]['book_id'].tolist()}")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_mmr_rerank():
+    """Test MMR re-ranking against redundant candidates"""
+    print("\n" + "="*60)
+    print("TEST: MMR Re-ranking")
+    print("="*60)
+
+    try:
+        # Candidates 0-2 are near duplicates, 3 and 4 are different
+        similarity = np.eye(5)
+        similarity[np.ix_([0, 1, 2], [0, 1, 2])] = 0.95
+        positions = np.arange(5)
+        relevance = rank_relevance(5)
+
+        assert mmr_rerank(positions, relevance, similarity, 5, diversity=0.0) == [0, 1, 2, 3, 4], \
+            "Zero diversity should keep the relevance order"
+        diverse = mmr_rerank(positions, relevance, similarity, 3, diversity=0.5)
+        assert diverse == [0, 3, 4], f"Duplicates should be pushed down: {diverse}"
+        assert len(mmr_rerank(positions, relevance, similarity, 10)) == 5, "k should be capped at the candidates"
+
+        print(f"✓ Diversified order: {diverse}")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_quantized_storage():
+    """Test reduced-precision matrices against the float64 original"""
+    print("\n" + "="*60)
+    print("TEST: Quantized Storage")
+    print("="*60)
+
+    try:
+        rng = np.random.default_rng(0)
+        matrix = rng.normal(size=(20, 8)) * rng.uniform(0.1, 10, size=(20, 1))
+        quantized = quantize(matrix, 'int8')
+        assert isinstance(quantized, QuantizedMatrix)
+        assert quantized.nbytes < matrix.nbytes / 4, "int8 plus row scales should be far smaller than float64"
+        # Rounding error is at most half a step of each row's scale
+        error = np.abs(quantized.dequantize() - matrix)
+        assert (error <= quantized.scale[:, None] / 2 + 1e-6).all(), "Error should be bounded by the row scale"
+
+        dense = quantized.dequantize()
+        assert np.allclose(quantized[3], dense[3])
+        assert np.allclose(quantized[[1, 4]], dense[[1, 4]])
+        assert np.allclose(quantized[2, [0, 5]], dense[2, [0, 5]])
+        vector = rng.normal(size=8)
+        assert np.allclose(quantized @ vector, dense @ vector, atol=1e-4)
+        assert np.allclose(np.ones(20) @ quantized, np.ones(20) @ dense, atol=1e-4)
+
+        quantized[0] = np.zeros(8)
+        assert not quantized[0].any(), "Assigned rows should be re-quantized"
+        assert quantize(matrix, 'float32').dtype == np.float32
+        assert quantize(matrix, 'float64') is matrix
+        try:
+            quantize(matrix, 'int4')
+            assert False, "Unknown precisions should be rejected"
+        except ValueError:
+            pass
+
+        print(f"✓ int8: {quantized.nbytes} bytes vs {matrix.nbytes}, max error {error.max():.4f}")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_cluster_routing():
+    """Test consistent-hash routing, rebalancing and the node result cache"""
+    print("\n" + "="*60)
+    print("TEST: Cluster Routing")
+    print("="*60)
+
+    try:
+        # Profiles are normalized: key order and int/float ratings do not matter
+        a = routing_key('POST', '/api/recommend', json.dumps({'ratings': {'3': 4, '1': 5}}).encode())
+        b = routing_key('POST', '/api/recommend', json.dumps({'ratings': {'1': 5.0, '3': 4.0}, 'n': 3}).encode())
+        assert a == b == 'recommend:1=5,3=4', f"Profiles should normalize: {a} != {b}"
+        assert routing_key('GET', '/api/similar/7') == 'similar:7'
+        assert routing_key('GET', '/api/books') is None
+        assert routing_key('POST', '/api/recommend', b'not json') is None
+
+        nodes = [f'http://node-{i}' for i in range(4)]
+        ring = HashRing(nodes)
+        keys = [f'similar:{i}' for i in range(2000)]
+        owners = {key: ring.node_for(key) for key in keys}
+        counts = {node: list(owners.values()).count(node) for node in nodes}
+        assert min(counts.values()) > 250, f"Keys should spread over the nodes: {counts}"
+
+        # Removing a node only moves that node's keys
+        ring.remove('http://node-2')
+        moved = [key for key in keys if ring.node_for(key) != owners[key]]
+        assert all(owners[key] == 'http://node-2' for key in moved), "Only the removed node's keys should move"
+        assert ring.preference('similar:1')[0] != 'http://node-2' and len(ring.preference('similar:1')) == 3
+
+        router = Router(nodes, max_failures=2)
+        router.record_check('http://node-1', False)
+        assert 'http://node-1' in router.healthy(), "One failed check should not remove a node"
+        router.record_check('http://node-1', False)
+        assert 'http://node-1' not in router.healthy(), "Repeated failures should remove a node"
+        router.record_check('http://node-1', True)
+        assert 'http://node-1' in router.healthy(), "A good check should bring the node back"
+
+        # Ratings logged by a routed recommend request reach the other nodes' event logs
+        class RecordingRouter(Router):
+            def send(self, node, method, path_and_query, body, headers):
+                if node in down:
+                    raise NodeUnavailable(node)
+                sent.append((node, path_and_query, json.loads(body)))
+                return 200, b'[]', {}
+
+        sent, down = [], set()
+        router = RecordingRouter(nodes[:3])
+        body = json.dumps({'user_id': 'u1', 'ratings': {'1': 5, '3': 2}}).encode()
+        _, _, _, served_by = router.forward('POST', '/api/recommend', '', body, {})
+        router.wait_for_events()
+        events = [event for node, path, payload in sent if path == '/api/events' for event in payload['events']]
+        assert sorted(node for node, path, _ in sent if path == '/api/events') == \
+            sorted(set(nodes[:3]) - {served_by}), f"Events should go to the other nodes: {sent}"
+        assert events[:2] == [{'user_id': 'u1', 'book_id': 1, 'rating': 5},
+                              {'user_id': 'u1', 'book_id': 3, 'rating': 2}], f"Unexpected events: {events}"
+        sent.clear()
+        router.forward('POST', '/api/recommend', '', json.dumps({'ratings': {'1': 5}}).encode(), {})
+        router.wait_for_events()
+        assert len(sent) == 1, "Anonymous requests log nothing and go to one node"
+
+        # A node that misses event copies is caught up, in order, when it is healthy again
+        lagging = next(node for node in nodes[:3] if node != served_by)
+        down.add(lagging)
+        for user in ('u2', 'u3'):
+            router.forward('POST', '/api/recommend', '', json.dumps({'user_id': user, 'ratings': {'2': 4}}).encode(),
+                           {'X-User-Id': user})
+        router.wait_for_events()
+        status = {node['url']: node for node in router.status()['nodes']}
+        assert status[lagging]['missed_events'] == 2 and not status[lagging]['healthy'], f"Missed: {status}"
+        down.clear()
+        sent.clear()
+        router.record_check(lagging, True)
+        router.wait_for_events()
+        resent = [payload['events'][0]['user_id'] for node, path, payload in sent if node == lagging]
+        assert resent == ['u2', 'u3'], f"Missed events should be replayed in order: {resent}"
+        assert router.status()['nodes'][nodes.index(lagging)]['missed_events'] == 0, "Nothing left to resync"
+        env = node_environment(1, {'EVENT_LOG': 'data/events.jsonl'})
+        assert env['EVENT_LOG'] == 'data/events.node-1.jsonl' and env['NODE_ID'] == 'node-1', "Per-node log"
+
+        cache = ResultCache(max_size=2)
+        cache.put('a', b'1')
+        cache.put('b', b'2')
+        cache.get('a')
+        cache.put('c', b'3')
+        assert cache.get('b') is None and cache.get('a') == b'1', "Least recently used entry should go"
+
+        print(f"✓ Keys per node: {counts}")
+        print(f"✓ {len(moved)} of {len(keys)} keys moved when a node left")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_chunked_cleaning():
+    """Test chunked CSV cleaning against in-memory clean_data"""
+    print("\n" + "="*60)
+    print("TEST: Chunked Data Cleaning")
+    print("="*60)
+
+    try:
+        import tempfile
+
+        raw = pd.DataFrame({
+            'book_id': range(1, 9),
+            'title': ["Deep Learning", " deep  learning ", "Python", None, "Python", "Algorithms", "Python", "Rust"],
+            'author': ["Ian", "ian", "Wes", "Anon", "Wes ", "Bob", "Ann", "Sam"],
+            'rating': [4.5, 4.0, None, 3.0, 5.0, 7.0, 4.0, 2.0]
+        })
+        with tempfile.TemporaryDirectory() as path:
+            raw_path = os.path.join(path, 'raw.csv')
+            raw.to_csv(raw_path, index=False)
+            processor = BookDataProcessor(raw_path)
+            processor.load_from_csv()
+            expected = processor.clean_data()
+            stats = processor.clean_csv(os.path.join(path, 'clean.csv'), chunksize=3, n_workers=0)
+            cleaned = pd.read_csv(os.path.join(path, 'clean.csv'))
+
+        # Normalized duplicates (case, spacing) are dropped across chunks; rating 7 is out of range
+        assert cleaned['book_id'].tolist() == [1, 3, 4, 7, 8], f"Unexpected rows: {cleaned['book_id'].tolist()}"
+        assert cleaned['book_id'].tolist() == expected['book_id'].tolist(), "Chunked and in-memory cleaning differ"
+        assert cleaned.loc[1, 'rating'] == raw['rating'].median(), "Missing ratings should get the median"
+        assert cleaned.loc[2, 'title'] == 'Unknown', "Missing titles should be filled"
+        assert stats == {'rows_in': 8, 'rows_out': 5, 'duplicates': 2, 'invalid_rating': 1}, f"Bad stats: {stats}"
+
+        print(f"✓ Cleaned {stats['rows_in']} rows into {stats['rows_out']}")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_streaming_statistics():
+    """Test chunked statistics against full-frame pandas results"""
+    print("\n" + "="*60)
+    print("TEST: Streaming Statistics")
+    print("="*60)
+
+    try:
+        stats = CatalogStatistics(top_k=3)
+        for start in range(0, len(df), 2):
+            stats.update(df.iloc[start:start + 2])
+        result = stats.to_dict()
+        assert result['total_books'] == len(df)
+        assert result['categories'] == df['category'].value_counts().to_dict()
+        assert abs(result['avg_rating'] - df['rating'].mean()) < 1e-12
+        assert result['year_range'] == (df['year'].min(), df['year'].max())
+        expected_top = df.nlargest(3, 'rating')[['title', 'rating']].to_dict('records')
+        assert result['top_rated'] == expected_top, f"Top rated differs: {result['top_rated']}"
+        assert result['distinct_authors'] == df['author'].nunique()
+        counts, edges = stats.rating_histogram()
+        assert counts.tolist() == np.histogram(df['rating'], edges)[0].tolist(), "Histogram bins differ"
+        assert stats.year_counts() == df['year'].value_counts().sort_index().to_dict()
+
+        # Partitions merge into the same statistics
+        merged = CatalogStatistics.from_frame(df.iloc[:3], top_k=3)
+        merged.merge(CatalogStatistics.from_frame(df.iloc[3:], top_k=3))
+        assert merged.to_dict() == result, "Merged statistics should match sequential updates"
+
+        stats.update_ratings([4.5], [3.5])
+        assert abs(stats.to_dict()['avg_rating'] - (df['rating'].sum() - 1) / len(df)) < 1e-12
+
+        sketch = HyperLogLog(precision=12)
+        sketch.add(np.arange(50000).astype(str))
+        assert abs(sketch.count() - 50000) < 50000 * 0.05, f"HyperLogLog estimate off: {sketch.count()}"
+
+        print(f"✓ Top rated: {[book['title'] for book in result['top_rated']]}")
+        print(f"✓ HyperLogLog estimate for 50000 authors: {sketch.count()}")
+        print("✓ TEST PASSED")
+        return True
+
+    except AssertionError as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_admission_control():
+    """Test serving modes under concurrent load and the degraded-mode header"""
+    print("\n" + "="*60)
+    print("TEST: Admission Control")
+    print("="*60)
+
+    try:
+        import threading
+        import app as app_module
+
+        for header in ('t=1700000000.5', 't=1700000000500', 't=1700000000500000'):
+            queued = request_queue_seconds(header, now=1700000001.0)
+            assert abs(queued - 0.5) < 1e-6, f"{header} should be 0.5s ago, got {queued}"
+        assert request_queue_seconds('soon') == 0.0 and request_queue_seconds(None) == 0.0, "Malformed header"
+
+        # 16 concurrent requests: 4 full, 8 content-only, the rest shed to the popular list
+        controller = AdmissionController(degrade_in_flight=4, shed_in_flight=12)
+        barrier = threading.Barrier(16)
+        modes = []
+
+        def request():
+            modes.append(controller.enter())
+            barrier.wait()
+            controller.leave(0.01)
+
+        threads = [threading.Thread(target=request) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counts = {mode: modes.count(mode) for mode in set(modes)}
+        assert counts == {'full': 4, 'content': 8, 'popular': 4}, f"Unexpected modes: {counts}"
+        assert controller.in_flight == 0, "Every request should have left"
+
+        controller = AdmissionController(degrade_latency=0.1, smoothing=1.0)
+        controller.enter()
+        controller.leave(0.5)
+        assert controller.enter() == 'content', "Slow recent requests should degrade"
+        controller.leave(0.01)
+        assert controller.enter() == 'full' and controller.enter(queue_seconds=0.2) == 'content', "Queue time"
+
+        flask_app = app_module.create_app()
+        flask_app.extensions['admission'] = AdmissionController(degrade_in_flight=0, shed_in_flight=1)
+        client = flask_app.test_client()
+        payload = {'ratings': {'1': 5, '3': 4}, 'n': 3}
+        response = client.post('/api/recommend', json=payload)
+        assert response.headers.get('X-Degraded-Mode') == 'content', "Expected content-only degradation"
+        assert len(response.get_json()) == 3, "Degraded response should still have 3 books"
+        flask_app.extensions['admission'].enter()   # one request already in flight
+        response = client.post('/api/recommend', json=payload)
+        expected = [book['book_id'] for book in client.get('/api/books').get_json()]
+        expected = sorted(expected, key=lambda b: -app_module.tech_books_data['rating'][b - 1])[:3]
+        assert response.headers.get('X-Degraded-Mode') == 'popular', "Expected popular-list shedding"
+        assert [book['book_id'] for book in response.get_json()] == expected, "Shed response should be popular"
+
+        print(f"✓ Modes under 16 concurrent requests: {counts}")
+        print("✓ TEST PASSED")
+        return True
+
+    except Exception as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def test_compact_ranking_format():
+    """Test the packed id/score ranking format and its content negotiation"""
+    print("\n" + "="*60)
+    print("TEST: Compact Ranking Format")
+    print("="*60)
+
+    try:
+        import app as app_module
+
+        ranking = [(3, 71.5), (1, None), (2, np.float64(0.25))]
+        body = pack_ranking(ranking)
+        assert len(body) == 8 * len(ranking), "Each pair should pack into 8 bytes"
+        assert unpack_ranking(body) == [(3, 71.5), (1, None), (2, 0.25)], "Round trip should keep ids and scores"
+        records = np.frombuffer(body, '<i4,<f4')
+        assert records['f0'].tolist() == [3, 1, 2] and np.isnan(records['f1'][1]), "numpy should read the records"
+        assert pack_ranking([]) == b'' and unpack_ranking(b'') == [], "Empty ranking"
+
+        client = app_module.create_app().test_client()
+        payload = {'ratings': {'1': 5, '3': 4}, 'method': 'content', 'n': 4}
+        response = client.post('/api/recommend', json=payload)
+        books, json_bytes = response.get_json(), len(response.get_data())
+        response = client.post('/api/recommend', json=payload, headers={'Accept': TOPN_MIMETYPE})
+        assert response.mimetype == TOPN_MIMETYPE, f"Unexpected mimetype {response.mimetype}"
+        assert 'Accept' in response.headers.get('Vary', ''), "Ranking responses should vary on Accept"
+        compact = unpack_ranking(response.get_data())
+        assert [book_id for book_id, _ in compact] == [book['book_id'] for book in books], "Same books as JSON"
+        assert all(score is not None for _, score in compact), "Content scores should be included"
+        assert [s for _, s in compact] == sorted((s for _, s in compact), reverse=True), "Best first"
+
+        response = client.get('/api/similar/1?n=3', headers={'Accept': f'{TOPN_MIMETYPE}, application/json;q=0.5'})
+        assert response.mimetype == TOPN_MIMETYPE and len(unpack_ranking(response.get_data())) == 3
+        response = client.get('/api/similar/1?n=3', headers={'Accept': 'text/html, */*'})
+        assert response.mimetype == 'application/json' and len(response.get_json()) == 3, "JSON by default"
+
+        print(f"✓ {len(compact)} ranked books in {json_bytes} JSON vs {8 * len(compact)} packed bytes")
+        print("✓ TEST PASSED")
+        return True
+
+    except Exception as e:
+        print(f"✗ TEST FAILED: {str(e)}")
+        return False
+
+
+def run_all_tests():
+    """Run all utility tests"""
+    print("\n" + "="*60)
+    print("TECH BOOK RECOMMENDER - UTILITIES TEST SUITE")
+    print("="*60)
+
+    tests = [
+        ("Serializer Matches Records", test_serializer_matches_records),
+        ("Serializer Scores and Updates", test_serializer_scores_and_updates),
+        ("Metrics Histogram and Render", test_metrics_histogram_and_render),
+        ("Metrics Disabled", test_metrics_disabled),
+        ("Request Profiler", test_request_profiler),
+        ("Model Registry Hot Swap", test_model_registry_hot_swap),
+        ("Admin Snapshot Loading", test_admin_snapshot_loading),
+        ("Event Log and Aggregator", test_event_log_and_aggregator),
+        ("Filter Index", test_filter_index),
+        ("MMR Re-ranking", test_mmr_rerank),
+        ("Quantized Storage", test_quantized_storage),
+        ("Cluster Routing", test_cluster_routing),
+        ("Chunked Data Cleaning", test_chunked_cleaning),
+        ("Streaming Statistics", test_streaming_statistics),
+        ("Admission Control", test_admission_control),
+        ("Compact Ranking Format", test_compact_ranking_format),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+            results.append((test_name, result))
+        except Exception as e:
+            print(f"\n✗ {test_name} CRASHED: {str(e)}")
+            results.append((test_name, False))
+
+    # Summary
+    print("\n" + "="*60)
+    print("TEST SUMMARY")
+    print("="*60)
+
+    passed = sum(1 for _, result in results if result)
+    total = len(results)
+
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status} - {test_name}")
+
+    print("\n" + "="*60)
+    print(f"Results: {passed}/{total} tests passed ({passed/total*100:.1f}%)")
+    print("="*60)
+
+    return passed == total
+
+
+if __name__ == "__main__":
+    try:
+        success = run_all_tests()
+        sys.exit(0 if success else 1)
+    except KeyboardInterrupt:
+        print("\n\nTests interrupted by user")
+        sys.exit(1)